@@ -1,15 +1,17 @@
 import re
 import os
+import gzip
 import json
+import hashlib
 import logging
 import sqlite3
 import time
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, jsonify, send_from_directory, request, redirect
 from werkzeug.utils import secure_filename
 import requests
 import concurrent.futures
 from flask_cors import CORS, cross_origin
-from core.config import STATUS_FILE_PATH, IMAGE_OUTPUT_DIR, DB_PATH, FRONTEND_URL
+from core.config import STATUS_FILE_PATH, IMAGE_OUTPUT_DIR, TILE_OUTPUT_DIR, DB_PATH, FRONTEND_URL
 from datetime import datetime, timedelta, timezone
 from core import auth
 
@@ -29,7 +31,11 @@ origins_list = [
 ]
 
 # When supports_credentials=True, origins CANNOT be "*"
-CORS(app, origins=origins_list, supports_credentials=True)
+# Los metadatos de /api/grid (y los bounds de la manga de granizo) viajan en headers: hay que exponerlos al frontend (otro origen)
+CORS(app, origins=origins_list, supports_credentials=True,
+     expose_headers=['ETag', 'X-Grid-Width', 'X-Grid-Height', 'X-Grid-Scale-Factor', 'X-Grid-Add-Offset',
+                     'X-Grid-Missing', 'X-Grid-Row-Order', 'X-Grid-Unit', 'X-Overlay-Bounds', 'X-Hail-Swath-Days',
+                     'X-Grid-Dtype', 'X-Rain-Days'])
 
 # Initialize DB on module load (ensures migrations run in production/gunicorn)
 from core.database import init_db
@@ -310,10 +316,308 @@ def reset_password():
 
 
 
-# Endpoint para servir las imágenes generadas
+from core.config import FRAME_STORE_DIR, RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB, DATA_CONFIG, OVERLAY_PROJECTION, GEO_CACHE_DIR
+from services.overlay_cache import OverlayCache
+import numpy as np
+
+# Grilla del worker (500 x 500 a 1 km, AEQD centrada en el radar), para el remapeo a Mercator
+OVERLAY_GRID_KM = np.arange(-249.5, 250.0, 1.0, dtype=np.float32)
+overlay_mercator = None
+if OVERLAY_PROJECTION == "mercator":
+    overlay_mercator = {"x_km": OVERLAY_GRID_KM, "y_km": OVERLAY_GRID_KM, "lat_0": DATA_CONFIG['sensor_latitude'],
+                        "lon_0": DATA_CONFIG['sensor_longitude'], "cache_dir": GEO_CACHE_DIR,
+                        "earth_radius_m": DATA_CONFIG['earth_radius_m']}
+overlay_cache = OverlayCache(RENDER_CACHE_DIR, FRAME_STORE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024,
+                             DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias'], overlay_mercator)
+OVERLAY_CACHE_SECONDS = 24 * 3600  # un frame publicado no cambia
+
+# Endpoint para servir las imágenes generadas.
+# Si el worker ya la renderizó (RENDER_MODE=eager) se sirve tal cual; si no, o si se pide otra
+# variante (?palette=colorblind&size=1500), se renderiza desde el composite y queda en caché.
+# El formato se negocia con Accept: WebP lossless si el cliente lo acepta, si no el PNG paletizado.
+# Ambos se codifican al renderizar, nunca por petición.
+def _accepts_webp() -> bool:
+    return request.accept_mimetypes['image/webp'] > 0
+
 @app.route('/images/<path:filename>')
 def serve_image(filename):
-    return send_from_directory(IMAGE_OUTPUT_DIR, filename)
+    palette = request.args.get('palette', 'titan')
+    size = request.args.get('size', type=int)
+    want_webp = filename.endswith('.png') and _accepts_webp()
+
+    if not request.args:
+        if want_webp and os.path.exists(os.path.join(IMAGE_OUTPUT_DIR, filename[:-len('.png')] + '.webp')):
+            response = send_from_directory(IMAGE_OUTPUT_DIR, filename[:-len('.png')] + '.webp')
+            response.vary.add('Accept')
+            return response
+        if os.path.exists(os.path.join(IMAGE_OUTPUT_DIR, filename)):
+            response = send_from_directory(IMAGE_OUTPUT_DIR, filename)
+            response.vary.add('Accept')
+            return response
+
+    parsed = OverlayCache.parse_filename(filename)
+    if parsed is None:
+        return jsonify({"error": "Image not found"}), 404
+    frame, smoothed = parsed
+    try:
+        path = overlay_cache.get(frame, smoothed, palette, size or overlay_cache.default_size, 'webp' if want_webp else 'png')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if path is None:
+        return jsonify({"error": "Image not found"}), 404
+    response = send_from_directory(os.path.dirname(path), os.path.basename(path), max_age=OVERLAY_CACHE_SECONDS)
+    response.vary.add('Accept')
+    return response
+
+from worker.retention import day_key
+
+# Pirámide XYZ por frame (worker: services/radar_tiles.py). Los tiles sin eco no se escriben:
+# dentro de un frame existente se responde con el tile transparente compartido.
+FRAME_NAME_RE = re.compile(r'^(INPUT|PRED)_[0-9_\-]+$')
+TILE_CACHE_SECONDS = 24 * 3600  # un frame publicado no cambia
+
+@app.route('/tiles/<frame>/<int:z>/<int:x>/<int:y>.png')
+def serve_tile(frame, z, x, y):
+    if not FRAME_NAME_RE.match(frame):
+        return jsonify({"error": "Invalid frame"}), 400
+    frame_dir = os.path.join(TILE_OUTPUT_DIR, day_key(frame), frame)
+    if not os.path.isdir(frame_dir):
+        return jsonify({"error": "Frame not found"}), 404
+    tile_path = os.path.join(frame_dir, str(z), str(x), f"{y}.png")
+    if os.path.exists(tile_path):
+        return send_from_directory(frame_dir, f"{z}/{x}/{y}.png", max_age=TILE_CACHE_SECONDS)
+    return send_from_directory(TILE_OUTPUT_DIR, "_empty.png", max_age=TILE_CACHE_SECONDS)
+
+from core.config import ANIMATION_OUTPUT_DIR
+from services.animation_bundle import bundle_filename
+from worker.retention import SHARD_RE
+
+# Bundle de animación por corrida (services/animation_bundle.py): inputs + pronóstico en un solo
+# binario. El de una corrida no cambia nunca (immutable); /latest redirige al de la última corrida.
+RUN_ID_RE = re.compile(r'^\d{8}-\d{6}$')
+ANIMATION_CACHE_SECONDS = 365 * 24 * 3600
+
+def _latest_animation_run():
+    if not os.path.isdir(ANIMATION_OUTPUT_DIR):
+        return None
+    for day in sorted((e.name for e in os.scandir(ANIMATION_OUTPUT_DIR) if e.is_dir() and SHARD_RE.match(e.name)), reverse=True):
+        bundles = sorted(f for f in os.listdir(os.path.join(ANIMATION_OUTPUT_DIR, day))
+                         if f.startswith('ANIM_') and f.endswith('.bin'))
+        if bundles:
+            return bundles[-1][len('ANIM_'):-len('.bin')]
+    return None
+
+@app.route('/api/animation/latest')
+def latest_animation():
+    run_id = _latest_animation_run()
+    if run_id is None:
+        return jsonify({"error": "Animation not found"}), 404
+    response = redirect(f"/api/animation/{run_id}", code=302)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+from core.config import ANIMATION_CACHE_DIR, ANIMATION_CACHE_MAX_MB, REPLAY_MAX_HOURS
+from services.radar_animation import (AnimationCache, ANIMATION_FORMATS, list_store_frames, iter_store_frames,
+                                      write_animation, parse_range_time)
+
+# Animación de un rango (GIF/MP4/WebP) generada en streaming desde el frame store y cacheada en disco.
+# La clave incluye la lista de frames: si entran scans nuevos al rango se genera otra versión.
+animation_cache = AnimationCache(ANIMATION_CACHE_DIR, ANIMATION_CACHE_MAX_MB * 1024 * 1024)
+
+@app.route('/api/animation/replay')
+def animation_replay():
+    fmt = request.args.get('format', 'gif')
+    size = request.args.get('size', type=int, default=750)
+    smoothed = request.args.get('smoothed', '0') in ('1', 'true')
+    try:
+        start = parse_range_time(request.args['start'])
+        end = parse_range_time(request.args['end']) if 'end' in request.args else datetime.now(timezone.utc)
+    except (KeyError, ValueError):
+        return jsonify({"error": "start (and optional end) must be ISO 8601 or YYYYMMDDHHMM"}), 400
+    if fmt not in ANIMATION_FORMATS or size not in OverlayCache.allowed_sizes:
+        return jsonify({"error": "Invalid format or size"}), 400
+    if not timedelta(0) < end - start <= timedelta(hours=REPLAY_MAX_HOURS):
+        return jsonify({"error": f"Range must be positive and at most {REPLAY_MAX_HOURS} h"}), 400
+
+    names = list_store_frames(FRAME_STORE_DIR, start, end)
+    if not names:
+        return jsonify({"error": "No frames in range"}), 404
+    key = hashlib.sha1(repr((names, size, smoothed, OVERLAY_PROJECTION)).encode()).hexdigest()[:20]
+
+    def build(path):
+        frames = iter_store_frames(FRAME_STORE_DIR, names, DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias'])
+        return write_animation(frames, path, fmt, size=size, smoothed=smoothed, mercator=overlay_mercator)
+
+    try:
+        path = animation_cache.get(key, fmt, build)
+    except RuntimeError as e:  # ffmpeg ausente o con error
+        logging.error(f"Falló la animación {key}.{fmt}: {e}")
+        return jsonify({"error": str(e)}), 503
+    if path is None:
+        return jsonify({"error": "No frames in range"}), 404
+    response = send_from_directory(ANIMATION_CACHE_DIR, os.path.basename(path), mimetype=ANIMATION_FORMATS[fmt],
+                                   max_age=60)
+    response.set_etag(f"{key}-{fmt}")
+    return response.make_conditional(request)
+
+@app.route('/api/animation/<run_id>')
+def serve_animation(run_id):
+    if not RUN_ID_RE.match(run_id):
+        return jsonify({"error": "Invalid run"}), 400
+    day_dir = os.path.join(ANIMATION_OUTPUT_DIR, day_key(run_id))
+    if not os.path.exists(os.path.join(day_dir, bundle_filename(run_id))):
+        return jsonify({"error": "Animation not found"}), 404
+    response = send_from_directory(day_dir, bundle_filename(run_id), mimetype='application/octet-stream',
+                                   max_age=ANIMATION_CACHE_SECONDS)
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
+
+from core.config import CONTOUR_OUTPUT_DIR
+
+# Contornos GeoJSON por frame (worker: services/radar_contours.py), ya comprimidos con gzip.
+# ?z= elige la versión simplificada del mayor zoom publicado que no supere el pedido.
+@app.route('/contours/<frame>')
+def serve_contours(frame):
+    if not FRAME_NAME_RE.match(frame):
+        return jsonify({"error": "Invalid frame"}), 400
+    frame_dir = os.path.join(CONTOUR_OUTPUT_DIR, day_key(frame), frame)
+    try:
+        with open(os.path.join(frame_dir, "contours.json")) as f:
+            zooms = sorted(json.load(f)["zooms"])
+    except (OSError, ValueError, KeyError):
+        return jsonify({"error": "Frame not found"}), 404
+    requested = request.args.get('z', type=int, default=zooms[-1])
+    zoom = max([z for z in zooms if z <= requested], default=zooms[0])
+    path = os.path.join(frame_dir, f"z{zoom}.geojson.gz")
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = send_from_directory(frame_dir, f"z{zoom}.geojson.gz", mimetype='application/geo+json',
+                                       max_age=TILE_CACHE_SECONDS)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with gzip.open(path, 'rb') as f:
+            response = app.response_class(f.read(), mimetype='application/geo+json')
+        response.cache_control.max_age = TILE_CACHE_SECONDS
+    response.vary.add('Accept-Encoding')
+    return response
+
+from functools import lru_cache
+from services.frame_store import frame_path, load_frame_codes, downsample_codes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Grilla cruda para colorear en el cliente (WebGL): los códigos uint8 del frame store, fila 0 = norte.
+# dBZ = código * X-Grid-Scale-Factor + X-Grid-Add-Offset (límite inferior del bin de 0.5 dB, así los
+# cortes TITAN son exactos); código 0 = sin dato. ?size=250 reduce por máximo de bloques 2x2.
+# Un frame publicado no cambia: el cuerpo comprimido se cachea en memoria y el ETag es su hash.
+GRID_CACHE_SECONDS = 24 * 3600
+
+def _compress_body(raw: bytes, encoding: str) -> bytes:
+    """Cuerpo en la codificación negociada por _negotiate_encoding (br / gzip / identity)."""
+    if encoding == 'br':
+        return brotli.compress(raw, quality=9)
+    if encoding == 'gzip':
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+    return raw
+
+def _encode_codes(codes: np.ndarray, factor: int, encoding: str) -> tuple:
+    """Códigos uint8 (fila 0 = sur) -> (cuerpo north-up reducido por factor, ETag, forma)."""
+    grid = np.ascontiguousarray(downsample_codes(codes, factor)[::-1])
+    raw = grid.tobytes()
+    # ETag fuerte: distinto por representación (contenido + codificación)
+    etag = f"{hashlib.sha1(raw).hexdigest()[:20]}-{encoding}"
+    return _compress_body(raw, encoding), etag, grid.shape
+
+@lru_cache(maxsize=128)
+def _encoded_grid(frame: str, factor: int, encoding: str, mtime: float) -> tuple:
+    codes = load_frame_codes(FRAME_STORE_DIR, frame)
+    return None if codes is None else _encode_codes(codes, factor, encoding)
+
+def _negotiate_encoding() -> str:
+    accepted = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    return 'gzip' if 'gzip' in accepted else 'identity'
+
+@app.route('/api/grid/<frame>')
+def serve_grid(frame):
+    if not FRAME_NAME_RE.match(frame):
+        return jsonify({"error": "Invalid frame"}), 400
+    try:
+        mtime = os.path.getmtime(frame_path(FRAME_STORE_DIR, frame))
+    except OSError:
+        return jsonify({"error": "Frame not found"}), 404
+    size = request.args.get('size', type=int, default=500)
+    if size not in (500, 250):
+        return jsonify({"error": "size must be 500 or 250"}), 400
+
+    encoding = _negotiate_encoding()
+    encoded = _encoded_grid(frame, 500 // size, encoding, mtime)
+    if encoded is None:  # la retención lo borró entre el stat y la lectura
+        return jsonify({"error": "Frame not found"}), 404
+    body, etag, (height, width) = encoded
+    response = app.response_class(body, mimetype='application/octet-stream')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = GRID_CACHE_SECONDS
+    response.vary.add('Accept-Encoding')
+    response.headers.update({
+        'X-Grid-Width': str(width), 'X-Grid-Height': str(height),
+        'X-Grid-Scale-Factor': str(DATA_CONFIG['composite_scale']), 'X-Grid-Add-Offset': str(DATA_CONFIG['composite_bias']),
+        'X-Grid-Missing': '0', 'X-Grid-Row-Order': 'north-up',
+    })
+    return response.make_conditional(request)
+
+from core.config import VOLUME_PRODUCTS_DIR
+from services.radar_volume import VOLUME_PRODUCTS, product_path, load_product_codes
+
+# Productos volumétricos de un scan (worker: services/radar_volume.py) con el mismo formato que
+# /api/grid: ?product=echo_top|vil|h45|h55, uint8 north-up, valor = código * X-Grid-Scale-Factor
+# en X-Grid-Unit (código 0 = sin eco). ?size=250 reduce por máximo de bloques 2x2.
+@lru_cache(maxsize=128)
+def _encoded_volume_product(frame: str, product: str, factor: int, encoding: str, mtime: float) -> tuple:
+    codes = load_product_codes(VOLUME_PRODUCTS_DIR, frame, product)
+    return None if codes is None else _encode_codes(codes, factor, encoding)
+
+@app.route('/api/volume/<frame>')
+def serve_volume_product(frame):
+    if not FRAME_NAME_RE.match(frame):
+        return jsonify({"error": "Invalid frame"}), 400
+    product = request.args.get('product', 'echo_top')
+    if product not in VOLUME_PRODUCTS:
+        return jsonify({"error": f"product must be one of {', '.join(VOLUME_PRODUCTS)}"}), 400
+    try:
+        mtime = os.path.getmtime(product_path(VOLUME_PRODUCTS_DIR, frame))
+    except OSError:
+        return jsonify({"error": "Frame not found"}), 404
+    size = request.args.get('size', type=int, default=500)
+    if size not in (500, 250):
+        return jsonify({"error": "size must be 500 or 250"}), 400
+
+    encoding = _negotiate_encoding()
+    encoded = _encoded_volume_product(frame, product, 500 // size, encoding, mtime)
+    if encoded is None:  # la retención lo borró entre el stat y la lectura
+        return jsonify({"error": "Frame not found"}), 404
+    body, etag, (height, width) = encoded
+    _, resolution, unit = VOLUME_PRODUCTS[product]
+    response = app.response_class(body, mimetype='application/octet-stream')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = GRID_CACHE_SECONDS
+    response.vary.add('Accept-Encoding')
+    response.headers.update({
+        'X-Grid-Width': str(width), 'X-Grid-Height': str(height),
+        'X-Grid-Scale-Factor': str(resolution), 'X-Grid-Add-Offset': '0', 'X-Grid-Unit': unit,
+        'X-Grid-Missing': '0', 'X-Grid-Row-Order': 'north-up',
+    })
+    return response.make_conditional(request)
 
 @app.route('/api/uploads/<path:filename>')
 def serve_upload(filename):
@@ -719,43 +1023,240 @@ def get_all_stations():
     stations_cache["updated_at"] = now
     
     return jsonify(cache_data), 200
+# --- Manga de Granizo (raster diario de máximos, services/hail_swath.py) ---
+# Se deriva de los rasters diarios al pedirla: máximo por celda de los días del rango (salteando con
+# el índice los días sin granizo) y, según format:
+#   points  -> GeoJSON MultiPoint de los centros de celda >= min_dbz (lo que dibuja el mapa)
+#   geojson -> GeoJSON de polígonos "dBZ >= nivel" (min_dbz y los CONTOUR_LEVELS superiores)
+#   png     -> overlay sobre la grilla de los overlays, bounds en X-Overlay-Bounds
+#   raster  -> uint8 north-up con la codificación de /api/grid (headers X-Grid-*)
+# El resultado se cachea en memoria por (días y sus mtime, formato, parámetros): un scan nuevo
+# cambia el mtime del día y con eso la clave.
+import io
+from core.config import HAIL_SWATH_DIR, HAIL_SWATH_MIN_DBZ, HAIL_SWATH_QUERY_MAX_DAYS, CONTOUR_LEVELS
+from services.hail_swath import (business_day, swath_path, swath_days, combine_swaths, dbz_code, swath_composite,
+                                 swath_points)
+from services.radar_geo import get_latlon_grid
+from services.radar_render import render_lut_png, OVERLAY_BOUNDS
+from services.radar_warp import render_mercator_overlay, get_overlay_bounds
+from services.radar_contours import contour_polygons, build_contour_geojson, zoom_tolerance_cells
+HAIL_SWATH_FORMATS = {"points": "application/geo+json", "geojson": "application/geo+json", "png": "image/png",
+                      "raster": "application/octet-stream"}
+HAIL_SWATH_CACHE_SECONDS = 60          # rangos que incluyen el día en curso
+HAIL_SWATH_PAST_CACHE_SECONDS = 3600   # días cerrados
+
+def _day_signature(directory: str, days: list, path_of) -> tuple:
+    """((día, mtime), ...) de los días listados; los que la retención borró entre el listado y el stat se saltean."""
+    signature = []
+    for day in days:
+        try:
+            signature.append((day, os.path.getmtime(path_of(directory, day))))
+        except OSError:
+            continue
+    return tuple(signature)
+
+def _grid_overlay_bounds() -> list:
+    if overlay_mercator:
+        return get_overlay_bounds(overlay_mercator["lat_0"], overlay_mercator["lon_0"], OVERLAY_GRID_KM, OVERLAY_GRID_KM,
+                                  overlay_mercator["earth_radius_m"])
+    return OVERLAY_BOUNDS
+
+def _swath_latlon_grid():
+    return get_latlon_grid(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], OVERLAY_GRID_KM,
+                           OVERLAY_GRID_KM, GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'])
+
+@lru_cache(maxsize=64)
+def _hail_swath_body(signature: tuple, fmt: str, min_dbz: float, size: int, zoom: int, encoding: str) -> tuple:
+    """(cuerpo, días que aportaron celdas, forma de la grilla) o (None, [], None) si no hay granizo en el rango."""
+    scale, bias = DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias']
+    codes, days = combine_swaths(HAIL_SWATH_DIR, [day for day, _ in signature], dbz_code(min_dbz, scale, bias))
+    if codes is None:
+        return None, [], None
+    if fmt == 'raster':
+        return _compress_body(np.ascontiguousarray(codes[::-1]).tobytes(), encoding), days, codes.shape
+    if fmt == 'png':
+        buffer = io.BytesIO()
+        composite = swath_composite(codes, scale, bias, min_dbz)
+        if overlay_mercator:
+            render_mercator_overlay(composite, buffer, size=size, **overlay_mercator)
+        else:
+            render_lut_png(composite, buffer, size=size)
+        return buffer.getvalue(), days, codes.shape
+    if fmt == 'geojson':
+        levels = [min_dbz] + [level for level in CONTOUR_LEVELS if level > min_dbz]
+        polygons = contour_polygons(swath_composite(codes, scale, bias, min_dbz), levels)
+        geojson = build_contour_geojson(polygons, _swath_latlon_grid(),
+                                        zoom_tolerance_cells(zoom, DATA_CONFIG['sensor_latitude'], 1.0))
+    else:
+        geojson = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {"date": days[-1], "min_dbz": min_dbz},
+                "geometry": {"type": "MultiPoint", "coordinates": swath_points(codes, _swath_latlon_grid(), min_dbz, scale, bias)}
+            }]
+        }
+    geojson["days"] = days  # miembro externo (RFC 7946 §6.1): días del rango con granizo
+    return json.dumps(geojson, separators=(',', ':')).encode('utf-8'), days, codes.shape
+
+def _hail_swath_response(first_day: str, last_day: str, fmt: str):
+    min_dbz = request.args.get('min_dbz', type=float, default=HAIL_SWATH_MIN_DBZ)
+    size = request.args.get('size', type=int, default=OverlayCache.default_size)
+    zoom = request.args.get('z', type=int, default=8)
+    if fmt not in HAIL_SWATH_FORMATS or size not in OverlayCache.allowed_sizes or not 0 <= zoom <= 14:
+        return jsonify({"error": f"format must be one of {', '.join(HAIL_SWATH_FORMATS)}, with a valid size and z"}), 400
+
+    min_code = dbz_code(min_dbz, DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias'])
+    signature = _day_signature(HAIL_SWATH_DIR, swath_days(HAIL_SWATH_DIR, first_day, last_day, min_code), swath_path)
+    encoding = _negotiate_encoding() if fmt == 'raster' else 'identity'
+    try:
+        body, days, shape = _hail_swath_body(signature, fmt, min_dbz, size, zoom, encoding)
+    except Exception as e:
+        logging.error(f"Error reading hail swath: {e}")
+        return jsonify({"error": str(e)}), 500
+    if body is None:
+        if fmt in ('points', 'geojson'):
+            return jsonify({"type": "FeatureCollection", "features": [], "days": []}), 200
+        return jsonify({"error": "No hail in range"}), 404
+
+    response = app.response_class(body, mimetype=HAIL_SWATH_FORMATS[fmt])
+    if fmt == 'png':
+        response.headers['X-Overlay-Bounds'] = json.dumps(_grid_overlay_bounds())
+    elif fmt == 'raster':
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers.update({
+            'X-Grid-Width': str(shape[1]), 'X-Grid-Height': str(shape[0]),
+            'X-Grid-Scale-Factor': str(DATA_CONFIG['composite_scale']), 'X-Grid-Add-Offset': str(DATA_CONFIG['composite_bias']),
+            'X-Grid-Missing': '0', 'X-Grid-Row-Order': 'north-up',
+        })
+    response.headers['X-Hail-Swath-Days'] = ','.join(days)
+    response.set_etag(hashlib.sha1(repr((signature, fmt, min_dbz, size, zoom, encoding)).encode()).hexdigest()[:20])
+    response.cache_control.max_age = HAIL_SWATH_CACHE_SECONDS if last_day >= business_day() else HAIL_SWATH_PAST_CACHE_SECONDS
+    return response.make_conditional(request)
+
 @app.route("/api/hail-swath/today", methods=['GET'])
 def get_hail_swath_today():
     # El día pluviométrico/granicero empieza a las 8 AM local (11 AM UTC)
-    now_utc = datetime.now(timezone.utc)
-    if now_utc.hour < 11:
-        from datetime import timedelta # just in case
-        business_day = now_utc - timedelta(days=1)
+    today_str = business_day()
+    return _hail_swath_response(today_str, today_str, request.args.get('format', 'points'))
+
+@app.route("/api/hail-swath", methods=['GET'])
+def get_hail_swath_range():
+    """Manga de granizo de un rango de días graniceros: ?from=YYYYMMDD&to=YYYYMMDD&min_dbz=55&format=geojson"""
+    try:
+        first = datetime.strptime(request.args['from'].replace('-', ''), "%Y%m%d")
+        last = datetime.strptime(request.args.get('to', request.args['from']).replace('-', ''), "%Y%m%d")
+    except (KeyError, ValueError):
+        return jsonify({"error": "from (and optional to) must be YYYYMMDD or YYYY-MM-DD"}), 400
+    if not timedelta(0) <= last - first < timedelta(days=HAIL_SWATH_QUERY_MAX_DAYS):
+        return jsonify({"error": f"Range must be ordered and at most {HAIL_SWATH_QUERY_MAX_DAYS} days"}), 400
+    return _hail_swath_response(first.strftime("%Y%m%d"), last.strftime("%Y%m%d"), request.args.get('format', 'geojson'))
+
+# Lluvia acumulada por día pluviométrico (worker: services/rain_accumulation.py), para un rango de días:
+#   png     -> overlay con la escala de mm (Mercator u AEQD como los demás overlays, header X-Overlay-Bounds)
+#   raster  -> float32 little-endian north-up en mm (headers X-Grid-*, X-Grid-Dtype = float32)
+# y por punto (/api/rain/point): mm de la celda de la grilla que contiene lat/lon, total y por día.
+# Como en la manga de granizo, el cuerpo se cachea por (días y sus mtime, formato, parámetros).
+from core.config import QPE_DIR, QPE_QUERY_MAX_DAYS
+from services.rain_accumulation import rain_days, rain_path, sum_rain, point_rain, grid_cell, rain_index, RAIN_LUT
+from services.radar_render import upscale_nearest, save_indexed_png
+from services.radar_warp import get_overlay_remap, warp_index
+RAIN_FORMATS = {"png": "image/png", "raster": "application/octet-stream"}
+RAIN_CACHE_SECONDS = 60          # rangos que incluyen el día en curso (el worker suma cada scan)
+RAIN_PAST_CACHE_SECONDS = 3600   # días cerrados
+
+def _rain_range(default_format: str):
+    """(primer día, último día, formato) de ?from&to&format (por defecto, el día en curso) o una respuesta 400."""
+    try:
+        today = business_day()
+        first = datetime.strptime(request.args.get('from', today).replace('-', ''), "%Y%m%d")
+        last = datetime.strptime(request.args.get('to', request.args.get('from', today)).replace('-', ''), "%Y%m%d")
+    except ValueError:
+        return None, (jsonify({"error": "from and to must be YYYYMMDD or YYYY-MM-DD"}), 400)
+    if not timedelta(0) <= last - first < timedelta(days=QPE_QUERY_MAX_DAYS):
+        return None, (jsonify({"error": f"Range must be ordered and at most {QPE_QUERY_MAX_DAYS} days"}), 400)
+    return (first.strftime("%Y%m%d"), last.strftime("%Y%m%d"), request.args.get('format', default_format)), None
+
+@lru_cache(maxsize=64)
+def _rain_body(signature: tuple, fmt: str, size: int, encoding: str) -> tuple:
+    """(cuerpo, forma de la grilla); un rango sin días con lluvia es una grilla en cero, no un error."""
+    total = sum_rain(QPE_DIR, [day for day, _ in signature])
+    if total is None:
+        total = np.zeros((len(OVERLAY_GRID_KM), len(OVERLAY_GRID_KM)), dtype=np.float32)
+    if fmt == 'raster':
+        return _compress_body(np.ascontiguousarray(total[::-1], dtype='<f4').tobytes(), encoding), total.shape
+    buffer = io.BytesIO()
+    idx = rain_index(total)
+    if overlay_mercator:
+        remap = get_overlay_remap(overlay_mercator["lat_0"], overlay_mercator["lon_0"], OVERLAY_GRID_KM, OVERLAY_GRID_KM,
+                                  GEO_CACHE_DIR, size, idx.shape[0], overlay_mercator["earth_radius_m"])
+        save_indexed_png(warp_index(idx, remap), buffer, RAIN_LUT)
     else:
-        business_day = now_utc
-        
-    today_str = business_day.strftime("%Y%m%d")
-    swath_file = os.path.join("data", f"hail_swath_{today_str}.json")
-    
-    if not os.path.exists(swath_file):
-        return jsonify({"type": "FeatureCollection", "features": []}), 200
-        
+        save_indexed_png(upscale_nearest(idx[::-1], size), buffer, RAIN_LUT)
+    return buffer.getvalue(), total.shape
+
+@app.route("/api/rain", methods=['GET'])
+def get_rain():
+    """Lluvia acumulada de un rango de días pluviométricos: ?from=YYYYMMDD&to=YYYYMMDD&format=png|raster&size=1500"""
+    parsed, error = _rain_range('png')
+    if error:
+        return error
+    first_day, last_day, fmt = parsed
+    size = request.args.get('size', type=int, default=OverlayCache.default_size)
+    if fmt not in RAIN_FORMATS or size not in OverlayCache.allowed_sizes:
+        return jsonify({"error": f"format must be one of {', '.join(RAIN_FORMATS)}, with a valid size"}), 400
+
+    signature = _day_signature(QPE_DIR, rain_days(QPE_DIR, first_day, last_day), rain_path)
+    encoding = _negotiate_encoding() if fmt == 'raster' else 'identity'
     try:
-        with open(swath_file, 'r') as f:
-            data = json.load(f)
-            points = data.get("points", [])
-            
-            # Devolver formato GeoJSON
-            geojson = {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"date": today_str},
-                    "geometry": {
-                        "type": "MultiPoint",
-                        "coordinates": points
-                    }
-                }]
-            }
-            return jsonify(geojson), 200
+        body, shape = _rain_body(signature, fmt, size, encoding)
     except Exception as e:
-        logging.error(f"Error reading hail swath: {e}")
+        logging.error(f"Error reading rain accumulation: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    response = app.response_class(body, mimetype=RAIN_FORMATS[fmt])
+    if fmt == 'png':
+        response.headers['X-Overlay-Bounds'] = json.dumps(_grid_overlay_bounds())
+    else:
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers.update({
+            'X-Grid-Width': str(shape[1]), 'X-Grid-Height': str(shape[0]), 'X-Grid-Dtype': 'float32',
+            'X-Grid-Scale-Factor': '1', 'X-Grid-Add-Offset': '0', 'X-Grid-Unit': 'mm',
+            'X-Grid-Missing': 'none', 'X-Grid-Row-Order': 'north-up',
+        })
+    response.headers['X-Rain-Days'] = ','.join(day for day, _ in signature)
+    response.set_etag(hashlib.sha1(repr((signature, fmt, size, encoding)).encode()).hexdigest()[:20])
+    response.cache_control.max_age = RAIN_CACHE_SECONDS if last_day >= business_day() else RAIN_PAST_CACHE_SECONDS
+    return response.make_conditional(request)
+
+@app.route("/api/rain/point", methods=['GET'])
+def get_rain_point():
+    """Cuánto llovió en un punto: ?lat=-34.6&lon=-68.3&from=YYYYMMDD&to=YYYYMMDD (por defecto, el día en curso)"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    parsed, error = _rain_range('json')
+    if error:
+        return error
+    first_day, last_day, _ = parsed
+    cell = grid_cell(lat, lon, DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], OVERLAY_GRID_KM,
+                     OVERLAY_GRID_KM, DATA_CONFIG['earth_radius_m'])
+    if cell is None:
+        return jsonify({"error": "Point outside radar coverage"}), 404
+    try:
+        days = point_rain(QPE_DIR, rain_days(QPE_DIR, first_day, last_day), *cell)
+    except Exception as e:
+        logging.error(f"Error reading rain accumulation: {e}")
         return jsonify({"error": str(e)}), 500
+    response = jsonify({"lat": lat, "lon": lon, "from": first_day, "to": last_day,
+                        "rain_mm": round(sum(days.values()), 1), "days": days})
+    response.cache_control.max_age = RAIN_CACHE_SECONDS if last_day >= business_day() else RAIN_PAST_CACHE_SECONDS
+    return response
 
 @app.route("/api/status")
 def get_status():
@@ -790,7 +1291,11 @@ def get_images():
             return jsonify({"input_images": [], "prediction_images": [], "message": "Image output directory not found."}), 404
 
         # Only list base images. Smoothed images are requested dynamically by the frontend.
-        all_files = [f for f in os.listdir(IMAGE_OUTPUT_DIR) if f.endswith('.png') and not f.endswith('_smoothed.png')]
+        # La raíz sólo contiene las imágenes "hot"; las viejas están en shards <YYYYMMDD>/ (worker/retention.py).
+        # Se listan los JSON de cada frame (se publican últimos y existen también en RENDER_MODE=lazy,
+        # donde el PNG se renderiza recién cuando se pide).
+        all_files = [e.name[:-len('.json')] for e in os.scandir(IMAGE_OUTPUT_DIR)
+                     if e.is_file() and e.name.endswith('.png.json')]
         
         # --- INPUT IMAGES (Last 3) ---
         input_images_names = sorted([f for f in all_files if f.startswith('INPUT_')], reverse=True)[:3]
@@ -842,6 +1347,9 @@ def get_images():
                 json_path = os.path.join(IMAGE_OUTPUT_DIR, f"{filename}.json")
                 bounds = None
                 target_time = None
+                has_tiles = False
+                has_contours = False
+                has_volume = False
                 
                 if os.path.exists(json_path):
                     try:
@@ -849,6 +1357,9 @@ def get_images():
                             data = json.load(f)
                             bounds = data.get('bounds')
                             cells = data.get('cells')
+                            has_tiles = data.get('tiles', False)
+                            has_contours = data.get('contours', False)
+                            has_volume = data.get('volume', False)
                     except Exception as e:
                         logging.warning(f"No se pudo leer o parsear el JSON '{json_path}': {e}")
                 
@@ -884,6 +1395,14 @@ def get_images():
                         "bounds": bounds,
                         "cells": cells
                     }
+                    if has_tiles:
+                        frame = filename[:-len('.png')]
+                        item["tiles_url"] = f"/tiles/{frame}/{{z}}/{{x}}/{{y}}.png"
+                    if has_contours:
+                        item["contours_url"] = f"/contours/{filename[:-len('.png')]}"
+                    item["grid_url"] = f"/api/grid/{filename[:-len('.png')]}"
+                    if has_volume:
+                        item["volume_url"] = f"/api/volume/{filename[:-len('.png')]}"
                     if target_time:
                         item["target_time"] = target_time
                         if is_prediction:
@@ -901,10 +1420,14 @@ def get_images():
                     image_data_list.append(item)
             return image_data_list
 
-        return jsonify({
+        result = {
             "input_images": create_image_data(input_images_names, is_prediction=False),
             "prediction_images": create_image_data(selected_predictions, is_prediction=True)
-        })
+        }
+        # Todo lo anterior (más los índices de cada frame) en un solo archivo cacheable
+        if sorted_run_ids and os.path.exists(os.path.join(ANIMATION_OUTPUT_DIR, day_key(latest_run_id), bundle_filename(latest_run_id))):
+            result["animation_url"] = f"/api/animation/{latest_run_id}"
+        return jsonify(result)
 
     except Exception as e:
         logging.error(f"Error al listar las imágenes: {e}")
@@ -20,6 +20,14 @@ MDV_INBOX_DIR = "/app/mdv_inbox/"         # Bandeja de entrada para archivos MDV
 MDV_ARCHIVE_DIR = "/app/mdv_archive/"     # Archivo para los MDV ya convertidos
 MDV_OUTPUT_DIR = "/app/mdv_predictions/"  # Salida de predicciones en MDV
 IMAGE_OUTPUT_DIR = "/app/output_images"
+TILE_OUTPUT_DIR = "/app/output_tiles"      # Pirámides XYZ por frame: <YYYYMMDD>/<frame>/<z>/<x>/<y>.png
+GEO_CACHE_DIR = "/app/data/geo_cache"     # Remapeos precalculados (AEQD -> Mercator, lat/lon)
+FRAME_STORE_DIR = "/app/output_frames"    # Composites por frame (.npy uint8) para render perezoso
+RENDER_CACHE_DIR = "/app/data/render_cache"  # Caché LRU de overlays renderizados por la API
+ANIMATION_OUTPUT_DIR = "/app/output_animations"  # Bundles de animación por corrida: <YYYYMMDD>/ANIM_<run>.bin
+ANIMATION_CACHE_DIR = "/app/data/animation_cache"  # Caché LRU de animaciones por rango (/api/animation/replay)
+CONTOUR_OUTPUT_DIR = "/app/output_contours"  # Contornos GeoJSON por frame: <YYYYMMDD>/<frame>/z<zoom>.geojson.gz
+VOLUME_PRODUCTS_DIR = "/app/output_volume"  # Echo top, VIL y alturas de núcleo por scan: <YYYYMMDD>/<frame>.npz
 STATUS_FILE_PATH = "/app/status.json"     # Archivo de estado para la API
 DB_PATH = "/app/data/radar_history.db"    # Base de datos SQLite
 
@@ -38,6 +46,12 @@ MODEL_CONFIG = {
 }
 
 # --- Configuración de Datos ---
+# Empaquetado de la salida NetCDF por tipo: (scale_factor, _FillValue). 'i1' (byte) es el del archivo
+# de entrada; 'i2' (short) gana precisión con un paso de 0.01 dBZ. El _FillValue es el mínimo del
+# tipo, fuera del rango que se usa para datos (_pack_dbz rechaza uno que caiga adentro).
+OUTPUT_NC_DTYPE = os.getenv("OUTPUT_NC_DTYPE", "i1")
+OUTPUT_NC_PACKING = {"i1": (0.5, -128), "i2": (0.01, -32768)}
+
 DATA_CONFIG = {
     'min_dbz': -29.0, 'max_dbz': 65.0, 'variable_name': 'DBZ',
     'prediction_interval_minutes': 3.5,
@@ -47,15 +61,129 @@ DATA_CONFIG = {
     'sensor_altitude_km': 0.55,
     'earth_radius_m': 6378137.0,
 
-    # Parámetros para empaquetar la salida como byte, igual que el archivo de entrada
-    'output_nc_scale_factor': 0.5,
+    # Parámetros para empaquetar la salida (por defecto byte, igual que el archivo de entrada)
+    'output_nc_dtype': OUTPUT_NC_DTYPE,
+    'output_nc_scale_factor': float(os.getenv("OUTPUT_NC_SCALE_FACTOR", OUTPUT_NC_PACKING[OUTPUT_NC_DTYPE][0])),
     'output_nc_add_offset': 33.5,
-    'output_nc_fill_value': -128, # _FillValue para el tipo byte
+    'output_nc_fill_value': int(os.getenv("OUTPUT_NC_FILL_VALUE", OUTPUT_NC_PACKING[OUTPUT_NC_DTYPE][1])),
+
+    # Empaquetado de los MDV de pronóstico (uint8, igual que params.nc2mdv.final)
+    'output_mdv_scale': 0.5,
+    'output_mdv_bias': -30.0,
+
+    # Composites persistidos por frame (services/frame_store.py): código uint8 = floor((dBZ - bias) / scale)
+    'composite_scale': 0.5,
+    'composite_bias': -30.0,
 }
 
 # --- Configuración de Inferencia ---
 Z_BATCH_SIZE = 2
 
+# --- Formato de Salida de Predicciones ---
+# "classic": un archivo NETCDF3_CLASSIC por paso (formato histórico, leído por NcGeneric2Mdv).
+# "multi":   un único NetCDF4 comprimido por corrida con dimensión lead_time. Los archivos
+#            clásicos sólo se generan (temporalmente) cuando hace falta convertir a MDV.
+PREDICTION_NC_FORMAT = os.getenv("PREDICTION_NC_FORMAT", "classic").lower()
+PREDICTION_MULTI_FILENAME = "forecast_multi.nc"
+
+# --- Conversión de Predicciones a MDV ---
+# "lrose":  NcGeneric2Mdv sobre los NetCDF clásicos (comportamiento histórico, por defecto).
+# "native": escritor MDV en proceso (worker/mdv_writer.py), sin subprocess ni archivo de params.
+#           Verificar la salida con test_mdv_writer.py (y PrintMdv/Mdv2NetCDF) antes de activarlo.
+MDV_WRITER = os.getenv("MDV_WRITER", "lrose").lower()
+
+# --- Pool de Escritura de Salidas ---
+OUTPUT_IO_WORKERS = int(os.getenv("OUTPUT_IO_WORKERS", "4"))   # hilos: NetCDF / MDV / JSON
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))  # procesos: PNG
+
+# --- Render de Overlays ---
+# Versión "_smoothed.png": "lut" (bicúbica + LUT, en la misma pasada que el pixel exacto),
+# "contourf" (matplotlib, histórico y ~8x más lento) u "off" (no se genera).
+SMOOTHED_RENDER = os.getenv("SMOOTHED_RENDER", "lut").lower()
+# "eager": el worker renderiza los PNG de cada frame. "lazy": sólo persiste el composite cuantizado
+# y la API renderiza cada variante la primera vez que se pide (caché LRU en RENDER_CACHE_DIR).
+RENDER_MODE = os.getenv("RENDER_MODE", "eager").lower()
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "500"))
+# Además del PNG paletizado, cada overlay se guarda en WebP lossless (/images elige según Accept)
+OVERLAY_WEBP = os.getenv("OVERLAY_WEBP", "true").lower() == "true"
+# Proyección de los overlays: "mercator" (remapeo AEQD->Mercator precalculado, services/radar_warp.py;
+# queda bien geolocalizado sobre el mapa) o "aeqd" (histórico, en km; deformado hasta ~14 km en los bordes).
+# El remapeo sólo aplica a la versión suavizada por LUT: con SMOOTHED_RENDER=contourf se usa "aeqd".
+OVERLAY_PROJECTION = os.getenv("OVERLAY_PROJECTION", "mercator").lower()
+if SMOOTHED_RENDER == "contourf":
+    OVERLAY_PROJECTION = "aeqd"
+
+# --- Bundle de Animación (services/animation_bundle.py) ---
+# Un archivo por corrida con los inputs y el pronóstico como deltas indexados; lado de la capa
+# suavizada en píxeles (0 = sólo la capa pixel exacta).
+ANIMATION_BUNDLE_ENABLED = os.getenv("ANIMATION_BUNDLE_ENABLED", "true").lower() == "true"
+ANIMATION_SMOOTHED_SIZE = int(os.getenv("ANIMATION_SMOOTHED_SIZE", "750"))
+# Animaciones de eventos (GIF/MP4/WebP, services/radar_animation.py) generadas en streaming y cacheadas
+ANIMATION_CACHE_MAX_MB = int(os.getenv("ANIMATION_CACHE_MAX_MB", "500"))
+REPLAY_MAX_HOURS = int(os.getenv("REPLAY_MAX_HOURS", "24"))
+
+# --- Seguimiento de Celdas (services/cell_tracker.py) ---
+# Estado del tracker (celdas del último scan con ID y velocidad) para retomar los tracks tras un reinicio.
+# Se asocian celdas a menos de TRACK_GATE_KM + TRACK_MAX_SPEED_KMH * dt de su posición extrapolada;
+# un hueco entre scans mayor a TRACK_MAX_GAP_MINUTES reinicia los tracks.
+CELL_TRACKS_PATH = "/app/data/cell_tracks.npz"
+TRACK_MAX_SPEED_KMH = float(os.getenv("TRACK_MAX_SPEED_KMH", "100"))
+TRACK_GATE_KM = float(os.getenv("TRACK_GATE_KM", "5"))
+TRACK_MAX_GAP_MINUTES = float(os.getenv("TRACK_MAX_GAP_MINUTES", "20"))
+
+# --- Manga de Granizo (services/hail_swath.py) ---
+# Raster diario (día granicero, desde las 11 UTC) con el máximo de dBZ de los scans observados
+HAIL_SWATH_DIR = "/app/data/hail_swath"
+HAIL_SWATH_MIN_DBZ = float(os.getenv("HAIL_SWATH_MIN_DBZ", "55"))
+HAIL_SWATH_QUERY_MAX_DAYS = int(os.getenv("HAIL_SWATH_QUERY_MAX_DAYS", "366"))  # rango máximo de /api/hail-swath
+
+# --- Lluvia Acumulada (services/rain_accumulation.py) ---
+# Raster diario (mismo día pluviométrico, desde las 11 UTC) con la suma de los scans observados
+# convertidos con Z = a * R^b. Cada scan pesa el intervalo real desde el anterior; el primero, o
+# uno después de un hueco mayor a QPE_MAX_GAP_MINUTES, pesa QPE_DEFAULT_INTERVAL_MINUTES.
+QPE_DIR = "/app/data/rain_accumulation"
+QPE_ZR_A = float(os.getenv("QPE_ZR_A", "200"))
+QPE_ZR_B = float(os.getenv("QPE_ZR_B", "1.6"))
+QPE_MIN_DBZ = float(os.getenv("QPE_MIN_DBZ", "15"))   # debajo no se considera lluvia
+QPE_MAX_DBZ = float(os.getenv("QPE_MAX_DBZ", "53"))   # tope por granizo
+QPE_DEFAULT_INTERVAL_MINUTES = float(os.getenv("QPE_DEFAULT_INTERVAL_MINUTES", "5"))
+QPE_MAX_GAP_MINUTES = float(os.getenv("QPE_MAX_GAP_MINUTES", "15"))
+QPE_QUERY_MAX_DAYS = int(os.getenv("QPE_QUERY_MAX_DAYS", "366"))  # rango máximo de /api/rain
+
+# --- Contornos Vectoriales (services/radar_contours.py) ---
+# Polígonos "dBZ >= nivel" en GeoJSON, simplificados para cada zoom de CONTOUR_ZOOMS
+CONTOURS_ENABLED = os.getenv("CONTOURS_ENABLED", "true").lower() == "true"
+CONTOUR_LEVELS = [float(v) for v in os.getenv("CONTOUR_LEVELS", "20,35,45,55,60").split(",")]
+CONTOUR_ZOOMS = [int(v) for v in os.getenv("CONTOUR_ZOOMS", "6,8,10").split(",")]
+
+# --- Tiles XYZ (Web Mercator) ---
+TILES_ENABLED = os.getenv("TILES_ENABLED", "true").lower() == "true"
+TILE_MIN_ZOOM = int(os.getenv("TILE_MIN_ZOOM", "6"))
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "11"))
+
+# --- Retención de Artefactos (worker/retention.py) ---
+# Cada directorio se organiza en shards <dir>/<YYYYMMDD>/ con presupuesto de tamaño (GB) y antigüedad (días).
+# IMAGE_OUTPUT_DIR mantiene en la raíz sólo los últimos IMAGE_HOT_MINUTES de actividad (lo que lista /api/images).
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "600"))
+IMAGE_HOT_MINUTES = int(os.getenv("IMAGE_HOT_MINUTES", "60"))
+RETENTION_POLICIES = {
+    ARCHIVE_DIR: {"max_gb": float(os.getenv("ARCHIVE_MAX_GB", "20")), "max_days": int(os.getenv("ARCHIVE_MAX_DAYS", "7"))},
+    MDV_ARCHIVE_DIR: {"max_gb": float(os.getenv("MDV_ARCHIVE_MAX_GB", "10")), "max_days": int(os.getenv("MDV_ARCHIVE_MAX_DAYS", "14"))},
+    OUTPUT_DIR: {"max_gb": float(os.getenv("OUTPUT_MAX_GB", "10")), "max_days": int(os.getenv("OUTPUT_MAX_DAYS", "3"))},
+    MDV_OUTPUT_DIR: {"max_gb": float(os.getenv("MDV_OUTPUT_MAX_GB", "5")), "max_days": int(os.getenv("MDV_OUTPUT_MAX_DAYS", "7"))},
+    IMAGE_OUTPUT_DIR: {"max_gb": float(os.getenv("IMAGE_MAX_GB", "5")), "max_days": int(os.getenv("IMAGE_MAX_DAYS", "7")),
+                       "hot_minutes": IMAGE_HOT_MINUTES},
+    FRAME_STORE_DIR: {"max_gb": float(os.getenv("FRAME_STORE_MAX_GB", "2")), "max_days": int(os.getenv("FRAME_STORE_MAX_DAYS", "7"))},
+    TILE_OUTPUT_DIR: {"max_gb": float(os.getenv("TILE_MAX_GB", "5")), "max_days": int(os.getenv("TILE_MAX_DAYS", "2"))},
+    CONTOUR_OUTPUT_DIR: {"max_gb": float(os.getenv("CONTOUR_MAX_GB", "1")), "max_days": int(os.getenv("CONTOUR_MAX_DAYS", "2"))},
+    ANIMATION_OUTPUT_DIR: {"max_gb": float(os.getenv("ANIMATION_MAX_GB", "1")), "max_days": int(os.getenv("ANIMATION_MAX_DAYS", "2"))},
+    VOLUME_PRODUCTS_DIR: {"max_gb": float(os.getenv("VOLUME_PRODUCTS_MAX_GB", "1")), "max_days": int(os.getenv("VOLUME_PRODUCTS_MAX_DAYS", "7"))},
+    # ~250 KB por día: se guarda un historial largo para consultas por rango
+    HAIL_SWATH_DIR: {"max_gb": float(os.getenv("HAIL_SWATH_MAX_GB", "1")), "max_days": int(os.getenv("HAIL_SWATH_MAX_DAYS", "730"))},
+    # ~1 MB por día (float32)
+    QPE_DIR: {"max_gb": float(os.getenv("QPE_MAX_GB", "1")), "max_days": int(os.getenv("QPE_MAX_DAYS", "366"))},
+}
+
 # --- Seguridad ---
 # IMPORTANTE: En producción, SECRET_KEY debe estar en variables de entorno
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-this-in-prod")
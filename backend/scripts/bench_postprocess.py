@@ -0,0 +1,83 @@
+"""
+Benchmark de memoria y tiempo de postprocess_prediction (in-place) contra la versión anterior
+basada en copias numpy.
+
+Uso (desde backend/):  PYTHONPATH=. python scripts/bench_postprocess.py [--steps 7] [--repeat 5]
+
+Cada variante corre en un proceso nuevo para que el pico de RSS (ru_maxrss) no se contamine.
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+import torch
+
+
+def postprocess_prediction_legacy(prediction_norm: torch.Tensor, data_cfg: dict) -> np.ndarray:
+    # Copia fiel del camino anterior: upsample + 3 buffers numpy + nan_to_num en el writer
+    b, t, c, h, w = prediction_norm.shape
+    pred_upsampled = torch.nn.functional.interpolate(
+        prediction_norm.view(b * t, c, h, w), size=(500, 500), mode='bicubic', align_corners=False
+    ).view(b, t, c, 500, 500)
+    output_np = pred_upsampled.cpu().numpy()
+    raw = output_np * (data_cfg['max_dbz'] - data_cfg['min_dbz']) + data_cfg['min_dbz']
+    clipped = np.clip(raw, data_cfg['min_dbz'], data_cfg['max_dbz'])
+    cleaned = clipped.copy()
+    cleaned[cleaned < data_cfg.get('physical_threshold_dbz', 30.0)] = np.nan
+    result = cleaned[0]
+    for i in range(result.shape[0]):
+        np.nan_to_num(result[i][np.newaxis], nan=np.float32(-999.0))
+    return result
+
+
+def _peak_rss_mb() -> float:
+    # Linux reporta ru_maxrss en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _run(variant: str, steps: int, repeat: int, queue):
+    from core.config import DATA_CONFIG
+    from worker.main import postprocess_prediction, _pack_dbz
+
+    torch.set_num_threads(1)
+    prediction = torch.rand((1, steps, 1, 250, 250), dtype=torch.float32)
+    baseline = _peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if variant == "legacy":
+            out = postprocess_prediction_legacy(prediction, DATA_CONFIG)
+        else:
+            out = postprocess_prediction(prediction)
+            for i in range(out.shape[0]):
+                _pack_dbz(out[i], DATA_CONFIG)
+        timings.append(time.perf_counter() - start)
+        del out
+
+    queue.put((variant, _peak_rss_mb() - baseline, min(timings)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de postprocess_prediction")
+    parser.add_argument('--steps', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    full_frame_mb = args.steps * 500 * 500 * 4 / 1024 / 1024
+    print(f"Tamaño de un buffer (1, {args.steps}, 1, 500, 500) float32: {full_frame_mb:.1f} MB")
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for variant in ("legacy", "inplace"):
+        proc = ctx.Process(target=_run, args=(variant, args.steps, args.repeat, queue))
+        proc.start()
+        proc.join()
+        name, peak_delta, best = queue.get()
+        print(f"{name:>8}: pico RSS +{peak_delta:6.1f} MB ({peak_delta / full_frame_mb:.1f} buffers) | mejor tiempo {best * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
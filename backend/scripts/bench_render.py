@@ -0,0 +1,87 @@
+"""
+Benchmark y verificación del render por LUT contra matplotlib: pixel exacto (pcolormesh) y
+versión suavizada (bicúbica + LUT vs contourf).
+
+Uso (desde backend/):  PYTHONPATH=. python scripts/bench_render.py [--repeat 5]
+
+Compara el color de cada celda del grid en ambas imágenes (muestreando el centro de la celda)
+y reporta el porcentaje de coincidencia exacta de RGBA y la mejora de tiempo. Para la versión
+suavizada la coincidencia no es exacta: contourf ya difiere ~7% del propio pcolormesh en los
+centros de celda, así que ~93% es el valor esperado.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+
+from services.radar_render import (render_lut_png, render_pixel_matplotlib, render_smoothed_lut_png,
+                                   render_smoothed_contourf, TITAN_BOUNDS)
+
+
+def synthetic_composite(n: int = 500, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    field = gaussian_filter(rng.normal(size=(n, n)), 12)
+    field = (field - field.min()) / (field.max() - field.min()) * 90.0 - 10.0
+    field[field < 0] = np.nan
+    # Incluye valores exactamente en los límites para verificar el criterio [b_i, b_i+1)
+    field[0, :len(TITAN_BOUNDS)] = TITAN_BOUNDS
+    return field.astype(np.float32)
+
+
+def sample_cells(image_path: str, n: int) -> np.ndarray:
+    img = np.asarray(Image.open(image_path).convert('RGBA'))
+    h, w = img.shape[:2]
+    rows = ((np.arange(n) + 0.5) * h / n).astype(int)
+    cols = ((np.arange(n) + 0.5) * w / n).astype(int)
+    return img[rows[:, np.newaxis], cols][::-1]  # fila 0 = sur, como el grid
+
+
+def best_time(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    n = 500
+    composite = synthetic_composite(n)
+    x = np.arange(n, dtype=np.float32) - 249.5
+    y = np.arange(n, dtype=np.float32) - 249.5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("pixel", lambda p: render_pixel_matplotlib(x, y, composite, p), lambda p: render_lut_png(composite, p)),
+            ("suavizado", lambda p: render_smoothed_contourf(x, y, composite, p), lambda p: render_smoothed_lut_png(composite, p)),
+        ]
+        for name, mpl_fn, lut_fn in cases:
+            mpl_path = os.path.join(tmp, f'{name}_mpl.png')
+            lut_path = os.path.join(tmp, f'{name}_lut.png')
+            t_mpl = best_time(lambda: mpl_fn(mpl_path), args.repeat)
+            t_lut = best_time(lambda: lut_fn(lut_path), args.repeat)
+
+            mpl_cells = sample_cells(mpl_path, n)
+            lut_cells = sample_cells(lut_path, n)
+            # Sin alpha sólo importa la transparencia, no el RGB de fondo
+            mpl_cells[mpl_cells[..., 3] == 0] = 0
+            lut_cells[lut_cells[..., 3] == 0] = 0
+            match = np.all(mpl_cells == lut_cells, axis=-1).mean() * 100
+
+            print(f"[{name}]")
+            print(f"  matplotlib: {t_mpl * 1000:8.1f} ms  {Image.open(mpl_path).size}  {os.path.getsize(mpl_path) / 1e3:8.1f} KB")
+            print(f"  LUT:        {t_lut * 1000:8.1f} ms  {Image.open(lut_path).size}  {os.path.getsize(lut_path) / 1e3:8.1f} KB")
+            print(f"  Speedup: {t_mpl / t_lut:.1f}x   Celdas con RGBA idéntico: {match:.3f}%")
+
+
+if __name__ == '__main__':
+    main()
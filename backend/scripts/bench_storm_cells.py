@@ -0,0 +1,97 @@
+"""
+Benchmark y verificación de detect_storm_cells (reducciones por etiqueta sobre los píxeles
+etiquetados) contra la versión anterior, que armaba una máscara del grid completo por cada celda.
+
+Uso (desde backend/):
+  PYTHONPATH=. python scripts/bench_storm_cells.py [--repeat 10]
+  PYTHONPATH=. python scripts/bench_storm_cells.py --nc /app/archive_scans/20260115/scan.nc
+
+Sin --nc se usa un composite sintético de día de tormenta (muchas celdas > 50 dBZ). Verifica que
+ambas versiones devuelvan exactamente las mismas celdas y reporta el tiempo de cada una.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.ndimage import label, gaussian_filter
+
+from core.config import DATA_CONFIG, GEO_CACHE_DIR
+from services.radar_geo import get_latlon_grid
+from worker.main import detect_storm_cells
+
+
+def detect_storm_cells_legacy(dbz_data, latlon_grid):
+    # Copia fiel de la versión anterior (una máscara 500x500 por celda); la geolocalización usa la
+    # misma tabla lat/lon para comparar sólo la extracción de celdas
+    cells = []
+    mask = dbz_data > 50.0
+    if not np.any(mask):
+        return []
+    labeled_array, num_features = label(mask)
+    for label_idx in range(1, num_features + 1):
+        cell_mask = (labeled_array == label_idx)
+        max_dbz = float(np.max(dbz_data[cell_mask]))
+        hazard_type = "Lluvia Torrencial"
+        if max_dbz > 58:
+            hazard_type = "Granizo Confirmado"
+        elif max_dbz > 55:
+            hazard_type = "Probable Granizo"
+        y_indices, x_indices = np.where(cell_mask & (dbz_data >= max_dbz - 0.1))
+        mean_y_idx = int(np.mean(y_indices))
+        mean_x_idx = int(np.mean(x_indices))
+        px_x = max(0, min(mean_x_idx, latlon_grid.shape[2] - 1))
+        px_y = max(0, min(mean_y_idx, latlon_grid.shape[1] - 1))
+        lat, lon = float(latlon_grid[0][px_y, px_x]), float(latlon_grid[1][px_y, px_x])
+        cells.append({"type": hazard_type, "max_dbz": round(max_dbz, 1), "lat": round(lat, 5), "lon": round(lon, 5)})
+    return cells
+
+
+def storm_day_composite(n: int = 500, seed: int = 0) -> np.ndarray:
+    """Campo de fondo estratiforme con cientos de núcleos convectivos (incluye empates en el máximo)."""
+    rng = np.random.default_rng(seed)
+    field = gaussian_filter(rng.normal(size=(n, n)), 4)
+    field = (field - field.min()) / (field.max() - field.min()) * 75.0 - 5.0
+    field[field < 5.0] = np.nan
+    # Valores cuantizados a 0.5 dBZ como en el frame store, para que haya núcleos de varios píxeles
+    return (np.round(field * 2) / 2).astype(np.float32)
+
+
+def load_nc_composite(path: str) -> np.ndarray:
+    from netCDF4 import Dataset
+    with Dataset(path, 'r') as nc:
+        data = np.ma.filled(np.squeeze(nc.variables['DBZ'][:]).astype(np.float32), np.nan)
+    return np.nanmax(data[3:], axis=0) if data.ndim == 3 else data
+
+
+def timed(fn, repeat: int, *args) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nc', help="NetCDF de un scan real (por defecto, composite sintético)")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    composite = load_nc_composite(args.nc) if args.nc else storm_day_composite()
+    n = composite.shape[0]
+    x = y = np.arange(-(n - 1) / 2, n / 2, 1.0, dtype=np.float32)
+    latlon_grid = get_latlon_grid(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], x, y,
+                                  GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'])
+
+    legacy, t_legacy = timed(detect_storm_cells_legacy, args.repeat, composite, latlon_grid)
+    current, t_current = timed(detect_storm_cells, args.repeat, composite, latlon_grid)
+
+    print(f"Celdas: {len(current)}  (píxeles > 50 dBZ: {int(np.sum(composite > 50))})")
+    print(f"Salida idéntica: {'sí' if current == legacy else 'NO'}")
+    print(f"Anterior: {t_legacy * 1000:8.1f} ms")
+    print(f"Actual:   {t_current * 1000:8.1f} ms  ({t_legacy / t_current:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
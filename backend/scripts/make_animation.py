@@ -0,0 +1,78 @@
+"""
+Animación de un evento (GIF / MP4 / WebP) en streaming, con memoria constante.
+
+Uso (desde backend/):
+  PYTHONPATH=. python scripts/make_animation.py --start 2026-01-15T18:00 --end 2026-01-15T23:00 -o tormenta.gif
+  PYTHONPATH=. python scripts/make_animation.py --run 20260115-203000 -o pronostico.mp4 --fps 3
+  PYTHONPATH=. python scripts/make_animation.py --nc-dir /app/archive_scans/20260115 -o evento.webp --smoothed
+
+Los frames salen del frame store (FRAME_STORE_DIR, los últimos días) o de una carpeta de NetCDF
+(archivo de scans). El formato se toma de la extensión de --output; MP4 y WebP requieren ffmpeg.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from core.config import DATA_CONFIG, FRAME_STORE_DIR, GEO_CACHE_DIR
+from services.radar_animation import (ANIMATION_FORMATS, list_store_frames, iter_store_frames, iter_nc_frames,
+                                      write_animation, parse_range_time)
+
+
+def mercator_kwargs() -> dict:
+    grid_km = np.arange(-249.5, 250.0, 1.0, dtype=np.float32)
+    return {"x_km": grid_km, "y_km": grid_km, "lat_0": DATA_CONFIG['sensor_latitude'],
+            "lon_0": DATA_CONFIG['sensor_longitude'], "cache_dir": GEO_CACHE_DIR,
+            "earth_radius_m": DATA_CONFIG['earth_radius_m']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--start', type=parse_range_time, help="Inicio del rango (UTC) en el frame store")
+    source.add_argument('--run', help="Corrida de pronóstico (RUN_ID) en el frame store")
+    source.add_argument('--nc-dir', help="Carpeta con NetCDF (se animan en orden de nombre)")
+    parser.add_argument('--end', type=parse_range_time, help="Fin del rango (UTC); por defecto, ahora")
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--size', type=int, default=750, help="Ancho en píxeles")
+    parser.add_argument('--fps', type=float, default=4.0)
+    parser.add_argument('--smoothed', action='store_true', help="Versión suavizada en lugar de pixel exacto")
+    parser.add_argument('--projection', choices=['mercator', 'aeqd'], default='mercator')
+    parser.add_argument('--background', help="Color de fondo #rrggbb (por defecto transparente; MP4 usa negro)")
+    parser.add_argument('--no-label', action='store_true', help="Sin timestamp sobre cada frame")
+    args = parser.parse_args()
+
+    fmt = os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in ANIMATION_FORMATS:
+        parser.error(f"Extensión no soportada: .{fmt} (usar {', '.join(ANIMATION_FORMATS)})")
+
+    scale, bias = DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias']
+    if args.nc_dir:
+        frames = iter_nc_frames(sorted(glob.glob(os.path.join(args.nc_dir, "*.nc"))))
+    else:
+        if args.run:
+            # Los frames del pronóstico son posteriores a la corrida (el día de margen cubre la medianoche)
+            start = datetime.strptime(args.run, "%Y%m%d-%H%M%S").replace(tzinfo=timezone.utc)
+            end = start + timedelta(days=1)
+        else:
+            start, end = args.start, args.end or datetime.now(timezone.utc)
+        names = list_store_frames(FRAME_STORE_DIR, start, end, run_id=args.run)
+        print(f"{len(names)} frames en el frame store")
+        frames = iter_store_frames(FRAME_STORE_DIR, names, scale, bias)
+
+    t0 = time.perf_counter()
+    count = write_animation(frames, args.output, fmt, size=args.size, fps=args.fps, smoothed=args.smoothed,
+                            mercator=mercator_kwargs() if args.projection == 'mercator' else None,
+                            background=args.background, label=not args.no_label)
+    if not count:
+        print("No hay frames para animar.")
+        sys.exit(1)
+    print(f"{args.output}: {count} frames, {os.path.getsize(args.output) / 1e6:.1f} MB en {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
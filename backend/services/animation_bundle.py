@@ -0,0 +1,121 @@
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from services.frame_store import load_frame
+from services.radar_render import quantize_titan, smoothed_titan_index, TITAN_LUT, OVERLAY_BOUNDS
+from services.radar_warp import mercator_overlay_index, get_overlay_bounds
+
+# =================================================================
+# Bundle de animación por corrida: los frames de entrada y de pronóstico (pixel y suavizado)
+# más su metadata en un único archivo binario, para que una carga en frío sea 1-2 requests.
+#
+# Layout (little-endian):
+#   b"RDRA" | u8 versión | 3 bytes reservados | u32 largo del header | header JSON (utf-8) | chunks
+# Cada chunk es un stream zlib (DecompressionStream('deflate') en el navegador) con los índices
+# uint8 de la paleta del header, fila 0 = norte. El primer frame de cada capa va completo y los
+# siguientes como XOR contra el anterior: las celdas sin cambio quedan en 0 y comprimen casi gratis.
+# Con mercator (kwargs geográficos de mercator_overlay_index) las capas son las mismas que sirve
+# /images en Mercator y header["bounds"] es el bbox exacto del dominio; sin él, AEQD y OVERLAY_BOUNDS.
+# header["chunks"] da capa, frame, offset (relativo al inicio de los chunks) y largo de cada uno.
+# =================================================================
+
+BUNDLE_MAGIC = b"RDRA"
+BUNDLE_VERSION = 1
+ZLIB_LEVEL = 6
+
+
+def bundle_filename(run_id: str) -> str:
+    return f"ANIM_{run_id}.bin"
+
+
+def _layer_indices(composite_2d: np.ndarray, smoothed_size: int, mercator: dict = None) -> dict:
+    if mercator:
+        layers = {"pixel": mercator_overlay_index(composite_2d, size=composite_2d.shape[1], **mercator)}
+        if smoothed_size:
+            layers["smoothed"] = mercator_overlay_index(composite_2d, size=smoothed_size, smoothed=True, **mercator)
+        return layers
+    layers = {"pixel": quantize_titan(composite_2d)[::-1]}
+    if smoothed_size:
+        layers["smoothed"] = smoothed_titan_index(composite_2d, size=smoothed_size)
+    return layers
+
+
+def _bundle_bounds(mercator: dict = None) -> list:
+    if mercator:
+        return get_overlay_bounds(mercator["lat_0"], mercator["lon_0"], mercator["x_km"], mercator["y_km"],
+                                  mercator["earth_radius_m"])
+    return OVERLAY_BOUNDS
+
+
+def encode_bundle(frames: list, run_id: str, smoothed_size: int = 0, mercator: dict = None) -> bytes:
+    """
+    frames: [{"frame": nombre, "composite": 2D float (fila 0 = sur), ...metadata}] en orden de animación.
+    Todo lo que no sea "composite" se copia tal cual al header. mercator: kwargs geográficos de
+    mercator_overlay_index, o None (AEQD).
+    """
+    previous = {}
+    layers = {}
+    chunks = []
+    body = []
+    offset = 0
+    for frame_index, frame in enumerate(frames):
+        for layer, idx in _layer_indices(frame["composite"], smoothed_size, mercator).items():
+            idx = np.ascontiguousarray(idx)
+            layers.setdefault(layer, {"width": idx.shape[1], "height": idx.shape[0]})
+            keyframe = layer not in previous
+            payload = zlib.compress((idx if keyframe else idx ^ previous[layer]).tobytes(), ZLIB_LEVEL)
+            previous[layer] = idx
+            chunks.append({"layer": layer, "frame": frame_index, "keyframe": keyframe,
+                           "offset": offset, "length": len(payload)})
+            body.append(payload)
+            offset += len(payload)
+
+    header = json.dumps({
+        "run_id": run_id,
+        "encoding": "xor-delta+zlib",
+        "palette": TITAN_LUT.tolist(),
+        "bounds": _bundle_bounds(mercator),
+        "layers": layers,
+        "frames": [{k: v for k, v in frame.items() if k != "composite"} for frame in frames],
+        "chunks": chunks,
+    }, separators=(',', ':')).encode('utf-8')
+    return b"".join([BUNDLE_MAGIC, struct.pack("<B3xI", BUNDLE_VERSION, len(header)), header] + body)
+
+
+def decode_bundle(data: bytes) -> tuple:
+    """Inverso de encode_bundle: (header, {capa: [índices 2D por frame]}). Referencia para clientes."""
+    if data[:4] != BUNDLE_MAGIC:
+        raise ValueError("No es un bundle de animación")
+    version, header_len = struct.unpack_from("<B3xI", data, 4)
+    if version != BUNDLE_VERSION:
+        raise ValueError(f"Versión de bundle no soportada: {version}")
+    start = 4 + struct.calcsize("<B3xI")
+    header = json.loads(data[start:start + header_len])
+    body = start + header_len
+    decoded = {layer: [] for layer in header["layers"]}
+    for chunk in header["chunks"]:
+        shape = (header["layers"][chunk["layer"]]["height"], header["layers"][chunk["layer"]]["width"])
+        raw = zlib.decompress(data[body + chunk["offset"]:body + chunk["offset"] + chunk["length"]])
+        idx = np.frombuffer(raw, dtype=np.uint8).reshape(shape)
+        frames = decoded[chunk["layer"]]
+        frames.append(idx if chunk["keyframe"] else idx ^ frames[-1])
+    return header, decoded
+
+
+def write_bundle(output_path: str, frames: list, run_id: str, frame_store_dir: str, scale: float, bias: float,
+                 smoothed_size: int = 0, mercator: dict = None) -> str:
+    """
+    Arma el bundle leyendo cada composite del frame store (el render desde ahí es idéntico al del
+    float original). frames: [{"frame": nombre, ...metadata}]; los que no estén en el store se omiten.
+    """
+    loaded = []
+    for frame in frames:
+        composite = load_frame(frame_store_dir, frame["frame"], scale, bias)
+        if composite is not None:
+            loaded.append({**frame, "composite": composite})
+    with open(output_path, 'wb') as f:
+        f.write(encode_bundle(loaded, run_id, smoothed_size, mercator))
+    return output_path
@@ -0,0 +1,166 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# =================================================================
+# Seguimiento incremental de celdas de tormenta.
+# Se guardan en memoria sólo las celdas del scan anterior (posición en km sobre un plano local
+# centrado en el radar, velocidad, edad e ID); cada scan nuevo se asocia contra la posición
+# extrapolada de esas celdas con un KD-tree y una asignación greedy uno a uno por distancia.
+# Las celdas salen anotadas con id, velocidad y rumbo, así que las alertas y la API leen el
+# movimiento directamente de la lista de celdas. El estado (unos pocos arrays) se persiste en un
+# .npz chico para sobrevivir a un reinicio del worker.
+# =================================================================
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQ = 111.320
+VELOCITY_SMOOTHING = 0.5  # peso del desplazamiento nuevo en el promedio exponencial de la velocidad
+MIN_ALERT_SPEED_KMH = 5.0  # por debajo, la celda se considera estacionaria
+
+
+def _local_km(lat, lon, lat_0: float, lon_0: float) -> tuple:
+    """Plano equirectangular centrado en (lat_0, lon_0): (x hacia el este, y hacia el norte) en km."""
+    x = (np.asarray(lon) - lon_0) * KM_PER_DEG_LON_EQ * np.cos(np.radians(lat_0))
+    y = (np.asarray(lat) - lat_0) * KM_PER_DEG_LAT
+    return x, y
+
+
+def approach(cell: dict, lat: float, lon: float):
+    """
+    Movimiento de una celda anotada respecto de un punto: (velocidad de acercamiento km/h, ETA en
+    minutos o None). La velocidad es positiva si la celda se acerca; None si la celda no tiene
+    movimiento estimado o está prácticamente quieta.
+    """
+    speed = cell.get("speed_kmh")
+    if speed is None or speed < MIN_ALERT_SPEED_KMH:
+        return None
+    dx, dy = _local_km(lat, lon, cell["lat"], cell["lon"])
+    dist = float(np.hypot(dx, dy))
+    heading = np.radians(cell["heading_deg"])
+    vx, vy = speed * np.sin(heading), speed * np.cos(heading)
+    closing = float((vx * dx + vy * dy) / dist) if dist > 0 else speed
+    eta_min = dist / closing * 60.0 if closing > 0 else None
+    return closing, eta_min
+
+
+class CellTracker:
+    """
+    Asociación scan a scan de las celdas de detect_storm_cells. update() anota cada celda con:
+      id (persistente), track_age (scans seguidos), speed_kmh y heading_deg (hacia dónde va, 0 = norte)
+    """
+
+    def __init__(self, lat_0: float, lon_0: float, state_path: str = None, max_speed_kmh: float = 100.0,
+                 gate_km: float = 5.0, max_gap_minutes: float = 20.0):
+        self.lat_0 = lat_0
+        self.lon_0 = lon_0
+        self.state_path = state_path
+        self.max_speed_kmh = max_speed_kmh
+        self.gate_km = gate_km
+        self.max_gap_minutes = max_gap_minutes
+        self._reset()
+        if state_path:
+            self._load()
+
+    def _reset(self):
+        self.last_time = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.xy = np.empty((0, 2), dtype=np.float64)
+        self.velocity = np.empty((0, 2), dtype=np.float64)  # km/h (este, norte)
+        self.age = np.empty(0, dtype=np.int32)
+        self.next_id = 1
+
+    def _load(self):
+        try:
+            with np.load(self.state_path) as state:
+                self.last_time = datetime.fromtimestamp(float(state["last_time"]), timezone.utc)
+                self.ids, self.xy, self.velocity = state["ids"], state["xy"], state["velocity"]
+                self.age, self.next_id = state["age"], int(state["next_id"])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"No se pudo leer el estado del tracker ({self.state_path}): {e}")
+            self._reset()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temp_path = f"{self.state_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, last_time=self.last_time.timestamp(), ids=self.ids, xy=self.xy, velocity=self.velocity,
+                     age=self.age, next_id=self.next_id)
+        os.replace(temp_path, self.state_path)
+
+    def _match(self, predicted: np.ndarray, current: np.ndarray, gate_km: float) -> tuple:
+        """Pares (previa, actual) uno a uno dentro del radio, de menor a mayor distancia."""
+        if len(predicted) == 0 or len(current) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pairs = cKDTree(predicted).sparse_distance_matrix(cKDTree(current), gate_km, output_type='ndarray')
+        order = np.argsort(pairs['v'], kind='stable')
+        used_prev, used_curr, prev_idx, curr_idx = set(), set(), [], []
+        for i, j in zip(pairs['i'][order].tolist(), pairs['j'][order].tolist()):
+            if i in used_prev or j in used_curr:
+                continue
+            used_prev.add(i)
+            used_curr.add(j)
+            prev_idx.append(i)
+            curr_idx.append(j)
+        return np.array(prev_idx, dtype=np.int64), np.array(curr_idx, dtype=np.int64)
+
+    def update(self, cells: list, scan_time: datetime) -> list:
+        """
+        Asocia las celdas de un scan nuevo con las del anterior y las devuelve anotadas (in-place).
+        Los scans repetidos o fuera de orden no modifican el estado; un hueco mayor a max_gap_minutes
+        reinicia los tracks.
+        """
+        if self.last_time is not None and scan_time <= self.last_time:
+            return cells
+        dt_h = (scan_time - self.last_time).total_seconds() / 3600.0 if self.last_time else None
+        if dt_h is not None and dt_h * 60.0 > self.max_gap_minutes:
+            next_id = self.next_id
+            self._reset()
+            self.next_id = next_id
+            dt_h = None
+
+        x, y = _local_km([c["lat"] for c in cells], [c["lon"] for c in cells], self.lat_0, self.lon_0)
+        xy = np.column_stack([x, y]).astype(np.float64)
+        ids = np.zeros(len(cells), dtype=np.int64)
+        velocity = np.zeros((len(cells), 2), dtype=np.float64)
+        age = np.ones(len(cells), dtype=np.int32)
+
+        if dt_h:
+            # Se busca cada celda previa alrededor de su posición extrapolada (las nuevas, sin velocidad,
+            # pueden haberse movido hasta max_speed_kmh)
+            predicted = self.xy + self.velocity * dt_h
+            prev_idx, curr_idx = self._match(predicted, xy, self.gate_km + self.max_speed_kmh * dt_h)
+            ids[curr_idx] = self.ids[prev_idx]
+            age[curr_idx] = self.age[prev_idx] + 1
+            measured = (xy[curr_idx] - self.xy[prev_idx]) / dt_h
+            # Primer desplazamiento: se toma tal cual; después, promedio exponencial
+            established = (self.age[prev_idx] > 1)[:, np.newaxis]
+            velocity[curr_idx] = np.where(established,
+                                          VELOCITY_SMOOTHING * measured + (1 - VELOCITY_SMOOTHING) * self.velocity[prev_idx],
+                                          measured)
+
+        new = ids == 0
+        ids[new] = np.arange(self.next_id, self.next_id + int(new.sum()))
+        self.next_id += int(new.sum())
+
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        heading = np.degrees(np.arctan2(velocity[:, 0], velocity[:, 1])) % 360.0
+        for i, cell in enumerate(cells):
+            cell["id"] = int(ids[i])
+            cell["track_age"] = int(age[i])
+            if age[i] > 1:
+                cell["speed_kmh"] = round(float(speed[i]), 1)
+                cell["heading_deg"] = round(float(heading[i]))
+
+        self.last_time, self.ids, self.xy, self.velocity, self.age = scan_time, ids, xy, velocity, age
+        if self.state_path:
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f"No se pudo guardar el estado del tracker: {e}")
+        return cells
@@ -0,0 +1,70 @@
+import os
+import re
+
+import numpy as np
+
+# =================================================================
+# Almacén de composites por frame (INPUT_<ts> / PRED_<run>_<ts>) como .npy uint8.
+# Codificación: código = floor((dBZ - bias) / scale), 0 = sin dato. Con scale 0.5 y bias -30 el
+# floor conserva exactamente los bins de TITAN (todos los límites son múltiplos de 0.5), así que
+# cualquier render hecho desde acá es idéntico al hecho desde el float original.
+# Layout: <store_dir>/<YYYYMMDD>/<frame>.npy, fila 0 = sur (igual que la grilla del radar).
+# =================================================================
+
+FRAME_NAME_RE = re.compile(r'^(INPUT|PRED)_[0-9_\-]+$')
+DAY_IN_NAME_RE = re.compile(r"(20\d{6})")
+
+
+def frame_path(store_dir: str, frame_name: str) -> str:
+    day = DAY_IN_NAME_RE.search(frame_name)
+    return os.path.join(store_dir, day.group(1) if day else "undated", f"{frame_name}.npy")
+
+
+def quantize_composite(dbz: np.ndarray, scale: float, bias: float) -> np.ndarray:
+    codes = np.subtract(dbz, bias, dtype=np.float32)
+    codes /= scale
+    np.floor(codes, out=codes)
+    np.clip(codes, 1, 255, out=codes)
+    np.nan_to_num(codes, copy=False, nan=0)
+    return codes.astype(np.uint8)
+
+
+def dequantize_composite(codes: np.ndarray, scale: float, bias: float) -> np.ndarray:
+    dbz = codes.astype(np.float32) * scale + bias
+    dbz[codes == 0] = np.nan
+    return dbz
+
+
+def save_frame(path: str, composite_2d: np.ndarray, scale: float, bias: float) -> str:
+    """Escribe el composite cuantizado. path puede ser temporal (sin extensión .npy)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        np.save(f, quantize_composite(composite_2d, scale, bias))
+    return path
+
+
+def load_frame_codes(store_dir: str, frame_name: str) -> np.ndarray:
+    """Códigos uint8 tal como están en el store (fila 0 = sur) o None si el frame no existe."""
+    path = frame_path(store_dir, frame_name)
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def load_frame(store_dir: str, frame_name: str, scale: float, bias: float) -> np.ndarray:
+    """Composite en dBZ (float32, NaN = sin dato) o None si el frame no existe."""
+    codes = load_frame_codes(store_dir, frame_name)
+    return None if codes is None else dequantize_composite(codes, scale, bias)
+
+
+def downsample_codes(codes: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Reduce la grilla por factor tomando el máximo de cada bloque factor x factor: conserva los
+    núcleos (como el composite en la vertical) y, como 0 = sin dato, un bloque sólo queda vacío
+    si todas sus celdas lo están.
+    """
+    if factor == 1:
+        return codes
+    ny, nx = codes.shape
+    blocks = codes[:ny - ny % factor, :nx - nx % factor].reshape(ny // factor, factor, nx // factor, factor)
+    return blocks.max(axis=(1, 3))
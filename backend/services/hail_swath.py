@@ -0,0 +1,143 @@
+import os
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from services.frame_store import quantize_composite, dequantize_composite
+
+# =================================================================
+# Manga de granizo diaria como raster.
+# Por día granicero (empieza a las 8 AM local = 11 UTC) se guarda el máximo de reflectividad de los
+# scans observados sobre la grilla del radar, con la misma codificación uint8 del frame store
+# (0 = sin dato; el orden de los códigos es el de los dBZ, así que el máximo se toma directo
+# sobre los códigos). Cada scan se acumula con un único np.maximum sobre el .npy mapeado en memoria.
+# Layout: <swath_dir>/<YYYYMMDD>/max_dbz.npy, fila 0 = sur. Un índice <swath_dir>/_index.json guarda
+# el código máximo de cada día, para que las consultas por rango salteen los días sin granizo sin
+# abrir sus rasters.
+# =================================================================
+
+SWATH_FILENAME = "max_dbz.npy"
+INDEX_FILENAME = "_index.json"  # el "_" lo deja fuera de la retención por shards
+BUSINESS_DAY_START_UTC_HOUR = 11
+
+
+def business_day(ts: datetime = None) -> str:
+    """Día granicero (YYYYMMDD) de un instante UTC: antes de las 11 UTC pertenece al día anterior."""
+    ts = ts or datetime.now(timezone.utc)
+    if ts.hour < BUSINESS_DAY_START_UTC_HOUR:
+        ts = ts - timedelta(days=1)
+    return ts.strftime("%Y%m%d")
+
+
+def swath_path(swath_dir: str, day: str) -> str:
+    return os.path.join(swath_dir, day, SWATH_FILENAME)
+
+
+def accumulate_swath(swath_dir: str, day: str, composite_2d: np.ndarray, scale: float, bias: float) -> str:
+    """
+    Suma un scan a la manga del día (máximo por celda). El archivo se crea completo en un temporal y
+    se publica con os.replace; después sólo se actualiza in-place, y como los valores nunca bajan un
+    lector concurrente ve el raster anterior, el nuevo o una mezcla válida de ambos.
+    """
+    codes = quantize_composite(composite_2d, scale, bias)
+    path = swath_path(swath_dir, day)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.zeros(codes.shape, dtype=np.uint8))
+        os.replace(temp_path, path)
+    swath = np.load(path, mmap_mode="r+")
+    np.maximum(swath, codes, out=swath)
+    swath.flush()
+    peak = int(swath.max())
+    del swath
+    index = load_swath_index(swath_dir)
+    if peak > index.get(day, 0):
+        index[day] = peak
+        _write_index(swath_dir, index)
+    return path
+
+
+def load_swath_codes(swath_dir: str, day: str) -> np.ndarray:
+    """Códigos uint8 del día (fila 0 = sur) o None si ese día no tiene raster."""
+    path = swath_path(swath_dir, day)
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def load_swath_index(swath_dir: str) -> dict:
+    """{YYYYMMDD: código máximo del día}; vacío si todavía no hay índice."""
+    try:
+        with open(os.path.join(swath_dir, INDEX_FILENAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_index(swath_dir: str, index: dict):
+    path = os.path.join(swath_dir, INDEX_FILENAME)
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(dict(sorted(index.items())), f)
+    os.replace(temp_path, path)
+
+
+def dbz_code(dbz: float, scale: float, bias: float) -> int:
+    """Código uint8 del frame store para un umbral en dBZ (código >= dbz_code  <=>  dBZ >= dbz)."""
+    return int(quantize_composite(np.array([dbz], dtype=np.float32), scale, bias)[0])
+
+
+def swath_days(swath_dir: str, first_day: str, last_day: str, min_code: int) -> list:
+    """
+    Días del rango (inclusive) con raster y algún valor >= min_code, según el índice. Los días con
+    raster que no figuran en el índice (ej. índice perdido) se incluyen y se filtran al combinar.
+    """
+    index = load_swath_index(swath_dir)
+    day = datetime.strptime(first_day, "%Y%m%d")
+    last = datetime.strptime(last_day, "%Y%m%d")
+    days = []
+    while day <= last:
+        key = day.strftime("%Y%m%d")
+        if index.get(key, min_code) >= min_code and os.path.exists(swath_path(swath_dir, key)):
+            days.append(key)
+        day += timedelta(days=1)
+    return days
+
+
+def combine_swaths(swath_dir: str, days: list, min_code: int) -> tuple:
+    """
+    Máximo por celda de los rasters de days, con las celdas por debajo de min_code en 0 (sin dato).
+    Devuelve (códigos uint8, días que aportaron celdas >= min_code); códigos None si ninguno aportó.
+    """
+    combined, contributing = None, []
+    for day in days:
+        codes = load_swath_codes(swath_dir, day)
+        if codes is None or int(codes.max()) < min_code:
+            continue
+        contributing.append(day)
+        if combined is None:
+            combined = codes.copy()
+        else:
+            np.maximum(combined, codes, out=combined)
+    if combined is not None:
+        combined[combined < min_code] = 0
+    return combined, contributing
+
+
+def swath_composite(codes: np.ndarray, scale: float, bias: float, min_dbz: float) -> np.ndarray:
+    """Máximo del día en dBZ (NaN = sin dato o por debajo de min_dbz), listo para el render por LUT."""
+    dbz = dequantize_composite(codes, scale, bias)
+    dbz[~(dbz >= min_dbz)] = np.nan
+    return dbz
+
+
+def swath_points(codes: np.ndarray, latlon_grid: np.ndarray, min_dbz: float, scale: float, bias: float) -> list:
+    """Centros de celda [lon, lat] (3 decimales, ~110 m) con máximo >= min_dbz."""
+    rows, cols = np.nonzero(codes >= dbz_code(min_dbz, scale, bias))
+    lon = np.round(latlon_grid[1][rows, cols], 3)
+    lat = np.round(latlon_grid[0][rows, cols], 3)
+    return np.column_stack([lon, lat]).tolist()
@@ -0,0 +1,149 @@
+import os
+import re
+import uuid
+import fcntl
+import hashlib
+import logging
+
+from services.frame_store import load_frame, FRAME_NAME_RE
+from services.radar_render import render_lut_png, render_smoothed_lut_png, PALETTES, OVERLAY_SIZE
+from services.radar_warp import render_mercator_overlay
+
+# =================================================================
+# Render perezoso de overlays para la API.
+# El worker sólo persiste el composite cuantizado (services/frame_store.py); la primera petición
+# de una variante (pixel/suavizado, paleta, tamaño) la renderiza y la deja en un caché en disco
+# acotado por tamaño (LRU por mtime). Un lock de archivo (fcntl.flock) hace que peticiones
+# concurrentes -- de hilos o de procesos gunicorn -- rendericen una sola vez. Los locks son un juego
+# fijo de LOCK_STRIPES archivos en <cache_dir>/locks/ elegidos por hash de la variante: nunca se
+# borran (nadie queda esperando sobre un inode huérfano) y no crecen con la cantidad de variantes.
+# =================================================================
+
+ALLOWED_SIZES = (750, 1500, OVERLAY_SIZE)
+IMAGE_NAME_RE = re.compile(r'^(?P<frame>(INPUT|PRED)_[0-9_\-]+?)(?P<smoothed>_smoothed)?\.png$')
+LOCK_STRIPES = 256
+
+
+def stripe_lock_path(cache_dir: str, key: str) -> str:
+    """<cache_dir>/locks/<sha1(key)[:2]>.lock: el lock que comparten las variantes del mismo stripe."""
+    return os.path.join(cache_dir, "locks", f"{hashlib.sha1(key.encode()).hexdigest()[:2]}.lock")
+
+
+def evict_lru(cache_dir: str, suffixes: tuple, max_bytes: int, keep: tuple = ()) -> float:
+    """
+    Borra los archivos más viejos (mtime) con esos sufijos hasta que el caché entre en max_bytes, sin
+    tocar keep (lo recién generado, que se va a servir aunque solo supere el presupuesto). Otro proceso
+    puede estar desalojando a la vez: lo que desaparece entre scandir y stat/remove se saltea.
+    Devuelve el total en bytes, o None si no hizo falta desalojar.
+    """
+    entries, total = [], 0
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(suffixes):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        total += stat.st_size
+        if entry.path not in keep:
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    if total <= max_bytes:
+        return None
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+    return total
+
+
+class OverlayCache:
+    default_size = OVERLAY_SIZE
+    allowed_sizes = ALLOWED_SIZES
+
+    def __init__(self, cache_dir: str, frame_store_dir: str, max_bytes: int, scale: float, bias: float,
+                 mercator: dict = None):
+        """
+        mercator: kwargs geográficos de render_mercator_overlay (x_km, y_km, lat_0, lon_0, cache_dir,
+        earth_radius_m) para renderizar en Mercator; None = imagen en km AEQD.
+        """
+        self.mercator = mercator
+        self.cache_dir = cache_dir
+        self.frame_store_dir = frame_store_dir
+        self.max_bytes = max_bytes
+        self.scale = scale
+        self.bias = bias
+        os.makedirs(os.path.join(cache_dir, "locks"), exist_ok=True)
+
+    @staticmethod
+    def parse_filename(filename: str):
+        """'<frame>[_smoothed].png' -> (frame, smoothed) o None. Acepta el prefijo de shard YYYYMMDD/."""
+        match = IMAGE_NAME_RE.match(os.path.basename(filename))
+        if not match:
+            return None
+        return match.group('frame'), bool(match.group('smoothed'))
+
+    def get(self, frame: str, smoothed: bool = False, palette: str = "titan", size: int = OVERLAY_SIZE,
+            fmt: str = "png") -> str:
+        """
+        Ruta de la variante pedida en fmt ("png" o "webp"), renderizándola si hace falta, o None si el
+        frame no existe. Ambos formatos se codifican en el mismo render.
+        """
+        if not FRAME_NAME_RE.match(frame) or palette not in PALETTES or size not in ALLOWED_SIZES or fmt not in ("png", "webp"):
+            raise ValueError("Variante de overlay inválida")
+        variant = f"{frame}__{'smoothed' if smoothed else 'pixel'}__{palette}__{size}"
+        path = os.path.join(self.cache_dir, f"{variant}.{fmt}")
+        if self._touch(path):
+            return path
+
+        base = os.path.join(self.cache_dir, variant)
+        suffix = uuid.uuid4().hex[:8]
+        png_temp, webp_temp = f"{base}.png.{suffix}.tmp", f"{base}.webp.{suffix}.tmp"
+        with open(stripe_lock_path(self.cache_dir, variant), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Otro hilo/proceso pudo haberlo renderizado mientras esperábamos el lock
+                if self._touch(path):
+                    return path
+                composite = load_frame(self.frame_store_dir, frame, self.scale, self.bias)
+                if composite is None:
+                    return None
+                if self.mercator:
+                    render_mercator_overlay(composite, png_temp, size=size, smoothed=smoothed, lut=PALETTES[palette],
+                                            webp_path=webp_temp, **self.mercator)
+                else:
+                    render = render_smoothed_lut_png if smoothed else render_lut_png
+                    render(composite, png_temp, size=size, lut=PALETTES[palette], webp_path=webp_temp)
+                # El WebP primero: el PNG es el que se mira para saber si la variante existe
+                os.replace(webp_temp, f"{base}.webp")
+                os.replace(png_temp, f"{base}.png")
+            finally:
+                # Si el render falló, los temporales no son .png/.webp y _evict no los vería nunca
+                self._remove_quietly(png_temp)
+                self._remove_quietly(webp_temp)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._evict(keep=(f"{base}.png", f"{base}.webp"))
+        return path
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)  # el mtime hace de "último acceso" para el LRU
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self, keep: tuple = ()):
+        total = evict_lru(self.cache_dir, ('.png', '.webp'), self.max_bytes, keep)
+        if total is not None:
+            logging.info(f"Caché de overlays: desalojado hasta {total / 1e6:.1f} MB")
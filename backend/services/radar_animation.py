@@ -0,0 +1,295 @@
+import os
+import re
+import uuid
+import fcntl
+import shutil
+import logging
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from PIL import Image, ImageDraw, GifImagePlugin
+
+from services.frame_store import load_frame
+from services.radar_render import overlay_index, TITAN_LUT
+from services.radar_warp import mercator_overlay_index
+from services.overlay_cache import stripe_lock_path, evict_lru
+
+# =================================================================
+# Animaciones de tormentas (GIF / MP4 / WebP) en streaming.
+# Los frames se leen de a uno (frame store o NetCDF), pasan por el mismo render por LUT que los
+# overlays y se entregan a un codificador incremental: el GIF se escribe bloque a bloque con el
+# codificador LZW de Pillow, MP4 y WebP animado se pasan crudos por un pipe a ffmpeg. La memoria
+# queda acotada a un frame, sin importar la duración del evento.
+# =================================================================
+
+ANIMATION_FORMATS = {"gif": "image/gif", "mp4": "video/mp4", "webp": "image/webp"}
+INPUT_FRAME_RE = re.compile(r'^INPUT_(\d{14})$')
+PRED_FRAME_RE = re.compile(r'^PRED_(?P<run>[0-9\-]+)_(\d{8}_\d{6})$')
+LABEL_INDEX = 255  # entrada de la paleta para el texto del timestamp (fuera de la LUT TITAN)
+LABEL_UTC_OFFSET_HOURS = -3
+
+
+def parse_range_time(value: str) -> datetime:
+    """ISO 8601 (UTC si no trae zona) o YYYYMMDDHHMM[SS]."""
+    if value.isdigit():
+        return datetime.strptime(value.ljust(14, '0'), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def frame_time(frame_name: str) -> datetime:
+    match = INPUT_FRAME_RE.match(frame_name)
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    match = PRED_FRAME_RE.match(frame_name)
+    if match:
+        return datetime.strptime(match.group(2), "%Y%m%d_%H%M%S").replace(tzinfo=timezone.utc)
+    return None
+
+
+def list_store_frames(store_dir: str, start: datetime, end: datetime, run_id: str = None) -> list:
+    """
+    Nombres de frames del store entre start y end (UTC, inclusive), en orden temporal. Sólo se listan
+    los shards de los días del rango. Sin run_id son los scans observados (INPUT_); con run_id, el pronóstico.
+    """
+    names = []
+    day = start.date()
+    while day <= end.date():
+        day_dir = os.path.join(store_dir, day.strftime("%Y%m%d"))
+        if os.path.isdir(day_dir):
+            for entry in os.scandir(day_dir):
+                name = entry.name[:-len('.npy')] if entry.name.endswith('.npy') else None
+                if not name:
+                    continue
+                if run_id is not None and not name.startswith(f"PRED_{run_id}_"):
+                    continue
+                if run_id is None and not name.startswith("INPUT_"):
+                    continue
+                ts = frame_time(name)
+                if ts is not None and start <= ts <= end:
+                    names.append((ts, name))
+        day += timedelta(days=1)
+    return [name for _, name in sorted(names)]
+
+
+def iter_store_frames(store_dir: str, frame_names: list, scale: float, bias: float):
+    """Genera (timestamp, composite) de a un frame; los que desaparecieron (retención) se saltean."""
+    for name in frame_names:
+        composite = load_frame(store_dir, name, scale, bias)
+        if composite is not None:
+            yield frame_time(name), composite
+
+
+def iter_nc_frames(nc_paths: list, variable: str = 'DBZ', skip_levels: int = 3):
+    """Genera (timestamp, composite) de una lista de NetCDF, abriendo uno por vez (máximo en la vertical)."""
+    from netCDF4 import Dataset
+    for path in nc_paths:
+        try:
+            with Dataset(path, 'r') as nc:
+                data = np.ma.filled(np.squeeze(nc.variables[variable][:]).astype(np.float32), np.nan)
+        except Exception as e:
+            logging.warning(f"No se pudo leer {path}: {e}")
+            continue
+        if data.ndim == 3:
+            data = np.nanmax(data[skip_levels:] if data.shape[0] > skip_levels else data, axis=0)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        match = re.search(r'(\d{8})_?(\d{6})', stem)
+        ts = datetime.strptime(''.join(match.groups()), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc) if match else None
+        yield ts, data
+
+
+def _label(idx: np.ndarray, ts: datetime) -> np.ndarray:
+    if ts is None:
+        return idx
+    img = Image.fromarray(idx, mode='P')
+    text = (ts + timedelta(hours=LABEL_UTC_OFFSET_HOURS)).strftime("%d/%m/%Y %H:%M")
+    ImageDraw.Draw(img).text((8, 8), text, fill=LABEL_INDEX)
+    return np.asarray(img)
+
+
+def animation_palette(lut: np.ndarray = TITAN_LUT, background: str = None) -> np.ndarray:
+    """
+    Paleta RGBA de 256 entradas: la LUT, blanco opaco para el texto en LABEL_INDEX y, con
+    background ("#rrggbb"), el índice 0 opaco de ese color en lugar de transparente.
+    """
+    palette = np.zeros((256, 4), dtype=np.uint8)
+    palette[:len(lut)] = lut
+    palette[LABEL_INDEX] = (255, 255, 255, 255)
+    if background:
+        palette[0] = (int(background[1:3], 16), int(background[3:5], 16), int(background[5:7], 16), 255)
+    return palette
+
+
+class GifStreamWriter:
+    """GIF animado escrito frame a frame (getheader/getdata de Pillow), sin acumular los frames."""
+
+    def __init__(self, fp, palette: np.ndarray, duration_ms: int, loop: int = 0):
+        self.fp = fp
+        self.palette = palette
+        self.duration_ms = duration_ms
+        self.loop = loop
+        self.transparent = palette[0, 3] == 0
+        self._started = False
+
+    def _image(self, idx: np.ndarray) -> Image.Image:
+        img = Image.fromarray(idx, mode='P')
+        img.putpalette(self.palette[:, :3].tobytes())
+        return img
+
+    def add(self, idx: np.ndarray):
+        img = self._image(idx)
+        if not self._started:
+            info = {"loop": self.loop, "duration": self.duration_ms}
+            if self.transparent:
+                info["transparency"] = 0
+            header, _ = GifImagePlugin.getheader(img, info=info)
+            self.fp.write(b"".join(header))
+            self._started = True
+        params = {"duration": self.duration_ms, "disposal": 2}
+        if self.transparent:
+            params["transparency"] = 0
+        for chunk in GifImagePlugin.getdata(img, **params):
+            self.fp.write(chunk)
+
+    def close(self):
+        self.fp.write(b";")
+
+
+class FfmpegStreamWriter:
+    """MP4 (H.264) o WebP animado lossless: frames RGBA crudos por stdin de ffmpeg."""
+
+    def __init__(self, output_path: str, fmt: str, width: int, height: int, palette: np.ndarray, fps: float):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg no está instalado: sólo se puede generar GIF")
+        self.palette = palette
+        if fmt == "mp4":
+            # H.264 no tiene alpha y yuv420p pide dimensiones pares
+            self.palette = palette.copy()
+            self.palette[self.palette[:, 3] == 0, :3] = 0
+            codec = ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p",
+                     "-crf", "23", "-movflags", "+faststart", "-f", "mp4"]
+        else:
+            codec = ["-c:v", "libwebp_anim", "-lossless", "1", "-loop", "0", "-f", "webp"]
+        self.proc = subprocess.Popen(
+            [ffmpeg, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}",
+             "-r", str(fps), "-i", "-"] + codec + [output_path],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _failed(self) -> RuntimeError:
+        stderr = self.proc.stderr.read()
+        self.proc.wait()
+        return RuntimeError(f"ffmpeg falló (código {self.proc.returncode}): {stderr.decode(errors='replace').strip()}")
+
+    def add(self, idx: np.ndarray):
+        try:
+            self.proc.stdin.write(self.palette[idx].tobytes())
+        except BrokenPipeError:
+            # ffmpeg terminó a mitad del stream
+            raise self._failed() from None
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            raise self._failed() from None
+        stderr = self.proc.stderr.read()
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg falló: {stderr.decode(errors='replace').strip()}")
+
+    def abort(self):
+        """Mata ffmpeg si sigue corriendo (error a mitad del stream) y lo espera, para no dejar zombies."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for pipe in (self.proc.stdin, self.proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+def write_animation(frames, output_path: str, fmt: str = "gif", size: int = 750, fps: float = 4.0,
+                    smoothed: bool = False, mercator: dict = None, background: str = None, label: bool = True) -> int:
+    """
+    Consume frames [(timestamp, composite)] de a uno y escribe la animación en output_path (se publica
+    con os.replace al terminar). mercator: kwargs geográficos de mercator_overlay_index, o None (AEQD).
+    Devuelve la cantidad de frames escritos.
+    """
+    if fmt not in ANIMATION_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    palette = animation_palette(background=background)
+    temp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+    writer, fp, count = None, None, 0
+    try:
+        for ts, composite in frames:
+            if mercator:
+                idx = mercator_overlay_index(composite, size=size, smoothed=smoothed, **mercator)
+            else:
+                idx = overlay_index(composite, size, smoothed)
+            if label:
+                idx = _label(idx, ts)
+            if writer is None:
+                if fmt == "gif":
+                    fp = open(temp_path, 'wb')
+                    writer = GifStreamWriter(fp, palette, int(round(1000 / fps)))
+                else:
+                    writer = FfmpegStreamWriter(temp_path, fmt, idx.shape[1], idx.shape[0], palette, fps)
+            writer.add(np.ascontiguousarray(idx))
+            count += 1
+        if writer is None:
+            return 0
+        writer.close()
+        if fp:
+            fp.close()
+        os.replace(temp_path, output_path)
+        return count
+    finally:
+        if isinstance(writer, FfmpegStreamWriter):
+            writer.abort()
+        if fp and not fp.closed:
+            fp.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class AnimationCache:
+    """
+    Caché en disco de animaciones por rango (mismo esquema que services/overlay_cache.py: locks fcntl
+    en stripes fijos para generar una sola vez y LRU por mtime acotado en bytes).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(cache_dir, "locks"), exist_ok=True)
+
+    def get(self, key: str, fmt: str, build) -> str:
+        """Ruta de la animación key.fmt, generándola con build(path) -> frames escritos si no existe. None si no hay frames."""
+        path = os.path.join(self.cache_dir, f"{key}.{fmt}")
+        if self._touch(path):
+            return path
+        with open(stripe_lock_path(self.cache_dir, f"{key}.{fmt}"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._touch(path):
+                    return path
+                if not build(path):
+                    return None
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._evict(keep=path)
+        return path
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict(self, keep: str = None):
+        """LRU hasta max_bytes sin tocar keep (la animación recién generada, que se va a servir aunque sola supere el presupuesto)."""
+        evict_lru(self.cache_dir, tuple(f".{f}" for f in ANIMATION_FORMATS), self.max_bytes, (keep,))
@@ -0,0 +1,165 @@
+import os
+import gzip
+import json
+
+import numpy as np
+import contourpy
+
+from services.radar_geo import get_latlon_grid, latlon_at
+from services.radar_render import TITAN_LUT, _TITAN_BOUNDS_F32
+
+# =================================================================
+# Contornos vectoriales de reflectividad (GeoJSON) por frame.
+# Marching squares (contourpy, el mismo motor en C que usa matplotlib) sobre el composite en
+# coordenadas de grilla, con las celdas sin dato enmascaradas; cada polígono "dBZ >= nivel" se
+# simplifica (Douglas-Peucker) con una tolerancia de medio píxel Mercator del zoom y se proyecta
+# interpolando la grilla lat/lon cacheada. Un archivo gzip por zoom: <frame_dir>/z<zoom>.geojson.gz
+# =================================================================
+
+CONTOUR_MANIFEST = "contours.json"
+COORD_DECIMALS = 5  # ~1 m
+_MERCATOR_M_PER_PX_Z0 = 2 * np.pi * 6378137.0 / 256
+
+
+def zoom_tolerance_cells(zoom: int, lat_0: float, cell_km: float) -> float:
+    """Medio píxel Mercator del zoom (a la latitud del radar) expresado en celdas de la grilla."""
+    return 0.5 * _MERCATOR_M_PER_PX_Z0 * np.cos(np.radians(lat_0)) / (2 ** zoom) / (cell_km * 1000.0)
+
+
+def simplify_rings(rings: list, tolerance: float) -> list:
+    """
+    Douglas-Peucker sobre anillos cerrados (primer punto == último), vectorizado: en cada pasada
+    se evalúan a la vez todos los tramos pendientes de todos los anillos (una pasada por nivel de
+    recursión en lugar de una llamada por tramo).
+    """
+    if tolerance <= 0 or not rings:
+        return rings
+    lengths = np.array([len(r) for r in rings])
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    points = np.concatenate(rings)
+    keep = np.zeros(len(points), dtype=bool)
+    first, last = bounds[:-1], bounds[1:] - 1
+    keep[first] = keep[last] = True
+    # Cada anillo se parte en su punto más lejano al inicio para que ningún tramo sea degenerado
+    ring_id = np.repeat(np.arange(len(rings)), lengths)
+    far2 = np.sum((points - points[first][ring_id]) ** 2, axis=1)
+    split = first + np.array([np.argmax(far2[a:b]) for a, b in zip(bounds[:-1], bounds[1:])])
+    keep[split] = True
+    starts = np.concatenate([first, split])
+    ends = np.concatenate([split, last])
+
+    while True:
+        pending = ends - starts >= 2
+        starts, ends = starts[pending], ends[pending]
+        if len(starts) == 0:
+            break
+        counts = ends - starts - 1
+        seg = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        idx = starts[seg] + 1 + (np.arange(counts.sum()) - offsets[seg])
+        a, b = points[starts][seg], points[ends][seg]
+        d = b - a
+        rel = points[idx] - a
+        length = np.hypot(d[:, 0], d[:, 1])
+        cross = np.abs(d[:, 0] * rel[:, 1] - d[:, 1] * rel[:, 0])
+        dist = np.where(length > 0, cross / np.where(length > 0, length, 1), np.hypot(rel[:, 0], rel[:, 1]))
+        seg_max = np.maximum.reduceat(dist, offsets)
+        # Primer punto que alcanza el máximo de cada tramo
+        at_max = np.flatnonzero(dist == seg_max[seg])
+        _, first_at_max = np.unique(seg[at_max], return_index=True)
+        mids = idx[at_max[first_at_max]]
+        split_seg = seg_max > tolerance
+        mids = mids[split_seg]
+        keep[mids] = True
+        starts, ends = np.concatenate([starts[split_seg], mids]), np.concatenate([mids, ends[split_seg]])
+
+    return [points[a:b][keep[a:b]] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _ring_coords(ring_rc: np.ndarray, latlon_grid: np.ndarray) -> list:
+    lat, lon = latlon_at(latlon_grid, ring_rc[:, 1], ring_rc[:, 0])
+    coords = np.round(np.column_stack([lon, lat]), COORD_DECIMALS)
+    return coords.tolist()
+
+
+def _signed_area(coords: list) -> float:
+    pts = np.asarray(coords)
+    return 0.5 * float(np.sum(pts[:-1, 0] * pts[1:, 1] - pts[1:, 0] * pts[:-1, 1]))
+
+
+def _level_color(level: float) -> str:
+    r, g, b, _ = TITAN_LUT[int(np.digitize(level, _TITAN_BOUNDS_F32))]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def contour_polygons(composite_2d: np.ndarray, levels: list) -> dict:
+    """
+    {nivel: [[anillo exterior, huecos...], ...]} con anillos (x=columna, y=fila) en coordenadas de
+    grilla, fila 0 = sur. Cada nivel es la región dBZ >= nivel (regiones anidadas, no bandas).
+    """
+    z = np.ma.masked_invalid(composite_2d.astype(np.float64))
+    if z.count() == 0:
+        return {level: [] for level in levels}
+    generator = contourpy.contour_generator(z=z, fill_type=contourpy.FillType.OuterOffset)
+    upper = float(z.max()) + 1.0
+    polygons = {}
+    for level in levels:
+        polygons[level] = []
+        if level > upper - 1.0:
+            continue
+        points_list, offsets_list = generator.filled(level, upper)
+        for points, offsets in zip(points_list, offsets_list):
+            polygons[level].append([points[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)])
+    return polygons
+
+
+def build_contour_geojson(polygons: dict, latlon_grid: np.ndarray, tolerance_cells: float) -> dict:
+    flat = [ring for level_polygons in polygons.values() for rings in level_polygons for ring in rings]
+    simplified = iter(simplify_rings(flat, tolerance_cells))
+    features = []
+    for level, level_polygons in polygons.items():
+        multipolygon = []
+        for rings in level_polygons:
+            polygon = []
+            for i, ring in enumerate([next(simplified) for _ in rings]):
+                if len(ring) < 4:
+                    if i == 0:
+                        break  # el exterior colapsó: se descarta el polígono con sus huecos
+                    continue
+                coords = _ring_coords(ring, latlon_grid)
+                # RFC 7946: exterior antihorario, huecos horarios
+                if (_signed_area(coords) > 0) != (i == 0):
+                    coords.reverse()
+                polygon.append(coords)
+            if polygon:
+                multipolygon.append(polygon)
+        if multipolygon:
+            features.append({
+                "type": "Feature",
+                "properties": {"dbz": level, "color": _level_color(level)},
+                "geometry": {"type": "MultiPolygon", "coordinates": multipolygon},
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def render_contours(composite_2d: np.ndarray, x_km: np.ndarray, y_km: np.ndarray, lat_0: float, lon_0: float,
+                    frame_dir: str, cache_dir: str, earth_radius_m: float = 6378137.0,
+                    levels: list = (20, 35, 45, 55, 60), zooms: list = (6, 8, 10)) -> str:
+    """
+    Escribe <frame_dir>/z<zoom>.geojson.gz por zoom y un contours.json con niveles, zooms y tamaños.
+    frame_dir puede ser temporal (se publica con os.replace del directorio).
+    """
+    latlon_grid = get_latlon_grid(lat_0, lon_0, x_km, y_km, cache_dir, earth_radius_m)
+    polygons = contour_polygons(composite_2d, list(levels))
+    cell_km = float(abs(x_km[1] - x_km[0]))
+    os.makedirs(frame_dir, exist_ok=True)
+    sizes = {}
+    for zoom in zooms:
+        geojson = build_contour_geojson(polygons, latlon_grid, zoom_tolerance_cells(zoom, lat_0, cell_km))
+        payload = gzip.compress(json.dumps(geojson, separators=(',', ':')).encode('utf-8'), compresslevel=6, mtime=0)
+        with open(os.path.join(frame_dir, f"z{zoom}.geojson.gz"), 'wb') as f:
+            f.write(payload)
+        sizes[str(zoom)] = len(payload)
+    with open(os.path.join(frame_dir, CONTOUR_MANIFEST), 'w') as f:
+        json.dump({"levels": list(levels), "zooms": list(zooms), "bytes": sizes}, f)
+    return frame_dir
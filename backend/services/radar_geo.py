@@ -0,0 +1,75 @@
+import os
+import uuid
+import hashlib
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pyproj
+from scipy.ndimage import map_coordinates
+
+# =================================================================
+# Grilla lat/lon de los centros de celda del radar (AEQD centrado en el sensor).
+# Se calcula una vez por radar/grilla con pyproj y se cachea en disco como .npy (mmap,
+# compartido entre procesos). Las celdas enteras (núcleos de tormenta, manga de granizo) se
+# geolocalizan con un gather de esta tabla y los vértices fraccionales (contornos) interpolando
+# bilinealmente, sin pyproj ni cartopy en el camino caliente.
+# =================================================================
+
+_latlon_cache = {}
+
+
+def _latlon_key(lat_0, lon_0, earth_radius_m, x_km, y_km) -> str:
+    spec = (round(float(lat_0), 6), round(float(lon_0), 6), float(earth_radius_m),
+            float(x_km[0]), float(x_km[1] - x_km[0]), len(x_km),
+            float(y_km[0]), float(y_km[1] - y_km[0]), len(y_km))
+    return hashlib.sha1(repr(spec).encode()).hexdigest()[:12]
+
+
+@lru_cache(maxsize=8)
+def aeqd_transformer(lat_0: float, lon_0: float, earth_radius_m: float = 6378137.0) -> pyproj.Transformer:
+    """
+    Transformer (cacheado por proceso) lon/lat en grados (always_xy) -> AEQD en metros centrado en el
+    sensor, sobre la esfera del radar. direction="INVERSE" para ir de AEQD a lon/lat.
+    """
+    aeqd = pyproj.CRS.from_proj4(f"+proj=aeqd +lat_0={lat_0} +lon_0={lon_0} +R={earth_radius_m} +units=m")
+    return pyproj.Transformer.from_crs(pyproj.CRS.from_proj4(f"+proj=longlat +R={earth_radius_m}"), aeqd, always_xy=True)
+
+
+def build_latlon_grid(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray,
+                      earth_radius_m: float = 6378137.0) -> np.ndarray:
+    """(2, ny, nx) float64: [lat, lon] en grados de cada centro de celda, fila 0 = sur."""
+    xm, ym = np.meshgrid(np.asarray(x_km, dtype=np.float64) * 1000.0, np.asarray(y_km, dtype=np.float64) * 1000.0)
+    lon, lat = aeqd_transformer(lat_0, lon_0, earth_radius_m).transform(xm, ym, direction="INVERSE")
+    return np.stack([lat, lon])
+
+
+def get_latlon_grid(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray, cache_dir: str,
+                    earth_radius_m: float = 6378137.0) -> np.ndarray:
+    """Grilla cacheada en memoria (por proceso) y en disco (<cache_dir>/latlon_<hash>.npy)."""
+    key = _latlon_key(lat_0, lon_0, earth_radius_m, x_km, y_km)
+    if key in _latlon_cache:
+        return _latlon_cache[key]
+    path = os.path.join(cache_dir, f"latlon_{key}.npy")
+    if not os.path.exists(path):
+        logging.info(f"Construyendo grilla lat/lon del radar ({path})...")
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, build_latlon_grid(lat_0, lon_0, x_km, y_km, earth_radius_m))
+        os.replace(temp_path, path)
+    _latlon_cache[key] = np.load(path, mmap_mode="r")
+    return _latlon_cache[key]
+
+
+def cell_latlon(latlon_grid: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> tuple:
+    """lat/lon de los centros de celda (fila, columna enteras, fila 0 = sur): gather directo de la tabla."""
+    return latlon_grid[0][rows, cols], latlon_grid[1][rows, cols]
+
+
+def latlon_at(latlon_grid: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> tuple:
+    """lat/lon en posiciones fraccionales de la grilla (fila, columna), interpolación bilineal."""
+    coords = np.vstack([np.ravel(rows), np.ravel(cols)])
+    lat = map_coordinates(latlon_grid[0], coords, order=1, mode='nearest')
+    lon = map_coordinates(latlon_grid[1], coords, order=1, mode='nearest')
+    return lat.reshape(np.shape(rows)), lon.reshape(np.shape(rows))
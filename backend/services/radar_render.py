@@ -0,0 +1,212 @@
+import numpy as np
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap, BoundaryNorm, to_rgba_array
+
+# Configuración de Colores TITAN
+TITAN_BOUNDS = [5, 10, 20, 30, 35, 36, 39, 42, 45, 48, 51, 54, 57, 60, 65, 70, 80]
+TITAN_COLORS = [
+    '#483d8b', # 5-10
+    '#005a00', # 10-20
+    '#007000', # 20-30
+    '#087fdb', # 30-35
+    '#1c47e8', # 35-36
+    '#6e0dc6', # 36-39
+    '#c80f86', # 39-42
+    '#c06487', # 42-45
+    '#d2883b', # 45-48
+    '#fac431', # 48-51
+    '#fefa03', # 51-54
+    '#fe9a58', # 54-57
+    '#fe5f05', # 57-60
+    '#fd341c', # 60-65
+    '#bebebe', # 65-70
+    '#d3d3d3'  # 70-80
+]
+
+# Basado exactamente en el output de TITAN (PrintMdv):
+# minLat, minLon: -36.8913, -70.8209
+# maxLat, maxLon: -32.3798, -65.2191
+OVERLAY_BOUNDS = [[-36.8913, -70.8209], [-32.3798, -65.2191]] # Formato: [[lat_min, lon_min], [lat_max, lon_max]]
+
+# Lado en píxeles del overlay: equivale a la figura de 10in a 300 dpi que generaba matplotlib
+OVERLAY_SIZE = 3000
+PNG_COMPRESS_LEVEL = 3
+# WebP lossless: ~6x más chico que el PNG paletizado; method 0 es el más rápido (~0.2 s a 3000 px)
+# y comprime casi igual que los niveles altos en imágenes de pocos colores.
+WEBP_METHOD = 0
+# Versión suavizada: se interpola (bicúbica) a la mitad del tamaño final y se completa por vecino más cercano
+SMOOTH_INTERP_SIZE = OVERLAY_SIZE // 2
+SMOOTH_SIGMA_CELLS = 0.75
+
+
+# Paleta apta para daltonismo (cividis, 16 pasos) sobre los mismos límites de TITAN
+COLORBLIND_COLORS = [
+    '#00224e', '#002e6c', '#1e3a6f', '#35456c', '#47516c', '#575d6d', '#666970', '#757575',
+    '#848279', '#948e77', '#a59c74', '#b7a96e', '#c8b866', '#dbc75a', '#eed649', '#fee838'
+]
+
+
+def _build_lut(hex_colors: list) -> np.ndarray:
+    """
+    LUT RGBA (uint8) indexada por np.digitize(dBZ, TITAN_BOUNDS), igual que BoundaryNorm:
+    0 = bajo 5 dBZ o NaN (transparente), 1..16 = colores, 17 = sobre 80 dBZ (último color).
+    """
+    colors = np.round(to_rgba_array(hex_colors) * 255).astype(np.uint8)
+    lut = np.zeros((len(TITAN_BOUNDS) + 1, 4), dtype=np.uint8)
+    lut[1:len(TITAN_BOUNDS)] = colors
+    lut[len(TITAN_BOUNDS)] = colors[-1]
+    return lut
+
+TITAN_LUT = _build_lut(TITAN_COLORS)
+PALETTES = {"titan": TITAN_LUT, "colorblind": _build_lut(COLORBLIND_COLORS)}
+_TITAN_BOUNDS_F32 = np.asarray(TITAN_BOUNDS, dtype=np.float32)
+
+
+def quantize_titan(composite_2d: np.ndarray) -> np.ndarray:
+    """Índice uint8 en TITAN_LUT por celda (NaN -> 0 = transparente)."""
+    idx = np.digitize(composite_2d, _TITAN_BOUNDS_F32).astype(np.uint8)
+    idx[np.isnan(composite_2d)] = 0
+    return idx
+
+
+def upscale_nearest(grid: np.ndarray, size: int) -> np.ndarray:
+    """Upscale por vecino más cercano a (size, size), sin interpolar."""
+    ny, nx = grid.shape[:2]
+    if size % ny == 0 and size % nx == 0:
+        # Factor entero (caso normal 500 -> 3000): np.repeat es ~4x más rápido que el gather
+        return np.repeat(np.repeat(grid, size // ny, axis=0), size // nx, axis=1)
+    rows = (np.arange(size) * ny) // size
+    cols = (np.arange(size) * nx) // size
+    return grid[rows[:, np.newaxis], cols]
+
+
+def save_indexed_png(idx: np.ndarray, output_path: str, lut: np.ndarray = TITAN_LUT, webp_path: str = None) -> str:
+    """
+    PNG de 8 bits con paleta = lut (RGB en PLTE, alpha en tRNS). Decodifica al mismo RGBA que lut[idx].
+    Con webp_path se escribe además la misma imagen en WebP lossless.
+    """
+    img = Image.fromarray(idx, mode='P')
+    img.putpalette(lut[:, :3].tobytes())
+    img.save(output_path, format='PNG', compress_level=PNG_COMPRESS_LEVEL, transparency=lut[:, 3].tobytes())
+    if webp_path:
+        Image.fromarray(lut[idx], mode='RGBA').save(webp_path, format='WEBP', lossless=True, method=WEBP_METHOD)
+    return output_path
+
+
+def render_lut_png(composite_2d: np.ndarray, output_path: str, size: int = OVERLAY_SIZE, lut: np.ndarray = TITAN_LUT,
+                   webp_path: str = None) -> str:
+    """
+    Render pixel exacto del composite sin matplotlib: cuantiza a índice TITAN, escala por vecino
+    más cercano y codifica el PNG directamente. Fila 0 del grid = sur, se invierte para la imagen.
+    """
+    idx = quantize_titan(composite_2d)[::-1]
+    return save_indexed_png(upscale_nearest(idx, size), output_path, lut, webp_path)
+
+
+def _resize_float(grid: np.ndarray, size: int, resample) -> np.ndarray:
+    return np.asarray(Image.fromarray(np.ascontiguousarray(grid, dtype=np.float32), mode='F').resize((size, size), resample))
+
+
+def smoothed_titan_index(composite_2d: np.ndarray, valid: np.ndarray = None, size: int = SMOOTH_INTERP_SIZE,
+                         sigma: float = SMOOTH_SIGMA_CELLS) -> np.ndarray:
+    """
+    Índice TITAN suavizado (size x size, fila 0 = norte) en reemplazo de contourf:
+    Gaussiana normalizada (los NaN no oscurecen los bordes), upsampling bicúbico y máscara
+    de validez bilineal cortada en 0.5 para que el borde del eco quede curvo y sin halo.
+    """
+    if valid is None:
+        valid = ~np.isnan(composite_2d)
+    weight = valid.astype(np.float32)
+    filled = np.where(valid, composite_2d, 0.0).astype(np.float32)
+    if sigma > 0:
+        filled = gaussian_filter(filled, sigma)
+        norm = gaussian_filter(weight, sigma)
+        np.divide(filled, norm, out=filled, where=norm > 1e-6)
+    dbz_up = _resize_float(filled[::-1], size, Image.BICUBIC)
+    mask_up = _resize_float(weight[::-1], size, Image.BILINEAR)
+    idx = np.digitize(dbz_up, _TITAN_BOUNDS_F32).astype(np.uint8)
+    idx[mask_up < 0.5] = 0
+    return idx
+
+
+def render_smoothed_lut_png(composite_2d: np.ndarray, output_path: str, size: int = OVERLAY_SIZE, valid: np.ndarray = None,
+                            lut: np.ndarray = TITAN_LUT, webp_path: str = None) -> str:
+    idx = smoothed_titan_index(composite_2d, valid, size=min(size, SMOOTH_INTERP_SIZE))
+    return save_indexed_png(upscale_nearest(idx, size), output_path, lut, webp_path)
+
+
+def overlay_index(composite_2d: np.ndarray, size: int = OVERLAY_SIZE, smoothed: bool = False) -> np.ndarray:
+    """Índice TITAN (size x size, fila 0 = norte) de la versión pixel o suavizada, sin codificar."""
+    if smoothed:
+        return upscale_nearest(smoothed_titan_index(composite_2d, size=min(size, SMOOTH_INTERP_SIZE)), size)
+    return upscale_nearest(quantize_titan(composite_2d)[::-1], size)
+
+
+def render_smoothed_contourf(x: np.ndarray, y: np.ndarray, composite_2d: np.ndarray, smoothed_path: str, webp_path: str = None) -> str:
+    """Versión suavizada histórica (matplotlib contourf)."""
+    fig = plt.figure(figsize=(10, 10), dpi=150)
+    ax = fig.add_subplot(1, 1, 1)
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+    ax.set_axis_off()
+
+    # contourf suaviza los valores de la matriz entre puntos
+    ax.contourf(x, y, composite_2d, levels=TITAN_BOUNDS, colors=TITAN_COLORS, extend='max')
+    plt.tight_layout(pad=0)
+
+    plt.savefig(smoothed_path, format='png', dpi=300, transparent=True, bbox_inches='tight', pad_inches=0)
+
+    plt.close(fig)
+    if webp_path:
+        with Image.open(smoothed_path) as img:
+            img.save(webp_path, format='WEBP', lossless=True, method=WEBP_METHOD)
+    return smoothed_path
+
+
+def render_overlay_pngs(x: np.ndarray, y: np.ndarray, composite_2d: np.ndarray, pixel_path: str, smoothed_path: str,
+                        smoothed_mode: str = "lut", pixel_webp_path: str = None, smoothed_webp_path: str = None):
+    """
+    Renderiza en una sola pasada el PNG transparente pixel exacto (LUT) y la versión suavizada,
+    más sus WebP lossless si se pasan las rutas (la API elige el formato según Accept).
+    smoothed_mode: "lut" (bicúbica + LUT), "contourf" (matplotlib, histórico) u "off" (no se genera).
+    Los paths pueden ser temporales: el formato se fija explícitamente.
+    """
+    valid = ~np.isnan(composite_2d)
+    idx = quantize_titan(composite_2d)
+    save_indexed_png(upscale_nearest(idx[::-1], OVERLAY_SIZE), pixel_path, webp_path=pixel_webp_path)
+
+    if smoothed_mode == "lut":
+        render_smoothed_lut_png(composite_2d, smoothed_path, valid=valid, webp_path=smoothed_webp_path)
+    elif smoothed_mode == "contourf":
+        render_smoothed_contourf(x, y, composite_2d, smoothed_path, webp_path=smoothed_webp_path)
+    else:
+        smoothed_path = None
+    return pixel_path, smoothed_path
+
+
+def render_pixel_matplotlib(x: np.ndarray, y: np.ndarray, composite_2d: np.ndarray, pixel_path: str):
+    """Render pixel exacto histórico (pcolormesh). Se conserva como referencia para scripts/bench_render.py."""
+    fig = plt.figure(figsize=(10, 10), dpi=150)
+    ax = fig.add_subplot(1, 1, 1)
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+    ax.set_axis_off()
+
+    cmap = ListedColormap(TITAN_COLORS)
+    cmap.set_under('none') # Transparente por debajo de 5 dbz
+    norm = BoundaryNorm(TITAN_BOUNDS, cmap.N)
+
+    # Dibujar la imagen de reflectividad SIN CONTORNOS SUAVIZADOS
+    # Usamos pcolormesh para representar los píxeles (celdas) exactamente como son,
+    # sin que la interpolación de contourf reduzca su tamaño visual o cambie su forma.
+    ax.pcolormesh(x, y, composite_2d, cmap=cmap, norm=norm, shading='auto')
+
+    plt.tight_layout(pad=0)
+    # Aumentamos DPI a 300 para que los contornos se vean nítidos en móviles retina/high-res
+    plt.savefig(pixel_path, format='png', dpi=300, transparent=True, bbox_inches='tight', pad_inches=0)
+    plt.close(fig)
+    return pixel_path
@@ -0,0 +1,214 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+
+from services.radar_render import quantize_titan, save_indexed_png, TITAN_LUT
+from services.radar_geo import get_latlon_grid, aeqd_transformer
+
+# =================================================================
+# Pirámide de tiles XYZ (Web Mercator) por frame.
+# El remapeo AEQD (grilla del radar, km) -> píxel Mercator se calcula una sola vez por
+# radar/grilla con pyproj y se cachea en disco como .npy (mmap, compartido entre procesos).
+# Cada frame se teselá con un gather de numpy sobre el índice TITAN ya cuantizado.
+# Los tiles vacíos no se escriben: la API responde con un único tile transparente compartido.
+# =================================================================
+
+TILE_SIZE = 256
+# Zoom de referencia: hasta acá el remapeo es exacto por píxel (~250 m/px en Mendoza). Para zooms
+# mayores se subdivide el píxel de referencia (la grilla fuente es de 1 km, el error es < 1/8 de celda).
+REMAP_REFERENCE_ZOOM = 9
+EMPTY_TILE_FILENAME = "_empty.png"
+FRAME_MANIFEST = "tiles.json"
+
+_remap_cache = {}
+
+
+def _lonlat_of_pixels(px: np.ndarray, py: np.ndarray, zoom: int):
+    """Centro de píxeles Mercator (coordenadas globales del zoom) -> lon/lat en grados."""
+    world = TILE_SIZE * (2 ** zoom)
+    lon = (px + 0.5) / world * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (py + 0.5) / world))))
+    return lon, lat
+
+
+def _pixel_of_lonlat(lon: np.ndarray, lat: np.ndarray, zoom: int):
+    world = TILE_SIZE * (2 ** zoom)
+    px = (np.asarray(lon) + 180.0) / 360.0 * world
+    lat_rad = np.radians(lat)
+    py = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * world
+    return px, py
+
+
+def _grid_key(lat_0, lon_0, earth_radius_m, x_km, y_km, max_zoom, min_zoom) -> str:
+    spec = (round(float(lat_0), 6), round(float(lon_0), 6), float(earth_radius_m),
+            float(x_km[0]), float(x_km[1] - x_km[0]), len(x_km),
+            float(y_km[0]), float(y_km[1] - y_km[0]), len(y_km),
+            min(min_zoom, REMAP_REFERENCE_ZOOM), min(max_zoom, REMAP_REFERENCE_ZOOM))
+    return hashlib.sha1(repr(spec).encode()).hexdigest()[:12]
+
+
+def _domain_lonlat_edges(transformer, x_km, y_km):
+    """lon/lat del contorno de la grilla (bordes de celda), para acotar el canvas Mercator."""
+    dx, dy = x_km[1] - x_km[0], y_km[1] - y_km[0]
+    xe = np.linspace(x_km[0] - dx / 2, x_km[-1] + dx / 2, 200) * 1000.0
+    ye = np.linspace(y_km[0] - dy / 2, y_km[-1] + dy / 2, 200) * 1000.0
+    bx = np.concatenate([xe, xe, np.full_like(ye, xe[0]), np.full_like(ye, xe[-1])])
+    by = np.concatenate([np.full_like(xe, ye[0]), np.full_like(xe, ye[-1]), ye, ye])
+    return transformer.transform(bx, by, direction="INVERSE")
+
+
+def build_tile_remap(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray,
+                     earth_radius_m: float = 6378137.0, max_zoom: int = 11, min_zoom: int = 6) -> dict:
+    """
+    Para cada zoom hasta REMAP_REFERENCE_ZOOM: canvas Mercator que cubre el dominio y, por píxel,
+    el índice plano (fila * nx + col) de la celda fuente. Fuera del dominio = nx * ny (centinela
+    que apunta a un 0 = transparente agregado al final del índice TITAN).
+    """
+    # always_xy: (lon, lat) en grados
+    transformer = aeqd_transformer(lat_0, lon_0, earth_radius_m)
+    nx, ny = len(x_km), len(y_km)
+    dx, dy = float(x_km[1] - x_km[0]), float(y_km[1] - y_km[0])
+    x_edge, y_edge = float(x_km[0]) - dx / 2, float(y_km[0]) - dy / 2
+    lon_edges, lat_edges = _domain_lonlat_edges(transformer, x_km, y_km)
+
+    canvases = {}
+    for zoom in range(min(min_zoom, REMAP_REFERENCE_ZOOM), min(max_zoom, REMAP_REFERENCE_ZOOM) + 1):
+        px, py = _pixel_of_lonlat(lon_edges, lat_edges, zoom)
+        px0, py0 = int(np.floor(px.min())), int(np.floor(py.min()))
+        width, height = int(np.ceil(px.max())) - px0, int(np.ceil(py.max())) - py0
+        gx, gy = np.meshgrid(np.arange(px0, px0 + width, dtype=np.float64), np.arange(py0, py0 + height, dtype=np.float64))
+        lon, lat = _lonlat_of_pixels(gx, gy, zoom)
+        xm, ym = transformer.transform(lon, lat)
+        col = np.floor((xm / 1000.0 - x_edge) / dx).astype(np.int64)
+        row = np.floor((ym / 1000.0 - y_edge) / dy).astype(np.int64)
+        inside = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        remap = np.where(inside, row * nx + col, nx * ny).astype(np.int32)
+        canvases[zoom] = {"origin": (px0, py0), "remap": remap}
+    return {"nx": nx, "ny": ny, "canvases": canvases}
+
+
+def _save_remap(remap: dict, cache_dir: str):
+    temp_dir = f"{cache_dir}.{uuid.uuid4().hex[:8]}.tmp"
+    os.makedirs(temp_dir)
+    meta = {"nx": remap["nx"], "ny": remap["ny"], "zooms": {}}
+    for zoom, canvas in remap["canvases"].items():
+        np.save(os.path.join(temp_dir, f"z{zoom}.npy"), canvas["remap"])
+        meta["zooms"][str(zoom)] = list(canvas["origin"])
+    with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.replace(temp_dir, cache_dir)
+    except OSError:
+        # Otro proceso lo publicó primero
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _load_remap(cache_dir: str) -> dict:
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        meta = json.load(f)
+    canvases = {
+        int(zoom): {"origin": tuple(origin), "remap": np.load(os.path.join(cache_dir, f"z{zoom}.npy"), mmap_mode="r")}
+        for zoom, origin in meta["zooms"].items()
+    }
+    return {"nx": meta["nx"], "ny": meta["ny"], "canvases": canvases}
+
+
+def get_tile_remap(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray, cache_dir: str,
+                   earth_radius_m: float = 6378137.0, max_zoom: int = 11, min_zoom: int = 6) -> dict:
+    """Remapeo cacheado en memoria (por proceso) y en disco (<cache_dir>/tile_remap_<hash>/)."""
+    key = _grid_key(lat_0, lon_0, earth_radius_m, x_km, y_km, max_zoom, min_zoom)
+    if key in _remap_cache:
+        return _remap_cache[key]
+    path = os.path.join(cache_dir, f"tile_remap_{key}")
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        logging.info(f"Construyendo remapeo AEQD->Mercator para tiles ({path})...")
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_remap(build_tile_remap(lat_0, lon_0, x_km, y_km, earth_radius_m, max_zoom, min_zoom), path)
+    _remap_cache[key] = _load_remap(path)
+    return _remap_cache[key]
+
+
+def _tile_source_index(remap: dict, zoom: int, tx: int, ty: int) -> np.ndarray:
+    """Índices fuente (TILE_SIZE x TILE_SIZE) de un tile, recortando del canvas del zoom de referencia."""
+    ref_zoom = min(zoom, max(remap["canvases"]))
+    canvas = remap["canvases"][ref_zoom]
+    factor = 2 ** (zoom - ref_zoom)
+    px0, py0 = canvas["origin"]
+    height, width = canvas["remap"].shape
+    pixels = np.arange(TILE_SIZE)
+    rows = (ty * TILE_SIZE + pixels) // factor - py0
+    cols = (tx * TILE_SIZE + pixels) // factor - px0
+    sentinel = remap["nx"] * remap["ny"]
+    valid_rows, valid_cols = (rows >= 0) & (rows < height), (cols >= 0) & (cols < width)
+    out = np.full((TILE_SIZE, TILE_SIZE), sentinel, dtype=np.int32)
+    out[np.ix_(valid_rows, valid_cols)] = canvas["remap"][np.ix_(rows[valid_rows], cols[valid_cols])]
+    return out
+
+
+def tile_range(remap: dict, zoom: int):
+    """Rango de tiles (tx0, tx1, ty0, ty1) inclusivo que cubre el dominio en un zoom."""
+    ref_zoom = min(zoom, max(remap["canvases"]))
+    canvas = remap["canvases"][ref_zoom]
+    factor = 2 ** (zoom - ref_zoom)
+    px0, py0 = canvas["origin"]
+    height, width = canvas["remap"].shape
+    return (px0 * factor // TILE_SIZE, ((px0 + width) * factor - 1) // TILE_SIZE,
+            py0 * factor // TILE_SIZE, ((py0 + height) * factor - 1) // TILE_SIZE)
+
+
+def ensure_empty_tile(tiles_root: str) -> str:
+    path = os.path.join(tiles_root, EMPTY_TILE_FILENAME)
+    if not os.path.exists(path):
+        os.makedirs(tiles_root, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        save_indexed_png(np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8), temp_path)
+        os.replace(temp_path, path)
+    return path
+
+
+def render_tile_pyramid(composite_2d: np.ndarray, x_km: np.ndarray, y_km: np.ndarray, lat_0: float, lon_0: float,
+                        frame_dir: str, cache_dir: str, earth_radius_m: float = 6378137.0,
+                        min_zoom: int = 6, max_zoom: int = 11) -> str:
+    """
+    Escribe <frame_dir>/<z>/<x>/<y>.png sólo para tiles con eco y un tiles.json con los zooms y la
+    cantidad de tiles escritos. frame_dir puede ser temporal (se publica con os.replace del directorio).
+    """
+    remap = get_tile_remap(lat_0, lon_0, x_km, y_km, cache_dir, earth_radius_m, max_zoom, min_zoom)
+    # Índice TITAN plano + centinela transparente al final
+    idx = np.append(quantize_titan(composite_2d).ravel(), np.uint8(0))
+    written = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        tx0, tx1, ty0, ty1 = tile_range(remap, zoom)
+        count = 0
+        for tx in range(tx0, tx1 + 1):
+            for ty in range(ty0, ty1 + 1):
+                tile = idx[_tile_source_index(remap, zoom, tx, ty)]
+                if not tile.any():
+                    continue
+                tile_dir = os.path.join(frame_dir, str(zoom), str(tx))
+                os.makedirs(tile_dir, exist_ok=True)
+                save_indexed_png(tile, os.path.join(tile_dir, f"{ty}.png"), TITAN_LUT)
+                count += 1
+        written[str(zoom)] = {"range": [tx0, tx1, ty0, ty1], "tiles": count}
+    os.makedirs(frame_dir, exist_ok=True)
+    with open(os.path.join(frame_dir, FRAME_MANIFEST), "w") as f:
+        json.dump({"tile_size": TILE_SIZE, "zooms": written}, f)
+    return frame_dir
+
+
+def init_render_process(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray, cache_dir: str,
+                        earth_radius_m: float = 6378137.0, min_zoom: int = 6, max_zoom: int = 11, tiles_enabled: bool = True,
+                        contours_enabled: bool = False):
+    """
+    Initializer de los procesos de render: los imports (matplotlib, PIL, scipy), las LUTs y el remapeo
+    de tiles se cargan una vez por proceso y no en la primera tarea de cada ciclo.
+    """
+    if tiles_enabled:
+        get_tile_remap(lat_0, lon_0, x_km, y_km, cache_dir, earth_radius_m, max_zoom, min_zoom)
+    if contours_enabled:
+        get_latlon_grid(lat_0, lon_0, x_km, y_km, cache_dir, earth_radius_m)
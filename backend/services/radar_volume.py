@@ -0,0 +1,125 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from services.frame_store import frame_path
+
+# =================================================================
+# Productos volumétricos de tormenta desde el volumen 3D de DBZ (niveles, y, x).
+# En la misma pasada que arma el composite (máximo en la vertical) se calculan, con reducciones
+# numpy a lo largo de Z y las alturas de los niveles precalculadas (sin bucles por columna):
+#   echo_top  altura del nivel más alto con dBZ >= ECHO_TOP_DBZ (km)
+#   vil       agua líquida integrada en la vertical (kg/m², Greene & Clark 1972)
+#   h45, h55  altura del nivel más alto con dBZ >= 45 / 55 (km): tope de los núcleos de granizo
+# El VIL se integra desde el nivel más bajo: es una integral de la columna y saltear los niveles de
+# clutter lo subestimaría justo en los núcleos de granizo (el tope de 56 dBZ acota el aporte del
+# clutter). Los topes sí usan los niveles sin clutter, como el composite: un eco sólo en los niveles
+# bajos daría un tope espurio.
+# Los rasters se guardan por frame como uint8 (valor = código * resolución, 0 = sin eco), igual
+# que el frame store. Layout: <dir>/<YYYYMMDD>/<frame>.npz con un array por producto, fila 0 = sur.
+# =================================================================
+
+ECHO_TOP_DBZ = 18.0
+CORE_DBZ = {"h45": 45.0, "h55": 55.0}
+VIL_MAX_DBZ = 56.0  # tope de Z en el VIL para que el granizo (Z muy alto) no lo infle
+VIL_COEFFICIENT = 3.44e-6
+# producto: (campo en las celdas, resolución del código uint8, unidad)
+VOLUME_PRODUCTS = {
+    "echo_top": ("echo_top_km", 0.1, "km"),
+    "vil": ("vil_kg_m2", 0.5, "kg/m2"),
+    "h45": ("h45_km", 0.1, "km"),
+    "h55": ("h55_km", 0.1, "km"),
+}
+
+
+def level_heights_km(values, units: str, n_levels: int) -> np.ndarray:
+    """Alturas (km) de los niveles según la coordenada vertical del archivo; sin ella, 1 km por nivel."""
+    if values is None or len(values) != n_levels:
+        return np.arange(n_levels, dtype=np.float32)
+    heights = np.asarray(values, dtype=np.float32)
+    if (units or "").lower() in ("m", "meter", "meters", "metre", "metres"):
+        heights = heights / 1000.0
+    return heights
+
+
+@lru_cache(maxsize=8)
+def _layer_thickness_m(heights_km: tuple) -> np.ndarray:
+    return (np.diff(np.asarray(heights_km, dtype=np.float64)) * 1000.0).astype(np.float32)
+
+
+def _top_height(mask: np.ndarray, heights_km: np.ndarray) -> np.ndarray:
+    """Altura del nivel más alto con mask en cada columna (NaN si ninguno): argmax sobre Z invertido."""
+    top = mask.shape[0] - 1 - np.argmax(mask[::-1], axis=0)
+    found = np.take_along_axis(mask, top[np.newaxis], axis=0)[0]
+    return np.where(found, heights_km[top], np.nan).astype(np.float32)
+
+
+def _vil(volume: np.ndarray, heights_km: np.ndarray) -> np.ndarray:
+    """VIL = sum(3.44e-6 * ((Z_i + Z_i+1) / 2)^(4/7) * dh) en kg/m², con Z lineal (mm^6/m^3) y dh en m."""
+    if volume.shape[0] < 2:
+        return np.zeros(volume.shape[1:], dtype=np.float32)
+    z_linear = np.power(np.float32(10.0), np.minimum(volume, VIL_MAX_DBZ) / np.float32(10.0))
+    np.nan_to_num(z_linear, copy=False, nan=0.0)
+    layers = z_linear[1:] + z_linear[:-1]
+    layers *= 0.5
+    np.power(layers, np.float32(4.0 / 7.0), out=layers)
+    thickness = _layer_thickness_m(tuple(heights_km.tolist()))
+    return (np.tensordot(thickness, layers, axes=1) * VIL_COEFFICIENT).astype(np.float32)
+
+
+def reduce_volume(volume: np.ndarray, heights_km: np.ndarray, skip_levels: int, detection_skip: int) -> tuple:
+    """
+    Reduce el volumen (niveles, y, x) en una sola pasada: (composite visual, composite de detección,
+    {producto: raster float32, NaN = sin eco}). El composite y los topes usan los niveles desde
+    skip_levels (sin el clutter bajo); la detección, desde detection_skip; el VIL, la columna completa.
+    Si no quedan niveles se usa el volumen completo, como antes.
+    """
+    start = skip_levels if volume.shape[0] > skip_levels else 0
+    levels, heights = volume[start:], heights_km[start:]
+    composite = np.nanmax(levels, axis=0)
+    if detection_skip == start or volume.shape[0] <= detection_skip:
+        detection = composite
+    else:
+        detection = np.nanmax(volume[detection_skip:], axis=0)
+
+    products = {"echo_top": _top_height(levels >= ECHO_TOP_DBZ, heights), "vil": _vil(volume, heights_km)}
+    for name, threshold in CORE_DBZ.items():
+        products[name] = _top_height(levels >= threshold, heights)
+    return composite, detection, products
+
+
+def product_path(products_dir: str, frame_name: str) -> str:
+    """<products_dir>/<YYYYMMDD>/<frame>.npz (mismo sharding que el frame store)."""
+    return os.path.splitext(frame_path(products_dir, frame_name))[0] + ".npz"
+
+
+def encode_product(values: np.ndarray, resolution: float) -> np.ndarray:
+    codes = np.rint(values / resolution)
+    np.clip(codes, 0, 255, out=codes)
+    np.nan_to_num(codes, copy=False, nan=0)
+    return codes.astype(np.uint8)
+
+
+def decode_product(codes: np.ndarray, resolution: float) -> np.ndarray:
+    values = codes.astype(np.float32) * resolution
+    values[codes == 0] = np.nan
+    return values
+
+
+def save_products(path: str, products: dict) -> str:
+    """Escribe los rasters codificados. path puede ser temporal (np.savez no le agrega extensión a un archivo abierto)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **{name: encode_product(products[name], resolution)
+                                  for name, (_, resolution, _) in VOLUME_PRODUCTS.items()})
+    return path
+
+
+def load_product_codes(products_dir: str, frame_name: str, product: str) -> np.ndarray:
+    """Códigos uint8 de un producto (fila 0 = sur) o None si el frame no tiene productos."""
+    path = product_path(products_dir, frame_name)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data[product]
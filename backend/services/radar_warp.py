@@ -0,0 +1,134 @@
+import os
+import uuid
+import hashlib
+import logging
+
+import numpy as np
+
+from services.radar_render import (quantize_titan, smoothed_titan_index, save_indexed_png, TITAN_LUT, OVERLAY_SIZE,
+                                   SMOOTH_INTERP_SIZE)
+from services.radar_tiles import _domain_lonlat_edges
+from services.radar_geo import aeqd_transformer
+
+# =================================================================
+# Overlay alineado a Web Mercator.
+# El frontend estira la imagen sobre un rectángulo lat/lon (L.imageOverlay), así que un PNG dibujado
+# en km AEQD queda deformado hacia los bordes del dominio. Acá se calcula una sola vez por
+# radar/grilla/tamaño (pyproj, cacheado en disco como .npy mmap) qué celda fuente cae en cada píxel
+# de una imagen Mercator que cubre exactamente el bbox lat/lon del dominio; cada frame se proyecta
+# con un único gather de numpy sobre el índice TITAN, antes de aplicar la paleta.
+# =================================================================
+
+REMAP_CHUNK_ROWS = 256
+
+_warp_cache = {}
+_bounds_cache = {}
+
+
+def _mercator_y(lat_deg):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat_deg) / 2))
+
+
+def _warp_key(lat_0, lon_0, earth_radius_m, x_km, y_km, *extra) -> str:
+    spec = (round(float(lat_0), 6), round(float(lon_0), 6), float(earth_radius_m),
+            float(x_km[0]), float(x_km[1] - x_km[0]), len(x_km),
+            float(y_km[0]), float(y_km[1] - y_km[0]), len(y_km)) + extra
+    return hashlib.sha1(repr(spec).encode()).hexdigest()[:12]
+
+
+def get_overlay_bounds(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray,
+                       earth_radius_m: float = 6378137.0) -> list:
+    """[[lat_min, lon_min], [lat_max, lon_max]]: bbox lat/lon del dominio (bordes de celda), cacheado por proceso."""
+    key = _warp_key(lat_0, lon_0, earth_radius_m, x_km, y_km)
+    if key not in _bounds_cache:
+        lon, lat = _domain_lonlat_edges(aeqd_transformer(lat_0, lon_0, earth_radius_m), x_km, y_km)
+        _bounds_cache[key] = [[float(lat.min()), float(lon.min())], [float(lat.max()), float(lon.max())]]
+    return _bounds_cache[key]
+
+
+def build_overlay_remap(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray, width: int, source_size: int,
+                        earth_radius_m: float = 6378137.0) -> np.ndarray:
+    """
+    (alto, width) int32, fila 0 = norte: índice plano (fila * n + col, fila 0 = sur) de la celda de una
+    grilla fuente de source_size x source_size sobre el mismo dominio que x_km/y_km. Fuera del dominio
+    = n * n (centinela que apunta a un 0 = transparente agregado al final del índice).
+    """
+    transformer = aeqd_transformer(lat_0, lon_0, earth_radius_m)
+    (lat_min, lon_min), (lat_max, lon_max) = get_overlay_bounds(lat_0, lon_0, x_km, y_km, earth_radius_m)
+    my_min, my_max = _mercator_y(lat_min), _mercator_y(lat_max)
+    height = int(round(width * (my_max - my_min) / np.radians(lon_max - lon_min)))
+
+    dx, dy = float(x_km[1] - x_km[0]), float(y_km[1] - y_km[0])
+    x_edge, y_edge = float(x_km[0]) - dx / 2, float(y_km[0]) - dy / 2
+    cell_x, cell_y = dx * len(x_km) / source_size, dy * len(y_km) / source_size
+    n = source_size
+
+    lon = lon_min + (np.arange(width) + 0.5) * (lon_max - lon_min) / width
+    remap = np.empty((height, width), dtype=np.int32)
+    for row0 in range(0, height, REMAP_CHUNK_ROWS):
+        rows = np.arange(row0, min(row0 + REMAP_CHUNK_ROWS, height))
+        lat = np.degrees(np.arctan(np.sinh(my_max - (rows + 0.5) * (my_max - my_min) / height)))
+        glon, glat = np.meshgrid(lon, lat)
+        xm, ym = transformer.transform(glon, glat)
+        col = np.floor((xm / 1000.0 - x_edge) / cell_x).astype(np.int64)
+        row = np.floor((ym / 1000.0 - y_edge) / cell_y).astype(np.int64)
+        inside = (col >= 0) & (col < n) & (row >= 0) & (row < n)
+        remap[rows] = np.where(inside, row * n + col, n * n)
+    return remap
+
+
+def get_overlay_remap(lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray, cache_dir: str, width: int,
+                      source_size: int, earth_radius_m: float = 6378137.0) -> np.ndarray:
+    """Remapeo cacheado en memoria (por proceso) y en disco (<cache_dir>/overlay_remap_<hash>.npy)."""
+    key = _warp_key(lat_0, lon_0, earth_radius_m, x_km, y_km, int(width), int(source_size))
+    if key in _warp_cache:
+        return _warp_cache[key]
+    path = os.path.join(cache_dir, f"overlay_remap_{key}.npy")
+    if not os.path.exists(path):
+        logging.info(f"Construyendo remapeo AEQD->Mercator del overlay {width}px ({path})...")
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, build_overlay_remap(lat_0, lon_0, x_km, y_km, width, source_size, earth_radius_m))
+        os.replace(temp_path, path)
+    _warp_cache[key] = np.load(path, mmap_mode="r")
+    return _warp_cache[key]
+
+
+def warp_index(idx_south_up: np.ndarray, remap: np.ndarray) -> np.ndarray:
+    """Gather del índice TITAN (fila 0 = sur) al canvas Mercator, con el centinela transparente."""
+    return np.append(idx_south_up.ravel(), np.uint8(0))[remap]
+
+
+def mercator_overlay_index(composite_2d: np.ndarray, x_km: np.ndarray, y_km: np.ndarray, lat_0: float, lon_0: float,
+                           cache_dir: str, earth_radius_m: float = 6378137.0, size: int = OVERLAY_SIZE,
+                           smoothed: bool = False) -> np.ndarray:
+    """Índice TITAN del overlay en Mercator (size de ancho, fila 0 = norte), sin codificar."""
+    if smoothed:
+        source_size = min(size, SMOOTH_INTERP_SIZE)
+        idx = smoothed_titan_index(composite_2d, size=source_size)[::-1]
+    else:
+        source_size = composite_2d.shape[0]
+        idx = quantize_titan(composite_2d)
+    remap = get_overlay_remap(lat_0, lon_0, x_km, y_km, cache_dir, size, source_size, earth_radius_m)
+    return warp_index(idx, remap)
+
+
+def render_mercator_overlay(composite_2d: np.ndarray, output_path: str, x_km: np.ndarray, y_km: np.ndarray,
+                            lat_0: float, lon_0: float, cache_dir: str, earth_radius_m: float = 6378137.0,
+                            size: int = OVERLAY_SIZE, smoothed: bool = False, lut: np.ndarray = TITAN_LUT,
+                            webp_path: str = None) -> str:
+    """Como render_lut_png / render_smoothed_lut_png, pero en Mercator: size es el ancho de la imagen."""
+    idx = mercator_overlay_index(composite_2d, x_km, y_km, lat_0, lon_0, cache_dir, earth_radius_m, size, smoothed)
+    return save_indexed_png(idx, output_path, lut, webp_path)
+
+
+def render_mercator_overlays(x: np.ndarray, y: np.ndarray, composite_2d: np.ndarray, pixel_path: str, smoothed_path: str,
+                             lat_0: float, lon_0: float, cache_dir: str, earth_radius_m: float = 6378137.0,
+                             pixel_webp_path: str = None, smoothed_webp_path: str = None) -> tuple:
+    """Equivalente Mercator de render_overlay_pngs (el suavizado siempre por LUT)."""
+    render_mercator_overlay(composite_2d, pixel_path, x, y, lat_0, lon_0, cache_dir, earth_radius_m, webp_path=pixel_webp_path)
+    if smoothed_path:
+        render_mercator_overlay(composite_2d, smoothed_path, x, y, lat_0, lon_0, cache_dir, earth_radius_m,
+                                smoothed=True, webp_path=smoothed_webp_path)
+    return pixel_path, smoothed_path
@@ -0,0 +1,173 @@
+import os
+import json
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.colors import to_rgba_array
+
+from services.frame_store import quantize_composite
+from services.radar_geo import aeqd_transformer
+
+# =================================================================
+# Lluvia acumulada (QPE) por día pluviométrico (mismo día que la manga de granizo: desde las 11 UTC).
+# Cada scan observado se convierte a intensidad con una relación Z-R (Z = a * R^b, Marshall-Palmer
+# por defecto) y se suma, pesada por el intervalo real desde el scan anterior, sobre un .npy float32
+# (mm) mapeado en memoria y actualizado in-place. La conversión dBZ -> mm/h es una LUT de 256
+# entradas sobre los códigos uint8 del frame store, así cada scan cuesta un gather y una suma.
+# Layout: <rain_dir>/<YYYYMMDD>/rain_mm.npy, fila 0 = sur. <rain_dir>/_index.json guarda el máximo
+# acumulado de cada día (las consultas por rango saltean los días secos) y _state.json el último scan.
+# =================================================================
+
+RAIN_FILENAME = "rain_mm.npy"
+INDEX_FILENAME = "_index.json"
+STATE_FILENAME = "_state.json"
+
+# Escala de colores del acumulado (mm); índice 0 = bajo el primer límite (transparente)
+RAIN_BOUNDS_MM = [1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 150]
+RAIN_COLORS = ['#c6dbef', '#9ecae1', '#6baed6', '#3182bd', '#08519c', '#31a354', '#addd8e', '#fee391',
+               '#fec44f', '#fe9929', '#d95f0e', '#993404']
+RAIN_LUT = np.zeros((len(RAIN_BOUNDS_MM) + 1, 4), dtype=np.uint8)
+RAIN_LUT[1:] = np.round(to_rgba_array(RAIN_COLORS) * 255).astype(np.uint8)
+
+
+def rain_path(rain_dir: str, day: str) -> str:
+    return os.path.join(rain_dir, day, RAIN_FILENAME)
+
+
+@lru_cache(maxsize=8)
+def rate_lut(scale: float, bias: float, a: float, b: float, min_dbz: float, max_dbz: float) -> np.ndarray:
+    """
+    mm/h por código uint8 del frame store: R = (Z / a)^(1/b), con Z lineal en el centro del bin.
+    Bajo min_dbz (ruido, clutter débil) no llueve; sobre max_dbz se satura (el granizo no es lluvia).
+    """
+    dbz = (np.arange(256) + 0.5) * scale + bias
+    rate = np.power(np.power(10.0, np.minimum(dbz, max_dbz) / 10.0) / a, 1.0 / b)
+    rate[dbz < min_dbz] = 0.0
+    rate[0] = 0.0
+    return rate.astype(np.float32)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_json(path: str, payload: dict):
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(temp_path, path)
+
+
+def load_rain_index(rain_dir: str) -> dict:
+    """{YYYYMMDD: máximo acumulado del día en mm}; vacío si todavía no hay índice."""
+    return _read_json(os.path.join(rain_dir, INDEX_FILENAME))
+
+
+def scan_interval_minutes(rain_dir: str, scan_time: datetime, default_minutes: float, max_gap_minutes: float):
+    """
+    Minutos que representa el scan: desde el anterior acumulado, o default_minutes si es el primero o
+    hubo un hueco mayor a max_gap_minutes. None si el scan no es posterior al último (repetido o fuera
+    de orden): sumarlo contaría dos veces ese intervalo.
+    """
+    last_scan = _read_json(os.path.join(rain_dir, STATE_FILENAME)).get("last_scan")
+    if last_scan is None:
+        return default_minutes
+    elapsed = (scan_time - datetime.fromisoformat(last_scan)).total_seconds() / 60.0
+    if elapsed <= 0:
+        return None
+    return elapsed if elapsed <= max_gap_minutes else default_minutes
+
+
+def accumulate_rain(rain_dir: str, day: str, composite_2d: np.ndarray, minutes: float, scan_time: datetime,
+                    lut: np.ndarray, scale: float, bias: float) -> float:
+    """
+    Suma la lluvia del scan (mm = mm/h * minutes / 60) al raster del día. El archivo se crea completo en
+    un temporal y se publica con os.replace; después sólo se actualiza in-place (los valores nunca bajan).
+    Devuelve el máximo acumulado del día.
+    """
+    depth = lut[quantize_composite(composite_2d, scale, bias)]
+    depth *= np.float32(minutes / 60.0)
+    path = rain_path(rain_dir, day)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.zeros(depth.shape, dtype=np.float32))
+        os.replace(temp_path, path)
+    rain = np.load(path, mmap_mode="r+")
+    rain += depth
+    rain.flush()
+    peak = float(rain.max())
+    del rain
+    _write_json(os.path.join(rain_dir, STATE_FILENAME), {"last_scan": scan_time.isoformat()})
+    index = load_rain_index(rain_dir)
+    if day not in index or peak > index[day]:
+        index[day] = round(peak, 2)
+        _write_json(os.path.join(rain_dir, INDEX_FILENAME), dict(sorted(index.items())))
+    return peak
+
+
+def rain_days(rain_dir: str, first_day: str, last_day: str, min_mm: float = 0.0) -> list:
+    """Días del rango (inclusive) con raster y máximo > min_mm según el índice (los que no figuran se incluyen)."""
+    index = load_rain_index(rain_dir)
+    day = datetime.strptime(first_day, "%Y%m%d")
+    last = datetime.strptime(last_day, "%Y%m%d")
+    days = []
+    while day <= last:
+        key = day.strftime("%Y%m%d")
+        if index.get(key, np.inf) > min_mm and os.path.exists(rain_path(rain_dir, key)):
+            days.append(key)
+        day += timedelta(days=1)
+    return days
+
+
+def sum_rain(rain_dir: str, days: list) -> np.ndarray:
+    """Acumulado total (mm, float32, fila 0 = sur) de days, o None si ninguno tiene raster."""
+    total = None
+    for day in days:
+        path = rain_path(rain_dir, day)
+        if not os.path.exists(path):
+            continue
+        rain = np.load(path, mmap_mode="r")
+        if total is None:
+            total = np.array(rain, dtype=np.float32)
+        else:
+            total += rain
+        del rain
+    return total
+
+
+def point_rain(rain_dir: str, days: list, row: int, col: int) -> dict:
+    """{día: mm} en una celda de la grilla, leyendo sólo ese valor de cada raster mapeado."""
+    values = {}
+    for day in days:
+        path = rain_path(rain_dir, day)
+        if os.path.exists(path):
+            rain = np.load(path, mmap_mode="r")
+            values[day] = round(float(rain[row, col]), 1)
+            del rain
+    return values
+
+
+def grid_cell(lat: float, lon: float, lat_0: float, lon_0: float, x_km: np.ndarray, y_km: np.ndarray,
+              earth_radius_m: float = 6378137.0):
+    """(fila, columna) de la celda que contiene (lat, lon), fila 0 = sur; None fuera del dominio."""
+    x_m, y_m = aeqd_transformer(lat_0, lon_0, earth_radius_m).transform(lon, lat)
+    dx, dy = float(x_km[1] - x_km[0]), float(y_km[1] - y_km[0])
+    col = int(np.floor((x_m / 1000.0 - (float(x_km[0]) - dx / 2)) / dx))
+    row = int(np.floor((y_m / 1000.0 - (float(y_km[0]) - dy / 2)) / dy))
+    if not (0 <= row < len(y_km) and 0 <= col < len(x_km)):
+        return None
+    return row, col
+
+
+def rain_index(rain_mm: np.ndarray) -> np.ndarray:
+    """Índice uint8 en RAIN_LUT por celda (0 = menos de 1 mm, transparente)."""
+    return np.digitize(rain_mm, np.asarray(RAIN_BOUNDS_MM, dtype=np.float32)).astype(np.uint8)
+
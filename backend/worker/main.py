@@ -11,19 +11,41 @@ import xarray as xr
 from netCDF4 import Dataset as NCDataset
 import pyproj
 import glob
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap, BoundaryNorm
-import cartopy.crs as ccrs
 import sqlite3
-from scipy.ndimage import label, center_of_mass
+import threading
+from scipy.ndimage import label, center_of_mass, generate_binary_structure
 
 
 # Importamos desde nuestros módulos
 from core.config import (MDV_INBOX_DIR, MDV_ARCHIVE_DIR, INPUT_DIR, OUTPUT_DIR, ARCHIVE_DIR, 
                     SECUENCE_LENGHT, POLL_INTERVAL_SECONDS, MODEL_PATH, 
                     DATA_CONFIG, STATUS_FILE_PATH, MDV_OUTPUT_DIR, IMAGE_OUTPUT_DIR, DB_PATH,
-                    VAPID_PRIVATE_KEY, VAPID_CLAIM_EMAIL, FRONTEND_URL)
+                    VAPID_PRIVATE_KEY, VAPID_CLAIM_EMAIL, FRONTEND_URL,
+                    PREDICTION_NC_FORMAT, PREDICTION_MULTI_FILENAME, MDV_WRITER,
+                    OUTPUT_IO_WORKERS, RENDER_WORKERS, RETENTION_POLICIES, RETENTION_INTERVAL_SECONDS,
+                    SMOOTHED_RENDER, TILE_OUTPUT_DIR, GEO_CACHE_DIR, TILES_ENABLED, TILE_MIN_ZOOM, TILE_MAX_ZOOM,
+                    RENDER_MODE, FRAME_STORE_DIR, OVERLAY_WEBP,
+                    ANIMATION_OUTPUT_DIR, ANIMATION_BUNDLE_ENABLED, ANIMATION_SMOOTHED_SIZE,
+                    CONTOUR_OUTPUT_DIR, CONTOURS_ENABLED, CONTOUR_LEVELS, CONTOUR_ZOOMS, OVERLAY_PROJECTION,
+                    CELL_TRACKS_PATH, TRACK_MAX_SPEED_KMH, TRACK_GATE_KM, TRACK_MAX_GAP_MINUTES,
+                    HAIL_SWATH_DIR, HAIL_SWATH_MIN_DBZ, VOLUME_PRODUCTS_DIR,
+                    QPE_DIR, QPE_ZR_A, QPE_ZR_B, QPE_MIN_DBZ, QPE_MAX_DBZ, QPE_DEFAULT_INTERVAL_MINUTES, QPE_MAX_GAP_MINUTES)
 from model.predict import ModelPredictor
+from worker.mdv_writer import stage_forecast_mdv, update_forecast_index
+from worker.output_pool import OutputWriterPool, staging_path, publish, discard, share_array, release_shared
+from worker.retention import RetentionManager, archive_into_shard, day_key
+from services.radar_render import render_overlay_pngs, OVERLAY_BOUNDS, OVERLAY_SIZE, SMOOTH_INTERP_SIZE
+from services.radar_warp import render_mercator_overlays, get_overlay_remap, get_overlay_bounds
+from services.radar_tiles import render_tile_pyramid, get_tile_remap, ensure_empty_tile, init_render_process
+from services.frame_store import frame_path, save_frame
+from services.animation_bundle import write_bundle, bundle_filename
+from services.radar_contours import render_contours
+from services.radar_geo import get_latlon_grid, cell_latlon
+from services.cell_tracker import CellTracker, approach
+from services.radar_animation import frame_time
+from services.hail_swath import accumulate_swath, business_day
+from services.rain_accumulation import accumulate_rain, rate_lut, scan_interval_minutes
+from services.radar_volume import VOLUME_PRODUCTS, level_heights_km, reduce_volume, product_path, save_products
 from services import aircraft_tracker
 
 from pywebpush import webpush, WebPushException
@@ -49,137 +71,144 @@ def haversine(lat1, lon1, lat2, lon2):
 # --- Configuración del Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-def detect_storm_cells(dbz_data, x_vals, y_vals, projection):
+# Conectividad de las celdas: 4-vecinos en el plano; en un cubo (pasos, y, x) no se conectan pasos distintos
+CELL_STRUCTURE_2D = generate_binary_structure(2, 1)
+CELL_STRUCTURE_3D = np.stack([np.zeros_like(CELL_STRUCTURE_2D), CELL_STRUCTURE_2D, np.zeros_like(CELL_STRUCTURE_2D)])
+
+def storm_cell_cores_batch(dbz_cube: np.ndarray, threshold: float = 50.0, fields: dict = None) -> tuple:
+    """
+    Celdas conexas con dBZ > threshold de todos los pasos de un cubo (pasos, y, x) en una sola pasada:
+    (paso, max_dbz, core_y, core_x, {campo: máximo}) por celda, ordenadas por paso y, dentro de cada paso,
+    como las etiquetaría label() sobre ese plano. El núcleo es el promedio (truncado a entero) de las
+    posiciones con dBZ >= max - 0.1 dentro de la celda. Se trabaja sobre la lista de píxeles etiquetados
+    (reducciones por etiqueta con ufunc.at / bincount), sin una máscara del grid completo por celda.
+    fields: cubos de la misma forma (ej. productos volumétricos) de los que se toma el máximo por celda
+    ignorando NaN (NaN si la celda no tiene ningún valor).
     """
-    Detecta celdas de tormenta (>50 dBZ) y calcula sus centroides.
+    fields = fields or {}
+    mask = dbz_cube > threshold
+    if not np.any(mask):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0), empty, empty, {name: np.empty(0) for name in fields}
+
+    labeled_array, num_features = label(mask, structure=CELL_STRUCTURE_3D)
+    ts, ys, xs = np.nonzero(mask)
+    labels = labeled_array[ts, ys, xs]
+    values = dbz_cube[ts, ys, xs]
+
+    max_values = np.full(num_features + 1, -np.inf, dtype=dbz_cube.dtype)
+    np.maximum.at(max_values, labels, values)
+    max_dbz = max_values[1:].astype(np.float64)
+    step = np.zeros(num_features + 1, dtype=np.int64)
+    step[labels] = ts
+
+    # Umbral del núcleo por etiqueta, comparado en el dtype del composite (como el escalar de antes)
+    core_threshold = np.concatenate([[np.inf], max_dbz - 0.1]).astype(dbz_cube.dtype)
+    core = values >= core_threshold[labels]
+    core_labels = labels[core]
+    counts = np.bincount(core_labels, minlength=num_features + 1)[1:]
+    mean_y = np.bincount(core_labels, weights=ys[core], minlength=num_features + 1)[1:] / counts
+    mean_x = np.bincount(core_labels, weights=xs[core], minlength=num_features + 1)[1:] / counts
+
+    field_max = {}
+    for name, field in fields.items():
+        maxima = np.full(num_features + 1, np.nan)
+        np.fmax.at(maxima, labels, field[ts, ys, xs])
+        field_max[name] = maxima[1:]
+    return step[1:], max_dbz, mean_y.astype(np.int64), mean_x.astype(np.int64), field_max
+
+
+def storm_cell_cores(dbz_data: np.ndarray, threshold: float = 50.0) -> tuple:
+    """(max_dbz, core_y, core_x) por celda de un composite 2D (ver storm_cell_cores_batch)."""
+    _, max_dbz, core_y, core_x, _ = storm_cell_cores_batch(dbz_data[np.newaxis], threshold)
+    return max_dbz, core_y, core_x
+
+
+def detect_storm_cells_batch(dbz_cube: np.ndarray, latlon_grid: np.ndarray, products: dict = None) -> list:
+    """
+    Detecta celdas de tormenta (>50 dBZ) en cada paso de un cubo (pasos, y, x) con un único
+    etiquetado y un único gather de lat/lon. Devuelve una lista de celdas por paso.
     Clasificación:
       - > 50 dBZ: Lluvia Torrencial
       - > 55 dBZ: Probable Granizo
       - > 58 dBZ: Granizo / Lluvia Torrencial Extrema
+    products: rasters volumétricos (services/radar_volume.py) con la forma del cubo; cada celda
+    lleva el máximo de cada uno dentro de la celda (echo_top_km, vil_kg_m2, h45_km, h55_km).
     """
-    cells = []
-    # Thresholding: Solo interesa > 50 dBZ
-    mask = dbz_data > 50.0
-    
-    if not np.any(mask):
-        return []
-
-    # Connected Components
-    labeled_array, num_features = label(mask)
-    
-    geo_proj = ccrs.Geodetic()
-
-    for label_idx in range(1, num_features + 1):
-        # Mask para esta celda
-        cell_mask = (labeled_array == label_idx)
-        
-        # Max dBZ en la celda
-        max_dbz = float(np.max(dbz_data[cell_mask]))
-        
+    cells_per_step = [[] for _ in range(dbz_cube.shape[0])]
+    steps, max_dbz_cells, core_y, core_x, product_max = storm_cell_cores_batch(dbz_cube, 50.0, products)
+    if len(max_dbz_cells) == 0:
+        return cells_per_step
+
+    # El marcador va en el píxel más intenso (core de la tormenta) en lugar del centroide geométrico;
+    # si hay un cluster con la intensidad máxima, el promedio de sus posiciones
+    px_x = np.clip(core_x, 0, latlon_grid.shape[2] - 1)
+    px_y = np.clip(core_y, 0, latlon_grid.shape[1] - 1)
+    lats, lons = cell_latlon(latlon_grid, px_y, px_x)
+
+    product_values = {VOLUME_PRODUCTS[name][0]: values.tolist() for name, values in product_max.items()}
+    for i, (step, max_dbz, lat, lon) in enumerate(zip(steps.tolist(), max_dbz_cells.tolist(), lats.tolist(), lons.tolist())):
         # Clasificación
         hazard_type = "Lluvia Torrencial"
         if max_dbz > 58:
             hazard_type = "Granizo Confirmado"
         elif max_dbz > 55:
             hazard_type = "Probable Granizo"
-            
-        # Encontrar las coordenadas del píxel más intenso (Core de la tormenta)
-        # en lugar del centroide geométrico para mayor precisión en el marcador
-        # Encontrar los índices (y, x) donde ocurre el max_dbz dentro de esta celda
-        y_indices, x_indices = np.where(cell_mask & (dbz_data >= max_dbz - 0.1))
-        
-        # Si hay un cluster de píxeles con la máxima intensidad, promediamos sus posiciones
-        # para que el marcador quede en el verdadero "centro de gravedad" de la intensidad máxima.
-        mean_y_idx = int(np.mean(y_indices))
-        mean_x_idx = int(np.mean(x_indices))
-        
-        # Bounds check
-        px_x = max(0, min(mean_x_idx, len(x_vals) - 1))
-        px_y = max(0, min(mean_y_idx, len(y_vals) - 1))
-        
-        real_x = x_vals[px_x] * 1000 # a metros
-        real_y = y_vals[px_y] * 1000 # a metros
-        
-        # Transformar a Lat/Lon
-        geo_point = geo_proj.transform_point(real_x, real_y, projection)
-        lon, lat = geo_point[0], geo_point[1]
-        
-        cells.append({
+
+        cell = {
             "type": hazard_type,
             "max_dbz": round(max_dbz, 1),
             "lat": round(lat, 5),
             "lon": round(lon, 5)
-        })
+        }
+        for key, values in product_values.items():
+            if np.isfinite(values[i]):
+                cell[key] = round(values[i], 1)
+        cells_per_step[step].append(cell)
         
-    return cells
+    return cells_per_step
+
+
+def detect_storm_cells(dbz_data, latlon_grid, products: dict = None):
+    """Celdas de tormenta de un composite 2D (ver detect_storm_cells_batch)."""
+    products = {name: raster[np.newaxis] for name, raster in (products or {}).items()}
+    return detect_storm_cells_batch(dbz_data[np.newaxis], latlon_grid, products)[0]
 
 import functools
 
-def update_hail_swath(dbz_data: np.ndarray, x: np.ndarray, y: np.ndarray, projection, min_dbz: float = 55.0):
+def update_hail_swath(dbz_data: np.ndarray, scan_time: datetime = None):
     """
-    Extrae los píxeles donde DBZ >= min_dbz y los añade al archivo JSON acumulativo del día.
+    Acumula el scan en el raster de máximos del día granicero (services/hail_swath.py). Se guarda el
+    máximo de todas las celdas; el umbral de granizo (HAIL_SWATH_MIN_DBZ) se aplica al leerlo.
     """
     try:
-        # Encontrar índices donde la reflectividad supera el umbral
-        y_indices, x_indices = np.where(dbz_data >= min_dbz)
-        if len(x_indices) == 0:
-            return  # No hay granizo
-
-        geo_proj = ccrs.Geodetic()
-        new_points = []
-        
-        # Reducir resolución para no guardar miles de puntos por cada celda 
-        # (ej. tomamos 1 de cada 4 puntos)
-        step = 4
-        for i in range(0, len(x_indices), step):
-            xi = x[x_indices[i]] * 1000  # Convertir km a metros para la proyección
-            yi = y[y_indices[i]] * 1000
-            lon, lat = geo_proj.transform_point(xi, yi, projection)
-            # Redondear a 3 decimales (~110m precisión) para deduplicar fácil
-            new_points.append([round(float(lon), 3), round(float(lat), 3)])
-
-        if not new_points:
-            return
+        day = business_day(scan_time)
+        accumulate_swath(HAIL_SWATH_DIR, day, dbz_data, DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias'])
+        hail_cells = int(np.count_nonzero(dbz_data >= HAIL_SWATH_MIN_DBZ))
+        if hail_cells:
+            logging.info(f"Manga de granizo {day}: {hail_cells} celdas >= {HAIL_SWATH_MIN_DBZ:g} dBZ en este scan.")
+    except Exception as e:
+        logging.error(f"Error actualizando la manga de granizo: {e}")
 
-        # El día pluviométrico/granicero empieza a las 8 AM local (11 AM UTC)
-        now_utc = datetime.now(timezone.utc)
-        if now_utc.hour < 11:
-            # Antes de las 11 AM UTC (8 AM local), pertenece al día anterior
-            business_day = now_utc - timedelta(days=1)
-        else:
-            business_day = now_utc
-            
-        today_str = business_day.strftime("%Y%m%d")
-        swath_file = os.path.join("data", f"hail_swath_{today_str}.json")
-        
-        # Leer puntos existentes
-        existing_points = set()
-        if os.path.exists(swath_file):
-            try:
-                with open(swath_file, 'r') as f:
-                    data = json.load(f)
-                    for pt in data.get("points", []):
-                        existing_points.add((pt[0], pt[1]))
-            except json.JSONDecodeError:
-                pass
-                
-        # Agregar nuevos puntos si no existen
-        added_count = 0
-        for pt in new_points:
-            t_pt = (pt[0], pt[1])
-            if t_pt not in existing_points:
-                existing_points.add(t_pt)
-                added_count += 1
-                
-        if added_count > 0:
-            # Guardar
-            os.makedirs("data", exist_ok=True)
-            with open(swath_file, 'w') as f:
-                json.dump({"date": today_str, "points": [list(pt) for pt in existing_points]}, f)
-            logging.info(f"Agregados {added_count} puntos a la manga de granizo de hoy.")
 
+def update_rain_accumulation(composite_2d: np.ndarray, scan_time: datetime = None):
+    """
+    Suma el scan a la lluvia acumulada del día pluviométrico (services/rain_accumulation.py), pesado
+    por el intervalo desde el scan anterior. Los scans repetidos o fuera de orden no se suman.
+    """
+    try:
+        scan_time = scan_time or datetime.now(timezone.utc)
+        minutes = scan_interval_minutes(QPE_DIR, scan_time, QPE_DEFAULT_INTERVAL_MINUTES, QPE_MAX_GAP_MINUTES)
+        if minutes is None:
+            logging.info(f"Lluvia acumulada: scan {scan_time.isoformat()} no posterior al último, no se suma.")
+            return
+        scale, bias = DATA_CONFIG['composite_scale'], DATA_CONFIG['composite_bias']
+        lut = rate_lut(scale, bias, QPE_ZR_A, QPE_ZR_B, QPE_MIN_DBZ, QPE_MAX_DBZ)
+        day = business_day(scan_time)
+        peak = accumulate_rain(QPE_DIR, day, composite_2d, minutes, scan_time, lut, scale, bias)
+        logging.info(f"Lluvia acumulada {day}: +{minutes:.1f} min, máximo del día {peak:.1f} mm.")
     except Exception as e:
-        logging.error(f"Error actualizando la manga de granizo: {e}")
+        logging.error(f"Error actualizando la lluvia acumulada: {e}")
 
 def check_proximity_alerts(storm_cells):
     """
@@ -255,6 +284,13 @@ def check_proximity_alerts(storm_cells):
             if min_dist < 20 and nearest_cell:
                 # SEND ALERT!
                 msg = f"Detectada {nearest_cell['type']} a {int(min_dist)}km de tu ubicación."
+                # Dirección del movimiento (celdas seguidas por el tracker)
+                motion = approach(nearest_cell, u_lat, u_lon)
+                if motion and motion[0] > 0:
+                    eta = f" (llega en ~{int(round(motion[1]))} min)" if motion[1] < 120 else ""
+                    msg = f"Detectada {nearest_cell['type']} a {int(min_dist)}km de tu ubicación, acercándose{eta} ⚠️"
+                elif motion:
+                    msg = f"Detectada {nearest_cell['type']} a {int(min_dist)}km de tu ubicación, alejándose."
                 
                 logging.info(f"Sending Proximity Alert to User {user_id}: {msg}")
                 
@@ -726,13 +762,69 @@ def check_daily_engagement_alerts(storm_cells, radar_lat, radar_lon):
             
         engagement_state["first_detection_time"] = None
 
-def generar_imagen_transparente_y_bounds(nc_file_path: str, output_image_path: str, skip_levels: int = 2):
+def alertar_celdas(storm_cells: list, lat_0: float, lon_0: float):
+    """Alertas de proximidad y de engagement para las celdas de un frame (observado o pronosticado)."""
+    # --- Verificar Alertas de Proximidad ---
+    check_proximity_alerts(storm_cells)
+
+    # --- Verificar Alerta Global Engagement ---
+    check_daily_engagement_alerts(storm_cells, lat_0, lon_0)
+
+# Tracks de las celdas observadas (sólo el último scan en memoria; ver services/cell_tracker.py)
+cell_tracker = CellTracker(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], state_path=CELL_TRACKS_PATH,
+                           max_speed_kmh=TRACK_MAX_SPEED_KMH, gate_km=TRACK_GATE_KM, max_gap_minutes=TRACK_MAX_GAP_MINUTES)
+
+def analizar_celdas(detection_composite_2d: np.ndarray, x: np.ndarray, y: np.ndarray, lat_0: float, lon_0: float, is_input: bool,
+                    scan_time: datetime = None, products: dict = None) -> list:
+    """
+    Detecta celdas sobre el composite de detección (con echo top, VIL y alturas de núcleo si hay
+    productos volumétricos), les asigna ID y movimiento con el tracker y registra la manga de granizo
+    (sólo inputs), y dispara las alertas de proximidad / engagement. Devuelve las celdas detectadas.
+    """
+    # Tabla lat/lon de la grilla (construida en main(); acá sólo se mapea)
+    latlon_grid = get_latlon_grid(lat_0, lon_0, x, y, GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'])
+
+    # --- Detectar Celdas y Centroides ---
+    storm_cells = detect_storm_cells(detection_composite_2d, latlon_grid, products)
+
+    # --- Seguimiento (ID persistente, velocidad y rumbo) ---
+    if is_input and scan_time is not None:
+        cell_tracker.update(storm_cells, scan_time)
+    
+    # --- Registrar Manga de Granizo (> 55 dBZ) ---
+    # Solo registrar si la imagen es una observación real (input), no una predicción
+    if is_input:
+        update_hail_swath(detection_composite_2d, scan_time)
+    
+    alertar_celdas(storm_cells, lat_0, lon_0)
+    return storm_cells
+
+def analizar_celdas_pronostico(pred_cube: np.ndarray, x: np.ndarray, y: np.ndarray, lat_0: float, lon_0: float) -> list:
+    """
+    Celdas de todos los pasos del pronóstico desde el cubo en memoria (pasos, y, x), en una sola
+    pasada, y sus alertas. Devuelve la lista de celdas de cada paso (para el JSON de cada imagen).
+    """
+    latlon_grid = get_latlon_grid(lat_0, lon_0, x, y, GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'])
+    lead_cells = detect_storm_cells_batch(pred_cube, latlon_grid)
+    for storm_cells in lead_cells:
+        alertar_celdas(storm_cells, lat_0, lon_0)
+    return lead_cells
+
+def tile_frame_dir(frame_name: str) -> str:
+    """<TILE_OUTPUT_DIR>/<YYYYMMDD>/<frame>, frame = nombre de la imagen sin extensión (INPUT_... / PRED_...)."""
+    return os.path.join(TILE_OUTPUT_DIR, day_key(frame_name), frame_name)
+
+def contour_frame_dir(frame_name: str) -> str:
+    """<CONTOUR_OUTPUT_DIR>/<YYYYMMDD>/<frame>, con un z<zoom>.geojson.gz por zoom."""
+    return os.path.join(CONTOUR_OUTPUT_DIR, day_key(frame_name), frame_name)
+
+def cargar_composite_input(nc_file_path: str, skip_levels: int = 2) -> dict:
     """
-    Genera una imagen transparente de reflectividad compuesta y devuelve sus coordenadas geográficas.
+    Lee un scan NetCDF y arma, en una sola pasada sobre el volumen, el composite visual, el de
+    detección (sin clutter bajo 3km) y los productos volumétricos (services/radar_volume.py).
+    Devuelve dict con x, y, composite, detection, products (None si el scan es 2D), lat_0, lon_0; o None si falla.
     """
     try:
-        logging.info(f"Generando imagen transparente para: {os.path.basename(nc_file_path)}")
-        
         ds = xr.open_dataset(nc_file_path, mask_and_scale=True, decode_times=False)
 
         lon_name = 'longitude' if 'longitude' in ds.coords else 'x0'
@@ -740,23 +832,21 @@ def generar_imagen_transparente_y_bounds(nc_file_path: str, output_image_path: s
         
         x = ds[lon_name].values
         y = ds[lat_name].values
-        dbz_data = ds['DBZ'].squeeze().values
+        dbz = ds['DBZ'].squeeze()
+        dbz_data = dbz.values
+        products = None
 
-        # --- 1. Crear el composite visual ---
+        # --- 1. Composite visual, de detección y productos volumétricos ---
         if dbz_data.ndim == 3:
-            if dbz_data.shape[0] > skip_levels:
-                composite_data_2d = np.nanmax(dbz_data[skip_levels:, :, :], axis=0)
-            else:
-                 composite_data_2d = np.nanmax(dbz_data, axis=0)
-                 
-            # --- 1.5 Crear el composite para DETECCIÓN (ignorar clutter bajo 3km) ---
-            # Si el radar tiene resolución vertical de 1km, saltar 3 niveles ignora 0, 1 y 2km.
-            detection_skip = max(skip_levels, 3) 
-            if dbz_data.shape[0] > detection_skip:
-                detection_composite_2d = np.nanmax(dbz_data[detection_skip:, :, :], axis=0)
-            else:
-                detection_composite_2d = composite_data_2d
-                
+            # Alturas de los niveles desde la coordenada vertical del archivo (z0 en km en los de Mdv2NetCDF)
+            z_name = dbz.dims[0]
+            z_coord = ds[z_name] if z_name in ds.variables else None
+            heights_km = level_heights_km(None if z_coord is None else z_coord.values,
+                                          None if z_coord is None else z_coord.attrs.get('units'), dbz_data.shape[0])
+            # Detección: ignorar clutter bajo 3km (con resolución vertical de 1km, saltar 3 niveles ignora 0, 1 y 2km)
+            composite_data_2d, detection_composite_2d, products = reduce_volume(
+                dbz_data, heights_km, skip_levels, detection_skip=max(skip_levels, 3))
+
         elif dbz_data.ndim == 2:
             # Ya es 2D (caso predicciones)
             composite_data_2d = dbz_data
@@ -767,95 +857,115 @@ def generar_imagen_transparente_y_bounds(nc_file_path: str, output_image_path: s
 
         # --- 2. Obtener la información de la proyección ---
         proj_info = ds['grid_mapping_0'].attrs
-        lon_0 = proj_info['longitude_of_projection_origin']
-        lat_0 = proj_info['latitude_of_projection_origin']
-        projection = ccrs.AzimuthalEquidistant(central_longitude=lon_0, central_latitude=lat_0)
-
-        # --- 3. Creación del gráfico transparente (TITAN Color Scale) ---
-        fig = plt.figure(figsize=(10, 10), dpi=150)
-        ax = fig.add_subplot(1, 1, 1)
-        fig.patch.set_alpha(0)
-        ax.patch.set_alpha(0)
-        ax.set_axis_off()
-
-        # Configuración de Colores TITAN
-        titan_bounds = [5, 10, 20, 30, 35, 36, 39, 42, 45, 48, 51, 54, 57, 60, 65, 70, 80]
-        titan_colors = [
-            '#483d8b', # 5-10
-            '#005a00', # 10-20
-            '#007000', # 20-30
-            '#087fdb', # 30-35
-            '#1c47e8', # 35-36
-            '#6e0dc6', # 36-39
-            '#c80f86', # 39-42
-            '#c06487', # 42-45
-            '#d2883b', # 45-48
-            '#fac431', # 48-51
-            '#fefa03', # 51-54
-            '#fe9a58', # 54-57
-            '#fe5f05', # 57-60
-            '#fd341c', # 60-65
-            '#bebebe', # 65-70
-            '#d3d3d3'  # 70-80
-        ]
-        cmap = ListedColormap(titan_colors)
-        cmap.set_under('none') # Transparente por debajo de 5 dbz
-        norm = BoundaryNorm(titan_bounds, cmap.N)
-
-        # Dibujar la imagen de reflectividad SIN CONTORNOS SUAVIZADOS
-        # Usamos pcolormesh para representar los píxeles (celdas) exactamente como son, 
-        # sin que la interpolación de contourf reduzca su tamaño visual o cambie su forma.
-        
-        ax.pcolormesh(x, y, composite_data_2d, cmap=cmap, norm=norm, shading='auto')
-        
-        plt.tight_layout(pad=0)
-        # Aumentamos DPI a 300 para que los contornos se vean nítidos en móviles retina/high-res
-        plt.savefig(output_image_path, dpi=300, transparent=True, bbox_inches='tight', pad_inches=0)
-        
-        # --- 3.5 Creación de la versión SUAVIZADA ---
-        ax.clear()
-        ax.set_axis_off()
-        ax.patch.set_alpha(0)
-        
-        # contourf suaviza los valores de la matriz entre puntos
-        ax.contourf(x, y, composite_data_2d, levels=titan_bounds, colors=titan_colors, extend='max')
-        plt.tight_layout(pad=0)
-        
-        smoothed_output_path = output_image_path.replace(".png", "_smoothed.png")
-        plt.savefig(smoothed_output_path, dpi=300, transparent=True, bbox_inches='tight', pad_inches=0)
-        
-        plt.close(fig)
-
-        # --- 4. Calcular Bounding Box Geográfico ---
-        # Basado exactamente en el output de TITAN (PrintMdv):
-        # minLat, minLon: -36.8913, -70.8209
-        # maxLat, maxLon: -32.3798, -65.2191
-        bounds = [[-36.8913, -70.8209], [-32.3798, -65.2191]] # Formato: [[lat_min, lon_min], [lat_max, lon_max]]
-
-        # --- 5. Detectar Celdas y Centroides ---
-        storm_cells = detect_storm_cells(detection_composite_2d, x, y, projection)
-        
-        # --- 5.5 Registrar Manga de Granizo (> 55 dBZ) ---
-        # Solo registrar si la imagen es una observación real (input), no una predicción
-        if 'input' in nc_file_path.lower():
-            update_hail_swath(detection_composite_2d, x, y, projection, min_dbz=55.0)
-        
-        # --- 6. Verificar Alertas de Proximidad ---
-        check_proximity_alerts(storm_cells)
-
-        # --- 7. Verificar Alerta Global Engagement ---
-        check_daily_engagement_alerts(storm_cells, lat_0, lon_0)
-
-        logging.info(f"  -> Imagen transparente guardada en: {output_image_path}")
-        logging.info(f"  -> Coordenadas calculadas: {bounds}")
-        logging.info(f"  -> Celdas detectadas: {len(storm_cells)}")
-        
-        return bounds, storm_cells
+        ds.close()
+        return {
+            "x": x, "y": y,
+            "composite": composite_data_2d.astype(np.float32),
+            "detection": detection_composite_2d,
+            "products": products,
+            "lon_0": proj_info['longitude_of_projection_origin'],
+            "lat_0": proj_info['latitude_of_projection_origin'],
+        }
 
     except Exception as e:
-        logging.error(f"No se pudo generar la imagen para {nc_file_path}: {e}", exc_info=True)
+        logging.error(f"No se pudo leer el composite de {nc_file_path}: {e}", exc_info=True)
         return None
 
+def _submit_frame_renders(pool: OutputWriterPool, handle: tuple, index: int, frame_name: str,
+                          x: np.ndarray, y: np.ndarray, lat_0: float, lon_0: float) -> tuple:
+    """
+    Encola en los procesos de render el PNG (pixel + suavizado, si RENDER_MODE=eager), la pirámide de
+    tiles y los contornos GeoJSON del frame handle[index]. Devuelve (futures, [(temporal, final)]) para esperar y publicar.
+    """
+    image_path = os.path.join(IMAGE_OUTPUT_DIR, f"{frame_name}.png")
+    staged_images = []
+    render_futures = []
+    if RENDER_MODE == "eager":
+        # Cada variante en PNG paletizado y (opcional) WebP lossless; se codifica acá y nunca en la API
+        render_paths = {}
+        variants = [("pixel", image_path)]
+        if SMOOTHED_RENDER != "off":
+            variants.append(("smoothed", image_path.replace(".png", "_smoothed.png")))
+        for variant, png_path in variants:
+            staged_images.append((staging_path(png_path), png_path))
+            render_paths[f"{variant}_path"] = staged_images[-1][0]
+            if OVERLAY_WEBP:
+                webp_path = png_path[:-len(".png")] + ".webp"
+                staged_images.append((staging_path(webp_path), webp_path))
+                render_paths[f"{variant}_webp_path"] = staged_images[-1][0]
+        smoothed_path = render_paths.pop("smoothed_path", None)
+        if OVERLAY_PROJECTION == "mercator":
+            render_futures.append(pool.submit_render_shared(
+                render_mercator_overlays, handle, index, x=x, y=y, smoothed_path=smoothed_path, lat_0=lat_0, lon_0=lon_0,
+                cache_dir=GEO_CACHE_DIR, earth_radius_m=DATA_CONFIG['earth_radius_m'], **render_paths))
+        else:
+            render_futures.append(pool.submit_render_shared(
+                render_overlay_pngs, handle, index, x=x, y=y, smoothed_path=smoothed_path,
+                smoothed_mode=SMOOTHED_RENDER, **render_paths))
+    if TILES_ENABLED:
+        frame_tiles_dir = tile_frame_dir(frame_name)
+        os.makedirs(os.path.dirname(frame_tiles_dir), exist_ok=True)
+        staged_images.append((staging_path(frame_tiles_dir), frame_tiles_dir))
+        render_futures.append(pool.submit_render_shared(
+            render_tile_pyramid, handle, index, x_km=x, y_km=y, lat_0=lat_0, lon_0=lon_0,
+            frame_dir=staged_images[-1][0], cache_dir=GEO_CACHE_DIR, earth_radius_m=DATA_CONFIG['earth_radius_m'],
+            min_zoom=TILE_MIN_ZOOM, max_zoom=TILE_MAX_ZOOM))
+    if CONTOURS_ENABLED:
+        frame_contours_dir = contour_frame_dir(frame_name)
+        os.makedirs(os.path.dirname(frame_contours_dir), exist_ok=True)
+        staged_images.append((staging_path(frame_contours_dir), frame_contours_dir))
+        render_futures.append(pool.submit_render_shared(
+            render_contours, handle, index, x_km=x, y_km=y, lat_0=lat_0, lon_0=lon_0,
+            frame_dir=staged_images[-1][0], cache_dir=GEO_CACHE_DIR, earth_radius_m=DATA_CONFIG['earth_radius_m'],
+            levels=CONTOUR_LEVELS, zooms=CONTOUR_ZOOMS))
+    return render_futures, staged_images
+
+def write_input_outputs(pool: OutputWriterPool, input_nc_paths: list, skip_levels: int = 3):
+    """
+    Composites, imágenes, tiles y JSON de los scans de entrada que todavía no los tienen.
+    Los renders de todos los frames corren en paralelo; celdas, manga de granizo, lluvia acumulada y alertas en el hilo principal.
+    """
+    pending = []
+    for input_nc_path in input_nc_paths:
+        frame_name = f"INPUT_{os.path.splitext(os.path.basename(input_nc_path))[0]}"
+        # Solo generar si no existe (optimización). El JSON se escribe al final, también en modo "lazy"
+        if os.path.exists(os.path.join(IMAGE_OUTPUT_DIR, f"{frame_name}.png.json")):
+            logging.info(f"Imagen de input ya existe: {frame_name}.png")
+            continue
+        loaded = cargar_composite_input(input_nc_path, skip_levels=skip_levels)
+        if loaded:
+            pending.append((frame_name, loaded))
+    if not pending:
+        return
+
+    logging.info(f"Generando salidas para {len(pending)} inputs...")
+    shm, handle = share_array(np.stack([loaded["composite"] for _, loaded in pending]))
+    try:
+        frames = []
+        for index, (frame_name, loaded) in enumerate(pending):
+            futures = [pool.submit_io(_stage_frame, frame_path(FRAME_STORE_DIR, frame_name), loaded["composite"], DATA_CONFIG)]
+            if loaded["products"]:
+                futures.append(pool.submit_io(_stage_products, product_path(VOLUME_PRODUCTS_DIR, frame_name), loaded["products"]))
+            render_futures, staged_images = _submit_frame_renders(pool, handle, index, frame_name, loaded["x"], loaded["y"],
+                                                                  loaded["lat_0"], loaded["lon_0"])
+            frames.append((frame_name, futures, render_futures, staged_images))
+
+        # Mientras tanto, en el hilo principal: celdas, manga de granizo, lluvia acumulada y alertas
+        all_cells = []
+        for frame_name, loaded in pending:
+            all_cells.append(analizar_celdas(loaded["detection"], loaded["x"], loaded["y"], loaded["lat_0"], loaded["lon_0"],
+                                             is_input=True, scan_time=frame_time(frame_name), products=loaded["products"]))
+            update_rain_accumulation(loaded["composite"], frame_time(frame_name))
+
+        for (frame_name, futures, render_futures, staged_images), cells, (_, loaded) in zip(frames, all_cells, pending):
+            image_path = os.path.join(IMAGE_OUTPUT_DIR, f"{frame_name}.png")
+            bounds = overlay_bounds(loaded["x"], loaded["y"], loaded["lat_0"], loaded["lon_0"])
+            if _collect_and_publish(pool, futures, render_futures, staged_images, image_path, cells, bounds,
+                                    volume=loaded["products"] is not None):
+                logging.info(f"  -> {frame_name}: {len(cells)} celdas, bounds {bounds}")
+    finally:
+        release_shared(shm)
+
 from core.database import init_db, DB_PATH
 
 def log_prediction(timestamp, input_seq_id, output_path, status="SUCCESS"):
@@ -874,13 +984,17 @@ def log_prediction(timestamp, input_seq_id, output_path, status="SUCCESS"):
         logging.error(f"Error al registrar en DB: {e}")
 
 
+# Estadísticas del worker expuestas en status.json (ej. tiempos del último ciclo de salidas)
+worker_stats = {}
+
 def update_status(status_message: str, file_count: int, total_needed: int):
     """Crea y escribe el estado actual en el archivo JSON."""
     status = {
         "status": status_message,
         "files_in_buffer": file_count,
         "files_needed_for_run": total_needed,
-        "last_update": datetime.now(timezone.utc).isoformat()
+        "last_update": datetime.now(timezone.utc).isoformat(),
+        "stats": dict(worker_stats)  # copia: el hilo de retención también escribe aquí
     }
     try:
         import tempfile
@@ -963,44 +1077,43 @@ def postprocess_prediction(prediction_norm: torch.Tensor) -> np.ndarray:
     """
     Aplica Upsampling (250->500), desnormalización y umbral físico.
     Entrada: (1, T, C, 250, 250)
-    Salida: (T, C, 500, 500) numpy array
+    Salida: (T, C, 500, 500) numpy array (vista sin copia sobre el tensor upsampleado)
+
+    El único buffer de resolución completa es la salida de interpolate: la desnormalización,
+    el clip y el umbral se aplican in-place sobre él y numpy comparte su memoria.
     """
+    min_dbz = DATA_CONFIG['min_dbz']
+    max_dbz = DATA_CONFIG['max_dbz']
+    threshold = DATA_CONFIG.get('physical_threshold_dbz', 30.0)
+
     # 1. Upsampling (250 -> 500)
     b, t, c, h, w = prediction_norm.shape
     # Flatten T into B for interpolation
-    pred_reshaped = prediction_norm.view(b * t, c, h, w)
-    
-    pred_upsampled = torch.nn.functional.interpolate(
-        pred_reshaped, 
-        size=(500, 500), 
-        mode='bicubic', # Bicubic para mejor calidad visual
-        align_corners=False
-    )
+    pred_reshaped = prediction_norm.reshape(b * t, c, h, w).float()
     
-    # Restore shape: (B, T, C, 500, 500)
-    pred_upsampled = pred_upsampled.view(b, t, c, 500, 500)
+    with torch.no_grad():
+        pred = torch.nn.functional.interpolate(
+            pred_reshaped, 
+            size=(500, 500), 
+            mode='bicubic', # Bicubic para mejor calidad visual
+            align_corners=False
+        )
+        
+        # 2. Denormalize + Clip (in-place)
+        pred.mul_(max_dbz - min_dbz).add_(min_dbz).clamp_(min_dbz, max_dbz)
 
-    # 2. Denormalize
-    output_np = pred_upsampled.cpu().numpy()
-    pred_physical_raw = output_np * (DATA_CONFIG['max_dbz'] - DATA_CONFIG['min_dbz']) + DATA_CONFIG['min_dbz']
-    pred_physical_clipped = np.clip(pred_physical_raw, DATA_CONFIG['min_dbz'], DATA_CONFIG['max_dbz'])
-    
-    pred_physical_cleaned = pred_physical_clipped.copy()
+        # 3. Clean Noise (in-place)
+        pred.masked_fill_(pred < threshold, float('nan'))
 
-    # 3. Clean Noise
-    threshold = DATA_CONFIG.get('physical_threshold_dbz', 30.0)
-    pred_physical_cleaned[pred_physical_cleaned < threshold] = np.nan
-    
-    # Remove batch dim: (1, T, C, H, W) -> (T, C, H, W)
+    # Restore shape: (B, T, C, 500, 500) -> quitar batch: (T, C, 500, 500)
     # C=1 (Composite). Post-processing logic expects this.
-    return pred_physical_cleaned[0]
+    # .cpu() no copia si el tensor ya está en CPU; .numpy() comparte la memoria.
+    return pred.view(b, t, c, 500, 500)[0].cpu().numpy()
 
-def save_prediction_as_netcdf(output_subdir: str, pred_sequence_cleaned: np.ndarray, data_cfg: dict, start_datetime: datetime):
-    # entrada: (T, C, 500, 500). C=1
-    num_pred_steps, num_c, num_y, num_x = pred_sequence_cleaned.shape
-    num_z = 1 # Force 1 level (Max Projection)
-    
-    # --- Grid Preparation ---
+def _prediction_grid(data_cfg: dict, num_y: int, num_x: int):
+    """
+    Coordenadas de la grilla de predicción (km, AEQD centrada en el radar) y sus lat/lon 2D.
+    """
     x_coords = np.arange(-249.5, -249.5 + num_x * 1.0, 1.0, dtype=np.float32)
     y_coords = np.arange(-249.5, -249.5 + num_y * 1.0, 1.0, dtype=np.float32)
     z_coords = np.array([1.0], dtype=np.float32)
@@ -1013,82 +1126,197 @@ def save_prediction_as_netcdf(output_subdir: str, pred_sequence_cleaned: np.ndar
     )
     x_grid_m, y_grid_m = np.meshgrid(x_coords * 1000.0, y_coords * 1000.0)
     lon0_grid, lat0_grid = proj(x_grid_m, y_grid_m, inverse=True)
+    return x_coords, y_coords, z_coords, lat0_grid, lon0_grid
 
-    for i in range(num_pred_steps):
-        lead_time_minutes = (i + 1) * data_cfg.get('prediction_interval_minutes', 3)
-        forecast_dt_utc = start_datetime + timedelta(minutes=lead_time_minutes)
+def _write_grid_variables(ds_out, grid: tuple, data_cfg: dict):
+    """Escribe las coordenadas espaciales, lat0/lon0 y el grid_mapping en un dataset abierto."""
+    x_coords, y_coords, z_coords, lat0_grid, lon0_grid = grid
+
+    x_v = ds_out.createVariable('longitude', 'f4', ('longitude',))
+    x_v.standard_name = "projection_x_coordinate"; x_v.units = "km"; x_v.axis = "X"
+    x_v[:] = x_coords
+
+    y_v = ds_out.createVariable('latitude', 'f4', ('latitude',))
+    y_v.standard_name = "projection_y_coordinate"; y_v.units = "km"; y_v.axis = "Y"
+    y_v[:] = y_coords
+
+    z_v = ds_out.createVariable('altitude', 'f4', ('altitude',))
+    z_v.standard_name = "altitude"; z_v.units = "km"; z_v.axis = "Z"; z_v.positive = "up"
+    z_v[:] = z_coords
+
+    lat0_v = ds_out.createVariable('lat0', 'f4', ('latitude', 'longitude',))
+    lat0_v.standard_name = "latitude"; lat0_v.units = "degrees_north"
+    lat0_v[:] = lat0_grid
+
+    lon0_v = ds_out.createVariable('lon0', 'f4', ('latitude', 'longitude',))
+    lon0_v.standard_name = "longitude"; lon0_v.units = "degrees_east"
+    lon0_v[:] = lon0_grid
+
+    gm_v = ds_out.createVariable('grid_mapping_0', 'i4')
+    gm_v.grid_mapping_name = "azimuthal_equidistant"
+    gm_v.longitude_of_projection_origin = data_cfg['sensor_longitude']
+    gm_v.latitude_of_projection_origin = data_cfg['sensor_latitude']
+    gm_v.false_easting = 0.0; gm_v.false_northing = 0.0
+    gm_v.earth_radius = data_cfg['earth_radius_m']
+
+def _epoch_seconds(dt_utc: datetime) -> float:
+    return (dt_utc.replace(tzinfo=timezone.utc) - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()
+
+def _pack_dbz(data: np.ndarray, data_cfg: dict) -> np.ndarray:
+    """
+    Empaqueta reflectividad float (NaN = sin dato) al entero configurado en DATA_CONFIG:
+    valor = round((dBZ - add_offset) / scale_factor), NaN -> _FillValue.
+    """
+    dtype = np.dtype(data_cfg.get('output_nc_dtype', 'i1'))
+    scale = data_cfg['output_nc_scale_factor']
+    offset = data_cfg['output_nc_add_offset']
+    fill = data_cfg['output_nc_fill_value']
+    info = np.iinfo(dtype)
+    # El _FillValue queda fuera del rango válido para que nunca colisione con un dato real
+    if fill not in (info.min, info.max):
+        raise ValueError(f"_FillValue {fill} cae dentro del rango de datos de {dtype} (usar {info.min} o {info.max})")
+    lo = info.min + 1 if fill == info.min else info.min
+    hi = info.max - 1 if fill == info.max else info.max
+
+    # Un único buffer temporal float32; NaN sobrevive a rint/clip y se reemplaza al final
+    scaled = np.subtract(data, offset, dtype=np.float32)
+    scaled /= scale
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, lo, hi, out=scaled)
+    np.nan_to_num(scaled, copy=False, nan=fill)
+    return scaled.astype(dtype)
+
+def _create_packed_dbz_variable(ds_out, dimensions: tuple, data_cfg: dict, **kwargs):
+    """Crea la variable DBZ empaquetada (byte/short) con scale_factor, add_offset y _FillValue."""
+    dtype = np.dtype(data_cfg.get('output_nc_dtype', 'i1'))
+    dbz_v = ds_out.createVariable('DBZ', dtype, dimensions, fill_value=dtype.type(data_cfg['output_nc_fill_value']), **kwargs)
+    # Escribimos los enteros ya empaquetados, sin que netCDF4 vuelva a escalar
+    dbz_v.set_auto_maskandscale(False)
+    dbz_v.scale_factor = np.float32(data_cfg['output_nc_scale_factor'])
+    dbz_v.add_offset = np.float32(data_cfg['output_nc_add_offset'])
+    dbz_v.units = "dBZ"; dbz_v.standard_name = "reflectivity"
+    dbz_v.grid_mapping = "grid_mapping_0"
+    dbz_v.coordinates = "lat0 lon0"
+    return dbz_v
+
+def _write_classic_step(output_filename: str, pred_2d: np.ndarray, grid: tuple, data_cfg: dict,
+                        forecast_dt_utc: datetime, lead_time_minutes: float):
+    """
+    Escribe un paso de pronóstico (C, Y, X) como NETCDF3_CLASSIC, el formato que espera NcGeneric2Mdv.
+    """
+    num_z = 1 # Force 1 level (Max Projection)
+    num_y, num_x = pred_2d.shape[-2:]
+
+    with NCDataset(output_filename, 'w', format='NETCDF3_CLASSIC') as ds_out:
+        # --- Global Attributes ---
+        ds_out.Conventions = "CF-1.6"
+        ds_out.title = f"SAN_RAFAEL_PRED - Forecast t+{lead_time_minutes}min"
+        ds_out.institution = "UM"
+        ds_out.source = "ConvLSTM Model Prediction"
+        ds_out.history = f"Created {datetime.now(timezone.utc).isoformat()} by pipeline."
+        ds_out.comment = f"Forecast 2D (Max Projection). Lead time: {lead_time_minutes} min."
+
+        # --- Dimensions ---
+        ds_out.createDimension('time', None)
+        ds_out.createDimension('bounds', 2)
+        ds_out.createDimension('longitude', num_x)
+        ds_out.createDimension('latitude', num_y)
+        ds_out.createDimension('altitude', num_z)
+
+        # --- Variables ---
+        time_v = ds_out.createVariable('time', 'f8', ('time',))
+        time_v.standard_name = "time"; time_v.axis = "T"
+        time_v.units = "seconds since 1970-01-01T00:00:00Z"
+        time_v[:] = [_epoch_seconds(forecast_dt_utc)]
+
+        _write_grid_variables(ds_out, grid, data_cfg)
+
+        # --- Data Variable (Single Level, empaquetada como el archivo de entrada) ---
+        dbz_v = _create_packed_dbz_variable(ds_out, ('time', 'altitude', 'latitude', 'longitude'), data_cfg)
         
-        file_ts = forecast_dt_utc.strftime("%Y%m%d_%H%M%S")
-        output_filename = os.path.join(output_subdir, f"{file_ts}.nc")
-
-        with NCDataset(output_filename, 'w', format='NETCDF3_CLASSIC') as ds_out:
-            # --- Global Attributes ---
-            ds_out.Conventions = "CF-1.6"
-            ds_out.title = f"SAN_RAFAEL_PRED - Forecast t+{lead_time_minutes}min"
-            ds_out.institution = "UM"
-            ds_out.source = "ConvLSTM Model Prediction"
-            ds_out.history = f"Created {datetime.now(timezone.utc).isoformat()} by pipeline."
-            ds_out.comment = f"Forecast 2D (Max Projection). Lead time: {lead_time_minutes} min."
-
-            # --- Dimensions ---
-            ds_out.createDimension('time', None)
-            ds_out.createDimension('bounds', 2)
-            ds_out.createDimension('longitude', num_x)
-            ds_out.createDimension('latitude', num_y)
-            ds_out.createDimension('altitude', num_z)
-
-            # --- Variables ---
-            time_value = (forecast_dt_utc.replace(tzinfo=timezone.utc) - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()
-            time_v = ds_out.createVariable('time', 'f8', ('time',))
-            time_v.standard_name = "time"; time_v.axis = "T"
-            time_v.units = "seconds since 1970-01-01T00:00:00Z"
-            time_v[:] = [time_value]
-
-            x_v = ds_out.createVariable('longitude', 'f4', ('longitude',))
-            x_v.standard_name = "projection_x_coordinate"; x_v.units = "km"; x_v.axis = "X"
-            x_v[:] = x_coords
-
-            y_v = ds_out.createVariable('latitude', 'f4', ('latitude',))
-            y_v.standard_name = "projection_y_coordinate"; y_v.units = "km"; y_v.axis = "Y"
-            y_v[:] = y_coords
-
-            z_v = ds_out.createVariable('altitude', 'f4', ('altitude',))
-            z_v.standard_name = "altitude"; z_v.units = "km"; z_v.axis = "Z"; z_v.positive = "up"
-            z_v[:] = z_coords
-
-            lat0_v = ds_out.createVariable('lat0', 'f4', ('latitude', 'longitude',))
-            lat0_v.standard_name = "latitude"; lat0_v.units = "degrees_north"
-            lat0_v[:] = lat0_grid
-
-            lon0_v = ds_out.createVariable('lon0', 'f4', ('latitude', 'longitude',))
-            lon0_v.standard_name = "longitude"; lon0_v.units = "degrees_east"
-            lon0_v[:] = lon0_grid
-
-            gm_v = ds_out.createVariable('grid_mapping_0', 'i4')
-            gm_v.grid_mapping_name = "azimuthal_equidistant"
-            gm_v.longitude_of_projection_origin = data_cfg['sensor_longitude']
-            gm_v.latitude_of_projection_origin = data_cfg['sensor_latitude']
-            gm_v.false_easting = 0.0; gm_v.false_northing = 0.0
-            gm_v.earth_radius = data_cfg['earth_radius_m']
-
-            # --- Data Variable (Single Level) ---
-            fill_value_float = np.float32(-999.0)
-            dbz_v = ds_out.createVariable('DBZ', 'f4', ('time', 'altitude', 'latitude', 'longitude'), fill_value=fill_value_float)
-            dbz_v.units = "dBZ"; dbz_v.standard_name = "reflectivity"
-            dbz_v.grid_mapping = "grid_mapping_0"
-            dbz_v.coordinates = "lat0 lon0"
-            
-            # Get 2D frame: (C, H, W) -> C=1
-            pred_2d = pred_sequence_cleaned[i] # (1, 500, 500)
-            
-            # Expand to (1, 1, Y, X) for saving
-            pred_final = pred_2d[np.newaxis, :, :, :] 
-            
-            data_final = np.nan_to_num(pred_final, nan=fill_value_float)
-            
-            dbz_v[:] = data_final
+        # Expand (1, Y, X) to (1, 1, Y, X) for saving
+        pred_final = pred_2d.reshape(1, num_z, num_y, num_x)
+        
+        dbz_v[:] = _pack_dbz(pred_final, data_cfg)
 
-        logging.info(f"  -> Predicción guardada en: {os.path.basename(output_filename)}")
+def save_prediction_as_netcdf_multi(output_subdir: str, pred_sequence_cleaned: np.ndarray, data_cfg: dict, start_datetime: datetime,
+                                    output_filename: str = None) -> str:
+    """
+    Guarda toda la corrida en un único NetCDF4 con dimensión lead_time.
+    Compresión zlib + shuffle, chunks de un paso por lead time y lat0/lon0 escritos una sola vez.
+    output_filename permite escribir en un temporal; devuelve la ruta del archivo generado.
+    """
+    # entrada: (T, C, 500, 500). C=1
+    num_pred_steps, num_c, num_y, num_x = pred_sequence_cleaned.shape
+    num_z = 1
+    grid = _prediction_grid(data_cfg, num_y, num_x)
+    interval = data_cfg.get('prediction_interval_minutes', 3)
+    lead_minutes = np.array([(i + 1) * interval for i in range(num_pred_steps)], dtype=np.float32)
+    forecast_times = [_epoch_seconds(start_datetime + timedelta(minutes=float(m))) for m in lead_minutes]
+
+    output_filename = output_filename or os.path.join(output_subdir, PREDICTION_MULTI_FILENAME)
+    with NCDataset(output_filename, 'w', format='NETCDF4') as ds_out:
+        ds_out.Conventions = "CF-1.6"
+        ds_out.title = "SAN_RAFAEL_PRED - Forecast multi-lead"
+        ds_out.institution = "UM"
+        ds_out.source = "ConvLSTM Model Prediction"
+        ds_out.history = f"Created {datetime.now(timezone.utc).isoformat()} by pipeline."
+        ds_out.comment = f"Forecast 2D (Max Projection). {num_pred_steps} lead times every {interval} min."
+        ds_out.reference_time = start_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        ds_out.createDimension('lead_time', num_pred_steps)
+        ds_out.createDimension('longitude', num_x)
+        ds_out.createDimension('latitude', num_y)
+        ds_out.createDimension('altitude', num_z)
+
+        lead_v = ds_out.createVariable('lead_time', 'f4', ('lead_time',))
+        lead_v.long_name = "forecast lead time"; lead_v.units = "minutes"
+        lead_v[:] = lead_minutes
+
+        time_v = ds_out.createVariable('time', 'f8', ('lead_time',))
+        time_v.standard_name = "time"; time_v.axis = "T"
+        time_v.units = "seconds since 1970-01-01T00:00:00Z"
+        time_v[:] = forecast_times
+
+        _write_grid_variables(ds_out, grid, data_cfg)
+
+        dbz_v = _create_packed_dbz_variable(
+            ds_out, ('lead_time', 'altitude', 'latitude', 'longitude'), data_cfg,
+            zlib=True, complevel=4, shuffle=True, chunksizes=(1, num_z, num_y, num_x)
+        )
+
+        # (T, C, Y, X) con C=1 coincide con (lead_time, altitude, Y, X)
+        dbz_v[:] = _pack_dbz(pred_sequence_cleaned, data_cfg)
+
+    logging.info(f"  -> Predicción multi-lead guardada en: {os.path.basename(output_filename)}")
+    return output_filename
+
+def export_multi_to_classic(multi_nc_path: str, output_dir: str, data_cfg: dict) -> list:
+    """
+    Shim de compatibilidad TITAN: parte el NetCDF4 multi-lead en archivos NETCDF3_CLASSIC
+    por paso (<YYYYMMDD_HHMMSS>.nc), con el mismo contenido que escribe _write_classic_step en modo classic.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with NCDataset(multi_nc_path, 'r') as ds_in:
+        lead_minutes = ds_in.variables['lead_time'][:]
+        times = ds_in.variables['time'][:]
+        dbz_v = ds_in.variables['DBZ']
+        num_y = len(ds_in.dimensions['latitude'])
+        num_x = len(ds_in.dimensions['longitude'])
+        grid = _prediction_grid(data_cfg, num_y, num_x)
+
+        for i in range(len(lead_minutes)):
+            forecast_dt_utc = datetime.fromtimestamp(float(times[i]), tz=timezone.utc)
+            lead_time_minutes = float(lead_minutes[i])
+            # Lectura desempaquetada (scale_factor/add_offset) con _FillValue -> NaN
+            frame = np.ma.filled(dbz_v[i].astype(np.float32), np.nan)
+
+            output_filename = os.path.join(output_dir, f"{forecast_dt_utc.strftime('%Y%m%d_%H%M%S')}.nc")
+            _write_classic_step(output_filename, frame, grid, data_cfg, forecast_dt_utc, lead_time_minutes)
+            written.append(output_filename)
+    logging.info(f"  -> Shim TITAN: {len(written)} archivos clásicos en {output_dir}")
+    return written
 
 def convert_mdv_to_nc(mdv_filepath: str, final_output_dir: str, params_path: str):
     mdv_filename = os.path.basename(mdv_filepath)
@@ -1142,8 +1370,10 @@ def convert_predictions_to_mdv(nc_input_dir: str, mdv_output_dir: str, params_te
         abs_nc_input_dir = os.path.abspath(nc_input_dir)
         abs_mdv_output_dir = os.path.abspath(mdv_output_dir)
         final_params_content = template_content.replace("%%INPUT_DIR%%", abs_nc_input_dir).replace("%%OUTPUT_DIR%%", abs_mdv_output_dir)
-        temp_params_path = "/app/lrose_params/temp.params.final"
-        with open(temp_params_path, 'w') as f:
+        # Archivo de params propio de esta corrida para que dos conversiones no se pisen
+        import tempfile
+        fd, temp_params_path = tempfile.mkstemp(dir=os.path.dirname(params_template_path), suffix='.params.final')
+        with os.fdopen(fd, 'w') as f:
             f.write(final_params_content)
     except Exception as e:
         logging.error(f"No se pudo preparar el archivo de parámetros: {e}")
@@ -1155,14 +1385,19 @@ def convert_predictions_to_mdv(nc_input_dir: str, mdv_output_dir: str, params_te
     except subprocess.CalledProcessError as e:
         logging.error(f"Falló la ejecución de NcGeneric2Mdv. Error: {e.stderr}")
         return False
+    finally:
+        if os.path.exists(temp_params_path):
+            os.remove(temp_params_path)
     logging.info("Renombrando archivos MDV de salida...")
     try:
-        generated_files = glob.glob(os.path.join(abs_mdv_output_dir, "**", "*.mdv"), recursive=True)
+        nc_files = sorted(glob.glob(os.path.join(abs_nc_input_dir, "*.nc")))
+        nc_timestamps = [os.path.basename(f).replace('.nc', '') for f in nc_files]
+        # NcGeneric2Mdv escribe en <salida>/<YYYYMMDD>/: sólo se miran los shards de los días de esta corrida
+        days = sorted({day_key(ts) for ts in nc_timestamps})
+        generated_files = [f for day in days for f in glob.glob(os.path.join(abs_mdv_output_dir, day, "*.mdv"))]
         if not generated_files:
             logging.warning("NcGeneric2Mdv se ejecutó pero no se encontraron archivos .mdv en la salida.")
             return True
-        nc_files = sorted(glob.glob(os.path.join(abs_nc_input_dir, "*.nc")))
-        nc_timestamps = [os.path.basename(f).replace('.nc', '') for f in nc_files]
         for old_filepath in generated_files:
             filename = os.path.basename(old_filepath)
             if filename.endswith('.mdv') and '_' in filename:
@@ -1182,14 +1417,224 @@ def convert_predictions_to_mdv(nc_input_dir: str, mdv_output_dir: str, params_te
         logging.error(f"Ocurrió un error durante el renombrado de archivos: {e}")
         return False
 
+# netCDF-C no es thread-safe: las escrituras NetCDF del pool se serializan con este lock
+_NC_LOCK = threading.Lock()
+
+def _stage_classic_step(final_path: str, pred_2d: np.ndarray, grid: tuple, data_cfg: dict,
+                        forecast_dt_utc: datetime, lead_time_minutes: float) -> list:
+    temp_path = staging_path(final_path)
+    with _NC_LOCK:
+        _write_classic_step(temp_path, pred_2d, grid, data_cfg, forecast_dt_utc, lead_time_minutes)
+    return [(temp_path, final_path)]
+
+def _stage_multi(output_subdir: str, pred_sequence_cleaned: np.ndarray, data_cfg: dict, start_datetime: datetime) -> list:
+    final_path = os.path.join(output_subdir, PREDICTION_MULTI_FILENAME)
+    temp_path = staging_path(final_path)
+    with _NC_LOCK:
+        save_prediction_as_netcdf_multi(output_subdir, pred_sequence_cleaned, data_cfg, start_datetime, output_filename=temp_path)
+    return [(temp_path, final_path)]
+
+def _stage_frame(final_path: str, composite_2d: np.ndarray, data_cfg: dict) -> list:
+    temp_path = staging_path(final_path)
+    save_frame(temp_path, composite_2d, data_cfg['composite_scale'], data_cfg['composite_bias'])
+    return [(temp_path, final_path)]
+
+def _stage_products(final_path: str, products: dict) -> list:
+    temp_path = staging_path(final_path)
+    save_products(temp_path, products)
+    return [(temp_path, final_path)]
+
+def _stage_json(final_path: str, payload: dict) -> list:
+    temp_path = staging_path(final_path)
+    with open(temp_path, 'w') as f:
+        json.dump(payload, f)
+    return [(temp_path, final_path)]
+
+def overlay_bounds(x: np.ndarray, y: np.ndarray, lat_0: float, lon_0: float) -> list:
+    """Bounds lat/lon del overlay para el JSON: bbox exacto del dominio en Mercator, fijo en AEQD."""
+    if OVERLAY_PROJECTION == "mercator":
+        return get_overlay_bounds(lat_0, lon_0, x, y, DATA_CONFIG['earth_radius_m'])
+    return OVERLAY_BOUNDS
+
+def _collect_and_publish(pool: OutputWriterPool, futures: list, render_futures: list, staged_images: list,
+                         image_path: str, cells: list, bounds: list, volume: bool = False) -> list:
+    """
+    Espera las tareas de un frame y publica todo en orden (composite/NC/MDV, PNGs, tiles y el JSON al final).
+    Devuelve los pares publicados, o None si alguna tarea falló (se descartan los temporales).
+    """
+    staged = []
+    try:
+        for future in futures:
+            staged.extend(pool.result(future))
+        for future in render_futures:
+            pool.result(future)
+        staged.extend(staged_images)
+        sidecar = {"bounds": bounds, "cells": cells, "tiles": TILES_ENABLED, "contours": CONTOURS_ENABLED, "volume": volume}
+        staged.extend(_stage_json(f"{image_path}.json", sidecar))
+    except Exception as e:
+        logging.error(f"Falló la generación de {os.path.basename(image_path)}: {e}", exc_info=True)
+        discard(staged + staged_images)
+        return None
+    publish(staged)
+    return staged
+
+def write_prediction_outputs(pool: OutputWriterPool, pred_sequence_cleaned: np.ndarray, data_cfg: dict,
+                             start_datetime: datetime, output_subdir: str, run_id: str) -> str:
+    """
+    Produce en paralelo todas las salidas por lead time (NetCDF, MDV nativo, PNGs y JSON) y las
+    publica atómicamente en orden de lead time. Devuelve la ruta del NetCDF multi-lead (o None).
+    """
+    num_pred_steps, _, num_y, num_x = pred_sequence_cleaned.shape
+    grid = _prediction_grid(data_cfg, num_y, num_x)
+    x_coords, y_coords = grid[0], grid[1]
+    interval = data_cfg.get('prediction_interval_minutes', 3)
+    multi_mode = PREDICTION_NC_FORMAT == "multi"
+
+    pool.start_cycle()
+    shm, handle = share_array(pred_sequence_cleaned)
+    try:
+        run_futures = []
+        if multi_mode:
+            run_futures.append(pool.submit_io(_stage_multi, output_subdir, pred_sequence_cleaned, data_cfg, start_datetime))
+
+        leads = []
+        for i in range(num_pred_steps):
+            lead_time_minutes = (i + 1) * interval
+            forecast_dt_utc = start_datetime + timedelta(minutes=lead_time_minutes)
+            file_ts = forecast_dt_utc.strftime("%Y%m%d_%H%M%S")
+            frame = pred_sequence_cleaned[i]
+
+            futures = []
+            if not multi_mode:
+                nc_path = os.path.join(output_subdir, f"{file_ts}.nc")
+                futures.append(pool.submit_io(_stage_classic_step, nc_path, frame, grid, data_cfg, forecast_dt_utc, lead_time_minutes))
+            if MDV_WRITER == "native":
+                futures.append(pool.submit_io(stage_forecast_mdv, MDV_OUTPUT_DIR, frame, forecast_dt_utc, start_datetime, data_cfg))
+
+            # Formato: PRED_<RUN_ID>_<FORECAST_TIME>.png
+            frame_name = f"PRED_{run_id}_{file_ts}"
+            image_path = os.path.join(IMAGE_OUTPUT_DIR, f"{frame_name}.png")
+            futures.append(pool.submit_io(_stage_frame, frame_path(FRAME_STORE_DIR, frame_name), frame[0], data_cfg))
+            render_futures, staged_images = _submit_frame_renders(pool, handle, (i, 0), frame_name, x_coords, y_coords,
+                                                                  data_cfg['sensor_latitude'], data_cfg['sensor_longitude'])
+            leads.append((lead_time_minutes, forecast_dt_utc, image_path, futures, render_futures, staged_images))
+
+        # Mientras tanto, en el hilo principal: celdas y alertas de cada paso
+        serial_start = time.perf_counter()
+        lead_cells = analizar_celdas_pronostico(pred_sequence_cleaned[:, 0], x_coords, y_coords,
+                                                data_cfg['sensor_latitude'], data_cfg['sensor_longitude'])
+        serial_seconds = time.perf_counter() - serial_start
+
+        multi_nc_path = None
+        for future in run_futures:
+            staged = pool.result(future)
+            publish(staged)
+            multi_nc_path = staged[0][1]
+
+        mdv_entries = []
+        for (lead_time_minutes, forecast_dt_utc, image_path, futures, render_futures, staged_images), cells in zip(leads, lead_cells):
+            staged = _collect_and_publish(pool, futures, render_futures, staged_images, image_path, cells,
+                                          overlay_bounds(x_coords, y_coords, data_cfg['sensor_latitude'], data_cfg['sensor_longitude']))
+            if staged is None:
+                logging.error(f"Falló la escritura de salidas para t+{lead_time_minutes}min")
+                continue
+            for _, final_path in staged:
+                if final_path.endswith(".mdv"):
+                    mdv_entries.append({
+                        "lead_time_minutes": lead_time_minutes,
+                        "valid_time": forecast_dt_utc.isoformat(),
+                        "path": os.path.relpath(final_path, MDV_OUTPUT_DIR)
+                    })
+            logging.info(f"  -> Publicadas salidas de t+{lead_time_minutes}min ({len(staged)} archivos)")
+    finally:
+        # Los procesos de render ya terminaron (o fallaron) con todos los frames de la corrida
+        release_shared(shm)
+
+    if mdv_entries:
+        update_forecast_index(MDV_OUTPUT_DIR, run_id, start_datetime, mdv_entries)
+
+    worker_stats["last_output_cycle"] = {"run_id": run_id, **pool.end_cycle(serial_seconds)}
+    return multi_nc_path
+
+def _frame_metadata(frame_name: str, kind: str, dt_utc: datetime) -> dict:
+    meta = {"frame": frame_name, "kind": kind, "timestamp_iso": dt_utc.isoformat()}
+    sidecar = os.path.join(IMAGE_OUTPUT_DIR, f"{frame_name}.png.json")
+    try:
+        with open(sidecar) as f:
+            meta["cells"] = json.load(f).get("cells", [])
+    except (OSError, ValueError):
+        pass
+    return meta
+
+def write_animation_bundle(pool: OutputWriterPool, run_id: str, input_nc_paths: list, start_datetime: datetime,
+                           num_pred_steps: int, data_cfg: dict) -> str:
+    """
+    Publica el bundle de animación de la corrida (inputs + pronóstico, ver services/animation_bundle.py).
+    Se arma en un proceso de render desde el frame store, así que va después de publicar los frames.
+    """
+    frames = []
+    for input_nc_path in input_nc_paths:
+        ts = os.path.splitext(os.path.basename(input_nc_path))[0]
+        try:
+            dt_utc = datetime.strptime(ts, '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        frames.append(_frame_metadata(f"INPUT_{ts}", "input", dt_utc))
+    interval = data_cfg.get('prediction_interval_minutes', 3)
+    for i in range(num_pred_steps):
+        forecast_dt_utc = start_datetime + timedelta(minutes=(i + 1) * interval)
+        frames.append(_frame_metadata(f"PRED_{run_id}_{forecast_dt_utc.strftime('%Y%m%d_%H%M%S')}", "prediction", forecast_dt_utc))
+
+    # Misma proyección que los overlays de /images
+    mercator = None
+    if OVERLAY_PROJECTION == "mercator":
+        grid_km = np.arange(-249.5, 250.0, 1.0, dtype=np.float32)
+        mercator = {"x_km": grid_km, "y_km": grid_km, "lat_0": data_cfg['sensor_latitude'], "lon_0": data_cfg['sensor_longitude'],
+                    "cache_dir": GEO_CACHE_DIR, "earth_radius_m": data_cfg['earth_radius_m']}
+
+    final_path = os.path.join(ANIMATION_OUTPUT_DIR, day_key(run_id), bundle_filename(run_id))
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    staged = [(staging_path(final_path), final_path)]
+    try:
+        pool.result(pool.submit_render(write_bundle, staged[0][0], frames, run_id, FRAME_STORE_DIR,
+                                       data_cfg['composite_scale'], data_cfg['composite_bias'], ANIMATION_SMOOTHED_SIZE,
+                                       mercator))
+    except Exception as e:
+        logging.error(f"Falló el bundle de animación de {run_id}: {e}", exc_info=True)
+        discard(staged)
+        return None
+    publish(staged)
+    logging.info(f"  -> Bundle de animación: {os.path.getsize(final_path) / 1e3:.0f} KB ({len(frames)} frames)")
+    return final_path
+
 def main():
     logging.info("====== INICIO DEL WORKER DEL PIPELINE (v10 - Transparent Images) ======")
-    for path in [MDV_INBOX_DIR, MDV_ARCHIVE_DIR, INPUT_DIR, OUTPUT_DIR, ARCHIVE_DIR, MDV_OUTPUT_DIR, IMAGE_OUTPUT_DIR]:
+    for path in [MDV_INBOX_DIR, MDV_ARCHIVE_DIR, INPUT_DIR, OUTPUT_DIR, ARCHIVE_DIR, MDV_OUTPUT_DIR, IMAGE_OUTPUT_DIR, TILE_OUTPUT_DIR,
+                 ANIMATION_OUTPUT_DIR, CONTOUR_OUTPUT_DIR, HAIL_SWATH_DIR, VOLUME_PRODUCTS_DIR, QPE_DIR]:
         os.makedirs(path, exist_ok=True)
     
     init_db()
     
     predictor = ModelPredictor(MODEL_PATH)
+    RetentionManager(RETENTION_POLICIES, RETENTION_INTERVAL_SECONDS, stats=worker_stats).start()
+    grid = _prediction_grid(DATA_CONFIG, 500, 500)
+    render_initargs = (DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], grid[0], grid[1], GEO_CACHE_DIR,
+                       DATA_CONFIG['earth_radius_m'], TILE_MIN_ZOOM, TILE_MAX_ZOOM, TILES_ENABLED, CONTOURS_ENABLED)
+    if TILES_ENABLED:
+        # Se construye una sola vez (queda en GEO_CACHE_DIR); los procesos de render sólo lo mapean
+        get_tile_remap(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], grid[0], grid[1],
+                       GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'], TILE_MAX_ZOOM, TILE_MIN_ZOOM)
+        ensure_empty_tile(TILE_OUTPUT_DIR)
+    if OVERLAY_PROJECTION == "mercator" and RENDER_MODE == "eager":
+        # Remapeos del overlay (pixel y suavizado), también una sola vez
+        for source_size in [500] + ([min(OVERLAY_SIZE, SMOOTH_INTERP_SIZE)] if SMOOTHED_RENDER != "off" else []):
+            get_overlay_remap(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], grid[0], grid[1],
+                              GEO_CACHE_DIR, OVERLAY_SIZE, source_size, DATA_CONFIG['earth_radius_m'])
+    # Tabla lat/lon de la grilla: geolocalización de celdas y manga de granizo, y vértices de los contornos
+    get_latlon_grid(DATA_CONFIG['sensor_latitude'], DATA_CONFIG['sensor_longitude'], grid[0], grid[1],
+                    GEO_CACHE_DIR, DATA_CONFIG['earth_radius_m'])
+    output_pool = OutputWriterPool(io_workers=OUTPUT_IO_WORKERS, render_workers=RENDER_WORKERS,
+                                   render_initializer=init_render_process, render_initargs=render_initargs)
 
     sent_aircraft_alerts = {}
     last_aircraft_check = 0
@@ -1209,8 +1654,7 @@ def main():
                 mdv_path = os.path.join(MDV_INBOX_DIR, mdv_file_to_process)
                 mdv_to_nc_params = "/app/lrose_params/Mdv2NetCDF.params"
                 success = convert_mdv_to_nc(mdv_path, INPUT_DIR, mdv_to_nc_params)
-                archive_mdv_path = os.path.join(MDV_ARCHIVE_DIR, os.path.basename(mdv_path))
-                shutil.move(mdv_path, archive_mdv_path)
+                archive_into_shard(mdv_path, MDV_ARCHIVE_DIR)
                 if success:
                     logging.info(f"{mdv_file_to_process} archivado y convertido a NC.")
                 else:
@@ -1230,23 +1674,9 @@ def main():
             update_status(f"Procesando secuencia terminada en {seq_id}", len(files_to_process), SECUENCE_LENGHT)
             
             # --- 1. Generar imágenes transparentes y bounds de los últimos 3 scans ---
-            # Esto permite visualizar la animación de entrada en el frontend
-            logging.info("Generando imágenes para los últimos 3 inputs...")
-            last_3_inputs = full_paths[-3:]
-            for input_nc_path in last_3_inputs:
-                input_seq_id = os.path.splitext(os.path.basename(input_nc_path))[0]
-                input_image_filename = f"INPUT_{input_seq_id}.png"
-                input_image_path = os.path.join(IMAGE_OUTPUT_DIR, input_image_filename)
-                
-                # Solo generar si no existe (optimización)
-                if not os.path.exists(input_image_path):
-                    # Aumentamos skip_levels a 3 para enmascarar indices 0, 1 y 2 (clutter)
-                    bounds, cells = generar_imagen_transparente_y_bounds(input_nc_path, input_image_path, skip_levels=3)
-                    if bounds:
-                        with open(f"{input_image_path}.json", 'w') as f:
-                            json.dump({"bounds": bounds, "cells": cells}, f)
-                else:
-                    logging.info(f"Imagen de input ya existe: {input_image_filename}")
+            # Esto permite visualizar la animación de entrada en el frontend.
+            # Aumentamos skip_levels a 3 para enmascarar indices 0, 1 y 2 (clutter)
+            write_input_outputs(output_pool, full_paths[-3:], skip_levels=3)
 
             # --- 2. Predecir ---
             input_tensor = load_and_preprocess_input_sequence(full_paths)
@@ -1273,34 +1703,31 @@ def main():
             except Exception as e:
                 logging.warning(f"No se pudo detectar intervalo dinámico: {e}. Usando config: {DATA_CONFIG['prediction_interval_minutes']}")
 
-            # --- 3. Guardar predicciones en NetCDF ---
+            # --- 3. Guardar predicciones (NetCDF, MDV nativo, imágenes y JSON) en paralelo ---
             output_subdir_name = last_input_dt_utc.strftime('%Y%m%d-%H%M%S')
-            output_subdir_path = os.path.join(OUTPUT_DIR, output_subdir_name)
+            output_subdir_path = os.path.join(OUTPUT_DIR, last_input_dt_utc.strftime('%Y%m%d'), output_subdir_name)
             os.makedirs(output_subdir_path, exist_ok=True)
-            save_prediction_as_netcdf(output_subdir_path, prediction_cleaned, DATA_CONFIG, last_input_dt_utc)
+            logging.info("Escribiendo salidas de predicción...")
+            multi_nc_path = write_prediction_outputs(output_pool, prediction_cleaned, DATA_CONFIG, last_input_dt_utc, output_subdir_path, output_subdir_name)
+            if ANIMATION_BUNDLE_ENABLED:
+                write_animation_bundle(output_pool, output_subdir_name, full_paths[-3:], last_input_dt_utc,
+                                       len(prediction_cleaned), DATA_CONFIG)
             
             # Registrar en DB
             log_prediction(datetime.now(timezone.utc), seq_id, output_subdir_path, "SUCCESS")
 
 
-            # --- 4. Convertir predicciones a MDV ---
-            params_template_path = "/app/lrose_params/params.nc2mdv.final"
-            convert_predictions_to_mdv(output_subdir_path, MDV_OUTPUT_DIR, params_template_path)
-
-            # --- 5. Generar imágenes transparentes y bounds de las predicciones ---
-            logging.info("Iniciando generación de imágenes de predicción...")
-            prediction_nc_files = sorted(glob.glob(os.path.join(output_subdir_path, "*.nc")))
-            for nc_file in prediction_nc_files:
-                pred_filename_base = os.path.splitext(os.path.basename(nc_file))[0]
-                # Incluimos el ID de la corrida (output_subdir_name) en el nombre de la imagen
-                # Formato: PRED_<RUN_ID>_<FORECAST_TIME>.png
-                pred_image_filename = f"PRED_{output_subdir_name}_{pred_filename_base}.png"
-                pred_image_path = os.path.join(IMAGE_OUTPUT_DIR, pred_image_filename)
-                # Aumentamos skip_levels a 3 para enmascarar indices 0, 1 y 2 (clutter)
-                pred_bounds, pred_cells = generar_imagen_transparente_y_bounds(nc_file, pred_image_path, skip_levels=3)
-                if pred_bounds:
-                    with open(f"{pred_image_path}.json", 'w') as f:
-                        json.dump({"bounds": pred_bounds, "cells": pred_cells}, f)
+            # --- 4. Convertir predicciones a MDV con LROSE (si no se usa el escritor nativo) ---
+            if MDV_WRITER != "native":
+                params_template_path = "/app/lrose_params/params.nc2mdv.final"
+                if multi_nc_path:
+                    # NcGeneric2Mdv sólo lee NETCDF3 de un tiempo: se exportan temporalmente y se borran.
+                    classic_dir = os.path.join(output_subdir_path, "classic")
+                    export_multi_to_classic(multi_nc_path, classic_dir, DATA_CONFIG)
+                    convert_predictions_to_mdv(classic_dir, MDV_OUTPUT_DIR, params_template_path)
+                    shutil.rmtree(classic_dir, ignore_errors=True)
+                else:
+                    convert_predictions_to_mdv(output_subdir_path, MDV_OUTPUT_DIR, params_template_path)
 
             # --- 6. Gestión del buffer (BATCH TRIGGER) ---
             # Eliminamos el archivo más antiguo para esperar 1 nuevo (Windows Stride = 1)
@@ -1309,7 +1736,7 @@ def main():
             for file_to_remove in files_to_remove:
                 path_to_archive = os.path.join(INPUT_DIR, file_to_remove)
                 logging.info(f"Ventana deslizante: archivando '{file_to_remove}' para esperar nuevos escaneos.")
-                shutil.move(path_to_archive, os.path.join(ARCHIVE_DIR, file_to_remove))
+                archive_into_shard(path_to_archive, ARCHIVE_DIR)
             
             logging.info(f"Ciclo de predicción para la secuencia {seq_id} completado.")
             time.sleep(1)
@@ -0,0 +1,233 @@
+import os
+import json
+import zlib
+import struct
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+from worker.output_pool import staging_path
+
+# =================================================================
+# Escritor MDV nativo (formato de archivo 32-bit de LROSE/TITAN).
+# Layout: master header (1024) + field headers (416 c/u) + vlevel headers (1024 c/u)
+# + datos de campo comprimidos por plano con zlib, cada bloque rodeado por su
+# "record length" estilo FORTRAN. Reemplaza a NcGeneric2Mdv para las predicciones.
+# =================================================================
+
+MASTER_HEAD_COOKIE = 14142
+FIELD_HEAD_COOKIE = 14143
+VLEVEL_HEAD_COOKIE = 14144
+
+MASTER_HEADER_SIZE = 1024
+FIELD_HEADER_SIZE = 416
+VLEVEL_HEADER_SIZE = 1024
+MAX_VLEVELS = 122
+
+ENCODING_INT8 = 1
+COMPRESSION_ZLIB = 3
+TRANSFORM_NONE = 0
+SCALING_SPECIFIED = 4
+PROJ_FLAT = 8
+VERT_TYPE_Z = 4
+DATA_FORECAST = 2
+ORIENT_SN_WE = 1
+ORDER_XYZ = 0
+
+ZLIB_COMPRESSED = 0xF5F5F5F5
+ZLIB_NOT_COMPRESSED = 0xF6F6F6F6
+
+# Formatos big-endian de cada header (32-bit). Los tamaños se validan al importar.
+MASTER_HEADER_FMT = ">28i 8i i 5i 6f 3f 12f 512s 128s 128s i"
+FIELD_HEADER_FMT = ">17i 10i 9i 4i 2f 8f f 6f 4f f 4f 4f f 64s 16s 16s 16s 16s i"
+VLEVEL_HEADER_FMT = ">2i 122i 4i 122f 5f i"
+COMPRESSION_INFO_FMT = ">4I 2I"
+
+assert struct.calcsize(MASTER_HEADER_FMT) == MASTER_HEADER_SIZE
+assert struct.calcsize(FIELD_HEADER_FMT) == FIELD_HEADER_SIZE
+assert struct.calcsize(VLEVEL_HEADER_FMT) == VLEVEL_HEADER_SIZE
+
+FORECAST_INDEX_FILENAME = "_forecast_index.json"
+FORECAST_INDEX_MAX_RUNS = 50
+
+
+def _epoch(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp()) if dt.tzinfo is None else int(dt.timestamp())
+
+
+def _text(value: str, size: int) -> bytes:
+    return value.encode('ascii', errors='replace')[:size - 1]
+
+
+def pack_mdv_int8(dbz: np.ndarray, scale: float, bias: float) -> np.ndarray:
+    """
+    Empaqueta dBZ (NaN = sin dato) a uint8 MDV: valor = round((dBZ - bias) / scale).
+    El 0 queda reservado como bad/missing, igual que en los volúmenes de entrada.
+    """
+    packed = np.subtract(dbz, bias, dtype=np.float32)
+    packed /= scale
+    np.rint(packed, out=packed)
+    np.clip(packed, 1, 255, out=packed)
+    np.nan_to_num(packed, copy=False, nan=0)
+    return packed.astype(np.uint8)
+
+
+def _compress_planes(volume: np.ndarray) -> bytes:
+    """Comprime cada plano Z por separado y antepone los arrays de offsets y tamaños."""
+    nz = volume.shape[0]
+    offsets, sizes, chunks = [], [], []
+    position = 0
+    for plane in volume:
+        raw = np.ascontiguousarray(plane).tobytes()
+        coded = zlib.compress(raw)
+        cookie = ZLIB_COMPRESSED
+        if len(coded) >= len(raw):
+            coded, cookie = raw, ZLIB_NOT_COMPRESSED
+        info = struct.pack(COMPRESSION_INFO_FMT, cookie, len(raw), len(coded) + 24, len(coded), 0, 0)
+        chunk = info + coded
+        offsets.append(position)
+        sizes.append(len(chunk))
+        chunks.append(chunk)
+        position += len(chunk)
+    return struct.pack(f">{nz}i", *offsets) + struct.pack(f">{nz}i", *sizes) + b"".join(chunks)
+
+
+def build_forecast_mdv(dbz: np.ndarray, valid_dt: datetime, gen_dt: datetime, data_cfg: dict,
+                       x_min_km: float = -249.5, y_min_km: float = -249.5, dx_km: float = 1.0,
+                       levels_km=(1.0,)) -> bytes:
+    """
+    Construye en memoria un archivo MDV de un campo (DBZ) para un paso de pronóstico.
+    dbz: (nz, ny, nx) o (ny, nx) en dBZ, NaN = sin dato. Fila 0 = sur (ORIENT_SN_WE).
+    """
+    volume = dbz if dbz.ndim == 3 else dbz[np.newaxis]
+    nz, ny, nx = volume.shape
+    scale = float(data_cfg.get('output_mdv_scale', 0.5))
+    bias = float(data_cfg.get('output_mdv_bias', -30.0))
+    packed = pack_mdv_int8(volume, scale, bias)
+    valid = packed > 0
+    min_value = float(packed[valid].min()) * scale + bias if valid.any() else 0.0
+    max_value = float(packed[valid].max()) * scale + bias if valid.any() else 0.0
+
+    field_data = _compress_planes(packed)
+    volume_size = len(field_data)
+
+    vlevel_hdr_offset = MASTER_HEADER_SIZE + FIELD_HEADER_SIZE
+    chunk_hdr_offset = vlevel_hdr_offset + VLEVEL_HEADER_SIZE
+    field_data_offset = chunk_hdr_offset + 4  # sin chunks; +4 por el record length inicial
+
+    valid_t = _epoch(valid_dt)
+    gen_t = _epoch(gen_dt)
+    lead_seconds = valid_t - gen_t
+    data_dimension = 3 if nz > 1 else 2
+    sensor_lat = float(data_cfg['sensor_latitude'])
+    sensor_lon = float(data_cfg['sensor_longitude'])
+    sensor_alt = float(data_cfg.get('sensor_altitude_km', 0.0))
+
+    master = struct.pack(
+        MASTER_HEADER_FMT,
+        MASTER_HEADER_SIZE - 8, MASTER_HEAD_COOKIE, 1,
+        gen_t, 0, valid_t, valid_t, valid_t, valid_t + 600,
+        1, 0, data_dimension, DATA_FORECAST, 0,
+        VERT_TYPE_Z, VERT_TYPE_Z, 1, ORIENT_SN_WE, ORDER_XYZ,
+        1, nx, ny, nz, 0,
+        MASTER_HEADER_SIZE, vlevel_hdr_offset, chunk_hdr_offset, 0,
+        *([0] * 8),
+        int(datetime.now(timezone.utc).timestamp()),
+        *([0] * 5),
+        *([0.0] * 6),
+        sensor_lon, sensor_lat, sensor_alt,
+        *([0.0] * 12),
+        _text(f"ConvLSTM forecast t+{lead_seconds / 60.0:g}min", 512),
+        _text("SAN_RAFAEL_PRED", 128),
+        _text("ConvLSTM Model Prediction", 128),
+        MASTER_HEADER_SIZE - 8,
+    )
+
+    field = struct.pack(
+        FIELD_HEADER_FMT,
+        FIELD_HEADER_SIZE - 8, FIELD_HEAD_COOKIE,
+        0, 0, lead_seconds, 0, 0, valid_t, 0,
+        nx, ny, nz, PROJ_FLAT, ENCODING_INT8, 1, field_data_offset, volume_size,
+        *([0] * 10),
+        COMPRESSION_ZLIB, TRANSFORM_NONE, SCALING_SPECIFIED, VERT_TYPE_Z, VERT_TYPE_Z,
+        1, data_dimension, 0, 0,
+        COMPRESSION_ZLIB, 0, 0, 0,
+        sensor_lat, sensor_lon,
+        *([0.0] * 8),
+        0.0,
+        dx_km, dx_km, float(levels_km[1] - levels_km[0]) if len(levels_km) > 1 else 1.0,
+        x_min_km, y_min_km, float(levels_km[0]),
+        scale, bias, 0.0, 0.0,
+        0.0,
+        sensor_alt, 0.0, 0.0, 0.0,
+        min_value, max_value, min_value, max_value,
+        0.0,
+        _text("DBZ", 64), _text("DBZ", 16), _text("dBZ", 16), _text("dBZ", 16), b"",
+        FIELD_HEADER_SIZE - 8,
+    )
+
+    level_values = list(levels_km)[:MAX_VLEVELS]
+    vlevel = struct.pack(
+        VLEVEL_HEADER_FMT,
+        VLEVEL_HEADER_SIZE - 8, VLEVEL_HEAD_COOKIE,
+        *([VERT_TYPE_Z] * len(level_values) + [0] * (MAX_VLEVELS - len(level_values))),
+        *([0] * 4),
+        *(level_values + [0.0] * (MAX_VLEVELS - len(level_values))),
+        *([0.0] * 5),
+        VLEVEL_HEADER_SIZE - 8,
+    )
+
+    record_len = struct.pack(">i", volume_size)
+    return master + field + vlevel + record_len + field_data + record_len
+
+
+def _atomic_write(path: str, payload: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = staging_path(path)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def forecast_mdv_path(mdv_output_dir: str, valid_dt: datetime) -> str:
+    """<mdv_output_dir>/<YYYYMMDD>/<YYYYMMDD_HHMMSS>.mdv"""
+    day_dir = os.path.join(mdv_output_dir, valid_dt.strftime("%Y%m%d"))
+    return os.path.join(day_dir, f"{valid_dt.strftime('%Y%m%d_%H%M%S')}.mdv")
+
+
+def stage_forecast_mdv(mdv_output_dir: str, dbz: np.ndarray, valid_dt: datetime, gen_dt: datetime, data_cfg: dict):
+    """
+    Escribe el MDV en un temporal junto a su destino. Devuelve [(temporal, final)] para publicar con os.replace.
+    """
+    path = forecast_mdv_path(mdv_output_dir, valid_dt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = staging_path(path)
+    with open(temp_path, 'wb') as f:
+        f.write(build_forecast_mdv(dbz, valid_dt, gen_dt, data_cfg))
+    return [(temp_path, path)]
+
+
+def update_forecast_index(mdv_output_dir: str, run_id: str, gen_dt: datetime, entries: list):
+    """
+    Registra los MDV de una corrida en _forecast_index.json (últimas FORECAST_INDEX_MAX_RUNS corridas),
+    así los consumidores no tienen que recorrer el directorio de salida.
+    """
+    index_path = os.path.join(mdv_output_dir, FORECAST_INDEX_FILENAME)
+    runs = []
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                runs = json.load(f).get("runs", [])
+        except (json.JSONDecodeError, OSError):
+            logging.warning("Índice de pronósticos MDV corrupto, se regenera.")
+    runs = [r for r in runs if r.get("run_id") != run_id]
+    runs.append({"run_id": run_id, "generated": gen_dt.isoformat(), "files": entries})
+    runs = runs[-FORECAST_INDEX_MAX_RUNS:]
+    _atomic_write(index_path, json.dumps({"runs": runs}, indent=2).encode('utf-8'))
+    return index_path
@@ -0,0 +1,131 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+# =================================================================
+# Pool de escritura de salidas por lead time.
+# - Hilos para I/O (NetCDF, MDV, JSON): liberan el GIL en disco/zlib.
+# - Procesos para el render (CPU-bound, matplotlib no es thread-safe).
+# Cada tarea escribe en archivos temporales ("staged") y el worker los publica
+# con os.replace en orden de lead time, así la API nunca ve un paso a medio escribir
+# ni un paso posterior antes que uno anterior.
+# Los composites viajan a los procesos de render por memoria compartida (sin pickle de arrays).
+# =================================================================
+
+
+def staging_path(final_path: str) -> str:
+    """Ruta temporal en el mismo directorio (os.replace es atómico sólo dentro del mismo FS)."""
+    return f"{final_path}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+def publish(staged: list):
+    """Publica pares (temporal, final) en el orden dado. Acepta directorios (ej. pirámides de tiles)."""
+    for temp_path, final_path in staged:
+        if os.path.isdir(temp_path) and os.path.isdir(final_path):
+            # os.replace no pisa directorios con contenido: se reemplaza la versión anterior
+            shutil.rmtree(final_path)
+        os.replace(temp_path, final_path)
+
+
+def discard(staged: list):
+    for temp_path, _ in staged:
+        if os.path.isdir(temp_path):
+            shutil.rmtree(temp_path, ignore_errors=True)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def share_array(array: np.ndarray):
+    """
+    Copia array a un bloque de memoria compartida. Devuelve (shm, handle): el handle (nombre, shape,
+    dtype) es lo que se envía a los procesos; quien crea el bloque debe llamar release_shared(shm).
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def release_shared(shm):
+    shm.close()
+    shm.unlink()
+
+
+def _call_shared(fn, handle, index, kwargs):
+    # Corre en el proceso de render: se adjunta al bloque sin copiarlo y pasa array[index] como composite_2d
+    name, shape, dtype = handle
+    # Con spawn los hijos comparten el resource_tracker del principal, que es quien hace unlink
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    try:
+        return fn(composite_2d=array[index], **kwargs)
+    finally:
+        # Las vistas deben liberarse antes de cerrar el mmap
+        del array
+        shm.close()
+
+
+def _timed_call(fn, args, kwargs):
+    # Top-level para que sea picklable por el ProcessPoolExecutor
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class OutputWriterPool:
+    """Ejecutores persistentes para las salidas de cada ciclo y sus estadísticas de tiempo."""
+
+    def __init__(self, io_workers: int = 4, render_workers: int = 2, render_initializer=None, render_initargs=()):
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="output-io")
+        # spawn: el worker ya inicializó torch/threads, hacer fork de ese estado no es seguro.
+        # El initializer corre una vez por proceso (imports, LUTs, remapeos) y no en cada tarea.
+        self.render_executor = ProcessPoolExecutor(
+            max_workers=render_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=render_initializer, initargs=render_initargs
+        )
+        self._task_seconds = 0.0
+
+    def submit_io(self, fn, *args, **kwargs):
+        return self.io_executor.submit(_timed_call, fn, args, kwargs)
+
+    def submit_render(self, fn, *args, **kwargs):
+        return self.render_executor.submit(_timed_call, fn, args, kwargs)
+
+    def submit_render_shared(self, fn, handle, index, **kwargs):
+        """fn(composite_2d=<array compartido>[index], **kwargs) en un proceso de render."""
+        return self.render_executor.submit(_timed_call, _call_shared, (fn, handle, index, kwargs), {})
+
+    def result(self, future):
+        """Resultado de una tarea, acumulando su duración para las estadísticas del ciclo."""
+        result, elapsed = future.result()
+        self._task_seconds += elapsed
+        return result
+
+    def start_cycle(self):
+        self._task_seconds = 0.0
+        self._cycle_start = time.perf_counter()
+
+    def end_cycle(self, serial_seconds: float = 0.0) -> dict:
+        """
+        serial_seconds: trabajo hecho en el hilo principal durante el ciclo (ej. detección de celdas).
+        El ahorro es lo que hubiera tardado todo en serie menos el wall-clock real.
+        """
+        wall = time.perf_counter() - self._cycle_start
+        sequential = self._task_seconds + serial_seconds
+        stats = {
+            "wall_seconds": round(wall, 3),
+            "sequential_seconds": round(sequential, 3),
+            "saved_seconds": round(max(0.0, sequential - wall), 3),
+        }
+        logging.info(f"Salidas del ciclo: {wall:.2f}s wall vs {sequential:.2f}s en serie (ahorro {stats['saved_seconds']:.2f}s)")
+        return stats
+
+    def shutdown(self):
+        self.io_executor.shutdown(wait=True)
+        self.render_executor.shutdown(wait=True)
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+# =================================================================
+# Retención de artefactos del pipeline.
+# Cada directorio se organiza en shards diarios <base>/<YYYYMMDD>/ y tiene un
+# presupuesto de tamaño y antigüedad. Un hilo de fondo:
+#   1. migra a su shard lo que quedó plano en la raíz (layout viejo),
+#   2. baja a shards las imágenes que ya no son "hot" (IMAGE_OUTPUT_DIR),
+#   3. borra shards más viejos que max_days,
+#   4. borra lo más viejo hasta quedar bajo max_gb.
+# Así /api/images sólo lista la raíz chica de imágenes y los globs del worker
+# se limitan a los shards de los días que interesan.
+# =================================================================
+
+SHARD_RE = re.compile(r"^\d{8}$")
+DAY_IN_NAME_RE = re.compile(r"(20\d{6})")
+
+
+def day_key(name: str, fallback_path: str = None) -> str:
+    """
+    Día (YYYYMMDD, UTC) al que pertenece un artefacto: el primero que aparezca en su nombre
+    (ej. 20250101123000.nc, 20250101-123000, PRED_..._20250101_123500.png). Si el nombre no trae
+    fecha (ej. MDV de TITAN "HHMMSS.mdv") se usa el mtime del archivo.
+    """
+    match = DAY_IN_NAME_RE.search(name)
+    if match:
+        return match.group(1)
+    ts = os.path.getmtime(fallback_path) if fallback_path and os.path.exists(fallback_path) else time.time()
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def shard_dir(base_dir: str, day: str) -> str:
+    path = os.path.join(base_dir, day)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_into_shard(src_path: str, base_dir: str) -> str:
+    """Mueve src_path a <base_dir>/<YYYYMMDD>/<nombre> y devuelve la ruta final."""
+    name = os.path.basename(src_path.rstrip(os.sep))
+    dest = os.path.join(shard_dir(base_dir, day_key(name, src_path)), name)
+    shutil.move(src_path, dest)
+    return dest
+
+
+def _tree_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _is_artifact(entry: os.DirEntry) -> bool:
+    # Se ignoran índices/estado (_forecast_index.json), ocultos y temporales a medio publicar
+    return not (entry.name.startswith(('_', '.')) or entry.name.endswith('.tmp') or SHARD_RE.match(entry.name))
+
+
+class RetentionManager(threading.Thread):
+    """
+    policies: {base_dir: {"max_gb": float, "max_days": int, "hot_minutes": int (opcional)}}
+    Con hot_minutes, la raíz guarda sólo los archivos de los últimos N minutos de actividad
+    (relativos al más nuevo, así un corte del radar no deja la raíz vacía) y el resto baja a shards.
+    """
+
+    def __init__(self, policies: dict, interval_seconds: int = 600, stats: dict = None):
+        super().__init__(name="retention", daemon=True)
+        self.policies = policies
+        self.interval_seconds = interval_seconds
+        self.stats = stats if stats is not None else {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Retención: error en el barrido: {e}", exc_info=True)
+            if self._stop_event.wait(self.interval_seconds):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+
+    def sweep(self) -> dict:
+        summary = {}
+        for base_dir, policy in self.policies.items():
+            if not os.path.isdir(base_dir):
+                continue
+            moved = self._shard_root(base_dir, policy.get("hot_minutes"))
+            freed, size = self._enforce_budget(base_dir, policy.get("max_gb"), policy.get("max_days"))
+            summary[os.path.basename(base_dir.rstrip(os.sep))] = {
+                "moved": moved, "freed_mb": round(freed / 1e6, 1), "size_mb": round(size / 1e6, 1)
+            }
+        self.stats["retention"] = {"last_sweep": datetime.now(timezone.utc).isoformat(), "dirs": summary}
+        logging.info(f"Retención: {summary}")
+        return summary
+
+    def _shard_root(self, base_dir: str, hot_minutes: int = None) -> int:
+        entries = [e for e in os.scandir(base_dir) if _is_artifact(e)]
+        if hot_minutes is not None:
+            files = [e for e in entries if e.is_file()]
+            if not files:
+                return 0
+            newest = max(e.stat().st_mtime for e in files)
+            cutoff = newest - hot_minutes * 60
+            entries = [e for e in files if e.stat().st_mtime < cutoff]
+        moved = 0
+        for entry in entries:
+            try:
+                archive_into_shard(entry.path, base_dir)
+                moved += 1
+            except OSError as e:
+                logging.warning(f"Retención: no se pudo mover {entry.path}: {e}")
+        return moved
+
+    def _enforce_budget(self, base_dir: str, max_gb: float = None, max_days: int = None):
+        shards = sorted(e.name for e in os.scandir(base_dir) if e.is_dir() and SHARD_RE.match(e.name))
+        freed = 0
+
+        if max_days is not None:
+            oldest_day = (datetime.now(timezone.utc) - timedelta(days=max_days)).strftime("%Y%m%d")
+            for day in [d for d in shards if d < oldest_day]:
+                path = os.path.join(base_dir, day)
+                freed += _tree_size(path)
+                _remove(path)
+                shards.remove(day)
+
+        sizes = {day: _tree_size(os.path.join(base_dir, day)) for day in shards}
+        total = sum(sizes.values())
+        if max_gb is None:
+            return freed, total
+
+        budget = int(max_gb * 1e9)
+        # Primero shards completos (el más viejo primero), nunca el del día más reciente
+        while total > budget and len(shards) > 1:
+            day = shards.pop(0)
+            _remove(os.path.join(base_dir, day))
+            freed += sizes[day]
+            total -= sizes[day]
+
+        # Si el día actual sólo ya excede el presupuesto, se borran sus entradas más viejas
+        if total > budget and shards:
+            entries = sorted(os.scandir(os.path.join(base_dir, shards[0])), key=lambda e: e.stat().st_mtime)
+            for entry in entries:
+                if total <= budget:
+                    break
+                size = _tree_size(entry.path)
+                _remove(entry.path)
+                freed += size
+                total -= size
+
+        if freed:
+            logging.info(f"Retención: liberados {freed / 1e6:.1f} MB en {base_dir}")
+        return freed, total
@@ -0,0 +1,96 @@
+import sys
+sys.path.append('backend')
+import os
+import zlib
+import shutil
+import struct
+import subprocess
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from worker.mdv_writer import (build_forecast_mdv, pack_mdv_int8, MASTER_HEADER_FMT, FIELD_HEADER_FMT, VLEVEL_HEADER_FMT,
+                               COMPRESSION_INFO_FMT, MASTER_HEADER_SIZE, FIELD_HEADER_SIZE, VLEVEL_HEADER_SIZE,
+                               MASTER_HEAD_COOKIE, FIELD_HEAD_COOKIE, VLEVEL_HEAD_COOKIE, ZLIB_COMPRESSED,
+                               ZLIB_NOT_COMPRESSED)
+
+# Decodifica un MDV de build_forecast_mdv con los mismos layouts y verifica cookies, record lengths,
+# offsets y que los planos descomprimidos sean exactamente pack_mdv_int8 de la entrada.
+# Si LROSE está instalado, además lo lee con PrintMdv y Mdv2NetCDF (el chequeo contra el formato real).
+DATA_CFG = {'sensor_latitude': -34.64799880981445, 'sensor_longitude': -68.01699829101562,
+            'sensor_altitude_km': 0.55, 'output_mdv_scale': 0.5, 'output_mdv_bias': -30.0}
+
+gen_dt = datetime(2026, 1, 15, 18, 30, 0)
+valid_dt = gen_dt + timedelta(minutes=7)
+rng = np.random.default_rng(0)
+dbz = rng.uniform(-35, 80, size=(2, 500, 500)).astype(np.float32)
+dbz[:, :100, :] = np.nan   # sin dato
+dbz[0, 200:300, 200:300] = 45.0  # bloque comprimible
+levels_km = (1.0, 2.0)
+
+payload = build_forecast_mdv(dbz, valid_dt, gen_dt, DATA_CFG, levels_km=levels_km)
+
+master = struct.unpack_from(MASTER_HEADER_FMT, payload, 0)
+assert master[0] == master[-1] == MASTER_HEADER_SIZE - 8, "record length del master header"
+assert master[1] == MASTER_HEAD_COOKIE, "cookie del master header"
+nx, ny, nz = master[20], master[21], master[22]
+field_hdr_offset, vlevel_hdr_offset, chunk_hdr_offset = master[24], master[25], master[26]
+assert (nx, ny, nz) == (500, 500, 2), (nx, ny, nz)
+assert (master[3], master[5]) == (int(gen_dt.replace(tzinfo=timezone.utc).timestamp()),
+                                  int(valid_dt.replace(tzinfo=timezone.utc).timestamp())), "tiempos"
+assert field_hdr_offset == MASTER_HEADER_SIZE
+assert vlevel_hdr_offset == MASTER_HEADER_SIZE + FIELD_HEADER_SIZE
+assert chunk_hdr_offset == vlevel_hdr_offset + VLEVEL_HEADER_SIZE
+
+field = struct.unpack_from(FIELD_HEADER_FMT, payload, field_hdr_offset)
+assert field[0] == field[-1] == FIELD_HEADER_SIZE - 8, "record length del field header"
+assert field[1] == FIELD_HEAD_COOKIE, "cookie del field header"
+assert field[9:12] == (nx, ny, nz)
+field_data_offset, volume_size = field[15], field[16]
+scale, bias = field[57], field[58]
+assert (scale, bias) == (0.5, -30.0), (scale, bias)
+assert field_data_offset == chunk_hdr_offset + 4, "field_data_offset"
+
+vlevel = struct.unpack_from(VLEVEL_HEADER_FMT, payload, vlevel_hdr_offset)
+assert vlevel[0] == vlevel[-1] == VLEVEL_HEADER_SIZE - 8, "record length del vlevel header"
+assert vlevel[1] == VLEVEL_HEAD_COOKIE, "cookie del vlevel header"
+assert tuple(vlevel[2 + 122 + 4:2 + 122 + 4 + nz]) == levels_km
+
+# Bloque de datos: record length + offsets/tamaños por plano + planos comprimidos + record length
+assert struct.unpack_from(">i", payload, field_data_offset - 4)[0] == volume_size
+assert struct.unpack_from(">i", payload, field_data_offset + volume_size)[0] == volume_size
+assert field_data_offset + volume_size + 4 == len(payload), "bytes de sobra al final"
+offsets = struct.unpack_from(f">{nz}i", payload, field_data_offset)
+sizes = struct.unpack_from(f">{nz}i", payload, field_data_offset + 4 * nz)
+planes_start = field_data_offset + 8 * nz
+assert sum(sizes) == volume_size - 8 * nz, "volume_size"
+
+expected = pack_mdv_int8(dbz, scale, bias)
+info_size = struct.calcsize(COMPRESSION_INFO_FMT)
+for z in range(nz):
+    start = planes_start + offsets[z]
+    cookie, n_raw, n_coded_total, n_coded, _, _ = struct.unpack_from(COMPRESSION_INFO_FMT, payload, start)
+    assert n_coded_total == n_coded + info_size and sizes[z] == n_coded_total
+    coded = payload[start + info_size:start + info_size + n_coded]
+    if cookie == ZLIB_COMPRESSED:
+        raw = zlib.decompress(coded)
+    else:
+        assert cookie == ZLIB_NOT_COMPRESSED, hex(cookie)
+        raw = coded
+    assert len(raw) == n_raw == nx * ny
+    plane = np.frombuffer(raw, dtype=np.uint8).reshape(ny, nx)
+    assert np.array_equal(plane, expected[z]), f"plano {z} distinto de pack_mdv_int8"
+    print(f"Plano {z}: {n_raw} -> {n_coded} bytes ({'zlib' if cookie == ZLIB_COMPRESSED else 'crudo'}), OK")
+print(f"MDV de {len(payload)} bytes decodificado sin diferencias")
+
+# Contra LROSE real, si está en el PATH (imagen Docker del worker)
+if shutil.which("PrintMdv") and shutil.which("Mdv2NetCDF"):
+    work_dir = tempfile.mkdtemp()
+    path = os.path.join(work_dir, "forecast.mdv")
+    with open(path, 'wb') as f:
+        f.write(payload)
+    subprocess.run(["PrintMdv", "-f", path, "-full"], check=True)
+    subprocess.run(["Mdv2NetCDF", "-f", path, "-outdir", work_dir], check=True)
+    print(f"PrintMdv y Mdv2NetCDF leyeron el archivo ({work_dir})")
+else:
+    print("PrintMdv/Mdv2NetCDF no disponibles: se omite el chequeo con LROSE")
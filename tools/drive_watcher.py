@@ -1,4 +1,6 @@
 import os
+import re
+import json
 import time
 import subprocess
 import logging
@@ -24,17 +26,22 @@ def get_remote_path_for_today(base_remote_path: str):
     now = datetime.now(timezone.utc)
     return f"{base_remote_path}/{now.strftime('%Y%m%d')}"
 
+def _utc_day(modtime: str) -> str:
+    """YYYYMMDD (UTC) de un ModTime RFC3339 de rclone (la fracción de segundo puede venir en nanosegundos)."""
+    stamp = re.sub(r'\.\d+', '', modtime).replace('Z', '+00:00')
+    return datetime.fromisoformat(stamp).astimezone(timezone.utc).strftime('%Y%m%d')
+
 def list_remote_files(remote_path: str):
-    """Retorna una lista de nombres de archivos en el path remoto usando rclone."""
+    """Retorna {nombre: día UTC de su mtime} de los .mdv del path remoto usando rclone."""
     try:
-        # rclone lsf devuelve solo nombres de archivos (uno por linea)
-        cmd = ["rclone", "lsf", remote_path, "--files-only"]
+        # rclone lsjson trae el ModTime, que rclone copy conserva en el archivo local
+        cmd = ["rclone", "lsjson", remote_path, "--files-only"]
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        files = result.stdout.strip().split('\n')
-        return [f for f in files if f.endswith('.mdv')]
+        entries = json.loads(result.stdout or "[]")
+        return {e["Name"]: _utc_day(e["ModTime"]) for e in entries if e["Name"].endswith('.mdv')}
     except subprocess.CalledProcessError as e:
         logger.warning(f"No se pudo listar archivos en {remote_path}: {e.stderr}")
-        return []
+        return {}
 
 
 # In-memory "processed" cache (for files skipped or downloaded in this session)
@@ -46,8 +53,11 @@ metrics = {
 }
 files_seen_this_session = set()
 
-def is_processed(filename: str):
-    """Verifica si el archivo ya existe localmente (en inbox, archivo o convertido) o fue saltado."""
+def is_processed(filename: str, mtime_day: str = None):
+    """
+    Verifica si el archivo ya existe localmente (en inbox, archivo o convertido) o fue saltado.
+    mtime_day: día UTC del mtime remoto, el shard donde lo archiva el worker si el nombre no trae fecha.
+    """
     # 0. Check Session Cache
     if filename in files_seen_this_session:
         return True
@@ -56,8 +66,14 @@ def is_processed(filename: str):
     if os.path.exists(os.path.join(MDV_INBOX_DIR, filename)):
         return True
     
-    # 2. Check Archive (Processed and moved)
-    if os.path.exists(os.path.join(MDV_ARCHIVE_DIR, filename)):
+    # 2. Check Archive (Processed and moved). El worker archiva en shards diarios <YYYYMMDD>/ con
+    # retention.day_key: la fecha del nombre o, para los "HHMMSS.mdv" de TITAN, el mtime del archivo,
+    # que rclone conserva del remoto y puede caer en otro día que la carpeta consultada.
+    today = datetime.now(timezone.utc).strftime('%Y%m%d')
+    for day in {today, mtime_day or today}:
+        if os.path.exists(os.path.join(MDV_ARCHIVE_DIR, day, filename)):
+            return True
+    if os.path.exists(os.path.join(MDV_ARCHIVE_DIR, filename)):  # layout plano anterior
         return True
     
     return False
@@ -106,10 +122,8 @@ def main():
                 logger.debug("No se encontraron archivos remotos (o error de conexión).")
             
             # 3. Filtrar y descargar nuevos
-            remote_files.sort()
-
             # IDENTIFY NEW FILES (Using updated is_processed with cache)
-            new_files = [f for f in remote_files if not is_processed(f)]
+            new_files = [f for f in sorted(remote_files) if not is_processed(f, remote_files[f])]
             
             # --- LOGIC UPDATE: Catch-up Strategy ---
             MAX_CATCHUP = 8 # Sufficient for 1 sequence